@@ -8,7 +8,8 @@ in Bitcoin price prediction. The charts include:
 4. Dynamic Error Line Chart: MAPE trends for each algorithm
 
 Features:
-- Fetches actual Bitcoin prices using the CryptoCompare API with retry mechanism.
+- Reads actual Bitcoin prices from the local price store (synced from the CryptoCompare API,
+  retried with backoff by the shared HTTP client).
 - Generates visually enhanced charts using Seaborn and Matplotlib.
 
 Expected Algorithms:
@@ -35,18 +36,41 @@ Usage:
     runtime_chart = plot_runtime_bar_chart(runtime_list)
     dynamic_error_chart = plot_dynamic_error_line_chart(mape_list)
 
+   Or draw all four in parallel in the chart process pool:
+    charts = render_charts(predict_dict, actual_prices, mae_list, runtime_list, mape_list)
+    job_ids = submit_charts(predict_dict, actual_prices, mae_list, runtime_list, mape_list)
+    chart_job_status(job_ids["priceChart"])  # {"status": "done", "path": ...}
+
+   Or skip rendering and return the chart data for the client to draw:
+    data = chart_data(predict_dict, actual_prices, mae_list, runtime_list, mape_list)
+
 4. Save the output charts to the specified directory:
     /frontend/bitflow-frontend/public/static/plots/
+   Files are named after a hash of their input data, e.g. trend_chart_<hash>.png,
+   so identical inputs reuse the existing PNG (see ChartCache).
 """
 
-import matplotlib.pyplot as plt
+import hashlib
+import json
+import multiprocessing
+import re
 import seaborn as sns
-import requests
 import pandas as pd
 import os
 import logging
-import time
-from datetime import datetime
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from matplotlib.figure import Figure
+
+try:
+    import fcntl
+except ImportError:  # Windows, one process serves the charts
+    fcntl = None
+
+from bitcoin_prediction.market_data import price_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -54,126 +78,214 @@ logger = logging.getLogger(__name__)
 
 # Define the chart output directory relative to the current script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PLOTS_DIR = os.path.join(BASE_DIR, "frontend/bitflow-frontend/public/static/plots/")
+PLOTS_DIR = os.environ.get("BITFLOW_PLOTS_DIR", os.path.join(BASE_DIR, "frontend/bitflow-frontend/public/static/plots/"))
 os.makedirs(PLOTS_DIR, exist_ok=True)  # Create the directory if it doesn't exist
 
 # Supported algorithms
 EXPECTED_ALGORITHMS = {"ARIMA", "XGBoost", "LSTM", "RandomForest", "Prophet"}
 
-def fetch_actual_prices_with_retry(start_date, end_date, retries=3, delay=5):
-    for attempt in range(retries):
-        try:
-            return fetch_actual_prices(start_date, end_date)
-        except Exception as e:
-            logger.warning(f"Attempt {attempt + 1} failed: {e}")
-            if attempt < retries - 1:
-                time.sleep(delay)
-            else:
-                logger.error("All retry attempts failed.")
-                raise
+# Chart rendering pool: worker processes, seconds to wait for a chart and
+# number of chart jobs remembered for polling
+CHART_WORKERS = int(os.environ.get("BITFLOW_CHART_WORKERS", 4))
+CHART_TIMEOUT = 60
+MAX_CHART_JOBS = 1000
+
+# Chart cache limits and the lock file of its evictions
+CHART_CACHE_MAX_FILES = int(os.environ.get("BITFLOW_CHART_CACHE_MAX_FILES", 2000))
+CHART_CACHE_MAX_BYTES = int(os.environ.get("BITFLOW_CHART_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+CHART_LOCK_NAME = ".chart_cache.lock"
+CHART_HASH_LENGTH = 20
+CHART_FILE_PATTERN = re.compile(r"^[a-z_]+_[0-9a-f]{%d}\.png$" % CHART_HASH_LENGTH)
 
+_chart_pool = None
+_chart_jobs = OrderedDict()
+_pending_charts = {}  # chart file name -> future of the render in progress
+_chart_lock = threading.Lock()
+
+# Upstream failures are retried with backoff by the HTTP client of the price
+# store, within its deadline, so no worker sleeps here
 def fetch_actual_prices(start_date, end_date):
     logger.info("Fetching actual Bitcoin prices...")
-    url = "https://min-api.cryptocompare.com/data/v2/histoday"
-    params = {
-        "fsym": "BTC",
-        "tsym": "USD",
-        "toTs": pd.to_datetime(end_date).timestamp(),
-        "limit": (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days,
-    }
-    response = requests.get(url, params=params)
-    if response.status_code != 200:
-        logger.error(f"Failed to fetch data: {response.json()}")
-        raise Exception(f"Failed to fetch data: {response.json()}")
-
-    data = response.json().get("Data", {}).get("Data", [])
-    actual_prices = {pd.to_datetime(item["time"], unit="s").strftime("%Y-%m-%d"): item["close"] for item in data}
+    close = price_store.get_prices(start_date, end_date)["close"]
+    actual_prices = dict(zip(close.index.strftime("%Y-%m-%d"), close.tolist()))
     logger.info("Successfully fetched actual prices.")
     return actual_prices
 
-def plot_trend_chart(predict_dictionary, actual_prices, output_name="trend_chart.png"):
-    sns.set(style="whitegrid")
-    plt.figure(figsize=(10, 6))
+# Chart cache
+# Chart files are named after a hash of the chart type and its input data, so
+# identical inputs reuse the PNG that is already on disk. ChartCache evicts
+# the least recently used ones once the directory holds more than
+# CHART_CACHE_MAX_FILES files or CHART_CACHE_MAX_BYTES bytes. Files not named
+# by chart_file_name() are never touched.
+# All processes serving from the directory (e.g. the `serve` workers) share
+# its state on disk instead of keeping their own index: the modification time
+# of a chart is its last use, and an eviction scans the directory under a file
+# lock, so it counts the charts of every process.
+
+def chart_file_name(chart_type, *inputs):
+    payload = json.dumps([chart_type, inputs], default=str)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:CHART_HASH_LENGTH]
+    return f"{chart_type}_{digest}.png"
+
+# Write to a temporary file first, so a concurrent render of the same chart
+# never serves a half written PNG
+def save_figure(fig, output_path):
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fig.savefig(tmp_path, format="png")
+    os.replace(tmp_path, output_path)
+
+class ChartCache:
+    def __init__(self, plots_dir, max_files, max_bytes):
+        self.plots_dir = plots_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.lock_path = os.path.join(plots_dir, CHART_LOCK_NAME)
+        self._lock = threading.Lock()
+
+    # [(last_used, file_name, size), ...] of the cached charts on disk
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.plots_dir):
+            if not CHART_FILE_PATTERN.match(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+        return entries
+
+    # Exclusive across the threads of this process and, with fcntl, across processes
+    @contextmanager
+    def _exclusive(self):
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    # Path of a cached chart, or None if it has to be rendered
+    def lookup(self, file_name):
+        output_path = os.path.join(self.plots_dir, file_name)
+        try:
+            os.utime(output_path)
+        except FileNotFoundError:
+            return None
+        return output_path
+
+    # Register a freshly rendered chart and evict the least recently used ones
+    def record(self, file_name):
+        with self._exclusive():
+            self._evict(self._scan())
+
+    def _evict(self, entries):
+        files = len(entries)
+        total_bytes = sum(size for _, _, size in entries)
+        for _, file_name, size in sorted(entries):
+            if files <= self.max_files and total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.plots_dir, file_name))
+            except FileNotFoundError:
+                pass
+            files -= 1
+            total_bytes -= size
+            logger.info(f"Evicted cached chart {file_name}")
+
+    def stats(self):
+        entries = self._scan()
+        return {
+            "files": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "max_files": self.max_files,
+            "max_bytes": self.max_bytes
+        }
+
+chart_cache = ChartCache(PLOTS_DIR, CHART_CACHE_MAX_FILES, CHART_CACHE_MAX_BYTES)
+
+def plot_trend_chart(predict_dictionary, actual_prices, output_name=None):
+    with sns.axes_style("whitegrid"):
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
     for algo, data in predict_dictionary.items():
         dates = list(data.keys())
         prices = list(data.values())
-        plt.plot(dates, prices, label=f"Predicted by {algo}")
+        ax.plot(dates, prices, label=f"Predicted by {algo}")
 
     actual_dates = list(actual_prices.keys())
     actual_values = list(actual_prices.values())
-    plt.plot(actual_dates, actual_values, label="Actual Prices", linestyle="--", color="black")
+    ax.plot(actual_dates, actual_values, label="Actual Prices", linestyle="--", color="black")
 
-    plt.xlabel("Date")
-    plt.ylabel("Price")
-    plt.title("Trend Line Chart: Predicted vs Actual Prices")
-    plt.legend()
-    plt.xticks(rotation=45)
-    #plt.gca().xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter("%Y-%m-%d"))
-    plt.gcf().autofmt_xdate()  # 自动调整日期标签避免重叠
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Price")
+    ax.set_title("Trend Line Chart: Predicted vs Actual Prices")
+    ax.legend()
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.autofmt_xdate()  # 自动调整日期标签避免重叠
 
     # 调整布局
-    plt.tight_layout()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_name = f"trend_chart_{timestamp}.png"
-    logger.info("trend_chart: ", output_name)
+    fig.tight_layout()
+    if output_name is None:
+        output_name = chart_file_name("trend_chart", predict_dictionary, actual_prices)
+    logger.info(f"trend_chart: {output_name}")
     output_path = os.path.join(PLOTS_DIR, output_name)
-    plt.savefig(output_path)
-    plt.close()
+    save_figure(fig, output_path)
     logger.info(f"Trend line chart saved at {output_path}")
     return output_path
 
-def plot_error_bar_chart(mae_list, output_name="error_bar_chart.png"):
-    sns.set(style="whitegrid")
+def plot_error_bar_chart(mae_list, output_name=None):
+    with sns.axes_style("whitegrid"):
+        fig = Figure()
+        ax = fig.subplots()
     data = pd.DataFrame(list(mae_list.items()), columns=["Algorithm", "MAE"])
-    ax = sns.barplot(x="Algorithm", y="MAE", data=data, palette="coolwarm")
+    sns.barplot(x="Algorithm", y="MAE", data=data, palette="coolwarm", ax=ax)
 
     for p in ax.patches:
         ax.annotate(f"{p.get_height():.3f}", (p.get_x() + p.get_width() / 2., p.get_height()),
                     ha='center', va='center', xytext=(0, 10), textcoords='offset points')
 
-    plt.title("Error Bar Chart: MAE Comparison")
-    plt.xlabel("Algorithm")
-    plt.ylabel("Mean Absolute Error (MAE)")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_name = f"error_bar_chart_{timestamp}.png"
-    logger.info("error_bar_chart: ", output_name)
+    ax.set_title("Error Bar Chart: MAE Comparison")
+    ax.set_xlabel("Algorithm")
+    ax.set_ylabel("Mean Absolute Error (MAE)")
+    if output_name is None:
+        output_name = chart_file_name("error_bar_chart", mae_list)
+    logger.info(f"error_bar_chart: {output_name}")
     output_path = os.path.join(PLOTS_DIR, output_name)
-    plt.savefig(output_path)
-    plt.close()
+    save_figure(fig, output_path)
     logger.info(f"Error bar chart saved at {output_path}")
     return output_path
 
-def plot_runtime_bar_chart(runtime_list, output_name="runtime_bar_chart.png"):
-    sns.set(style="whitegrid")
+def plot_runtime_bar_chart(runtime_list, output_name=None):
+    with sns.axes_style("whitegrid"):
+        fig = Figure()
+        ax = fig.subplots()
     data = pd.DataFrame(list(runtime_list.items()), columns=["Algorithm", "Runtime"])
-    ax = sns.barplot(x="Algorithm", y="Runtime", data=data, palette="Greens")
+    sns.barplot(x="Algorithm", y="Runtime", data=data, palette="Greens", ax=ax)
 
     for p in ax.patches:
         ax.annotate(f"{p.get_height()}", (p.get_x() + p.get_width() / 2., p.get_height()),
                     ha='center', va='center', xytext=(0, 10), textcoords='offset points')
 
-    plt.title("Runtime Bar Chart: Algorithm Efficiency")
-    plt.xlabel("Algorithm")
-    plt.ylabel("Runtime (ms)")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_name = f"runtime_bar_chart_{timestamp}.png"
-    logger.info("runtime_bar_chart: ", output_name)
+    ax.set_title("Runtime Bar Chart: Algorithm Efficiency")
+    ax.set_xlabel("Algorithm")
+    ax.set_ylabel("Runtime (ms)")
+    if output_name is None:
+        output_name = chart_file_name("runtime_bar_chart", runtime_list)
+    logger.info(f"runtime_bar_chart: {output_name}")
     output_path = os.path.join(PLOTS_DIR, output_name)
-    plt.savefig(output_path)
-    plt.close()
+    save_figure(fig, output_path)
     logger.info(f"Runtime bar chart saved at {output_path}")
     return output_path
 
-def plot_mape_bar_chart(mape_list, output_name="mape_bar_chart.png"):
-    sns.set(style="whitegrid")
-    
+def plot_mape_bar_chart(mape_list, output_name=None):
     # Prepare data for the bar chart
     mape_data = pd.DataFrame.from_dict(mape_list, orient="index", columns=["MAPE"]).reset_index()
     mape_data.rename(columns={"index": "Algorithm"}, inplace=True)
 
     # Create the bar chart
-    plt.figure(figsize=(10, 6))
-    ax = sns.barplot(x="Algorithm", y="MAPE", data=mape_data, palette="Blues_d")
+    with sns.axes_style("whitegrid"):
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
+    sns.barplot(x="Algorithm", y="MAPE", data=mape_data, palette="Blues_d", ax=ax)
 
     # Add labels to bars
     for p in ax.patches:
@@ -181,16 +293,134 @@ def plot_mape_bar_chart(mape_list, output_name="mape_bar_chart.png"):
                     ha="center", va="center", xytext=(0, 8), textcoords="offset points")
     
     # Add labels and title
-    plt.title("MAPE Comparison Across Algorithms")
-    plt.xlabel("Algorithm")
-    plt.ylabel("Mean Absolute Percentage Error (MAPE)")
+    ax.set_title("MAPE Comparison Across Algorithms")
+    ax.set_xlabel("Algorithm")
+    ax.set_ylabel("Mean Absolute Percentage Error (MAPE)")
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_name = f"mape_bar_chart_{timestamp}.png"
-    logger.info("mape_bar_chart: ", output_name)
+    if output_name is None:
+        output_name = chart_file_name("mape_bar_chart", mape_list)
+    logger.info(f"mape_bar_chart: {output_name}")
     # Save and return the plot path
     output_path = os.path.join(PLOTS_DIR, output_name)
-    plt.savefig(output_path)
-    plt.close()
+    save_figure(fig, output_path)
     logger.info(f"MAPE bar chart saved at {output_path}")
     return output_path
+
+
+# Chart data
+# The inputs of the four charts as compact columnar JSON, for clients that
+# draw the charts themselves instead of downloading the PNGs. All series share
+# one sorted date axis, a date missing from a series is null.
+
+def _series_on_axis(series, dates):
+    return [None if series.get(date) is None else round(float(series[date]), 2) for date in dates]
+
+def _bar_series(values):
+    algorithms = list(values.keys())
+    # MAPE values come as one-element lists
+    return {
+        "algorithms": algorithms,
+        "values": [float(v[0] if isinstance(v, (list, tuple)) else v) for v in values.values()]
+    }
+
+def chart_data(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list):
+    dates = sorted(set(actual_prices).union(*(data.keys() for data in predict_dictionary.values())))
+    trend = {algo: _series_on_axis(data, dates) for algo, data in predict_dictionary.items()}
+    trend["Actual"] = _series_on_axis(actual_prices, dates)
+    return {
+        "dates": dates,
+        "trend": trend,
+        "mae": _bar_series(mae_list),
+        "runtime": _bar_series(runtime_list),
+        "mape": _bar_series(mape_list)
+    }
+
+
+# Chart rendering pool
+# Figures are built with the object-oriented Figure API, so they share no
+# pyplot state and can be drawn in parallel. render_charts() draws the four
+# charts of /predict_plot in separate processes and waits for them,
+# submit_charts() returns job IDs right away for the client to poll with
+# chart_job_status().
+
+def _chart_tasks(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list):
+    return {
+        "priceChart": (plot_trend_chart, (predict_dictionary, actual_prices), "trend_chart"),
+        "MAEChart": (plot_error_bar_chart, (mae_list,), "error_bar_chart"),
+        "RuntimeChart": (plot_runtime_bar_chart, (runtime_list,), "runtime_bar_chart"),
+        "MAPEChart": (plot_mape_bar_chart, (mape_list,), "mape_bar_chart"),
+    }
+
+# Future of the chart path: already done for a cached chart, otherwise rendered in the pool
+def _submit_chart(pool, func, args, chart_type):
+    output_name = chart_file_name(chart_type, *args)
+    output_path = chart_cache.lookup(output_name)
+    if output_path is not None:
+        future = Future()
+        future.set_result(output_path)
+        return future
+
+    def record(done):
+        with _chart_lock:
+            if _pending_charts.get(output_name) is done:
+                del _pending_charts[output_name]
+        if not done.cancelled() and done.exception() is None:
+            chart_cache.record(output_name)
+
+    # Identical charts requested at the same time share one render
+    with _chart_lock:
+        future = _pending_charts.get(output_name)
+        if future is not None:
+            return future
+        future = _pending_charts[output_name] = pool.submit(func, *args, output_name=output_name)
+    future.add_done_callback(record)
+    return future
+
+def get_chart_pool():
+    global _chart_pool
+    with _chart_lock:
+        if _chart_pool is None:
+            # spawn keeps the workers free of the model frameworks loaded by the API process
+            _chart_pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _chart_pool
+
+def shutdown_chart_pool():
+    global _chart_pool
+    with _chart_lock:
+        if _chart_pool is not None:
+            _chart_pool.shutdown(wait=False, cancel_futures=True)
+            _chart_pool = None
+
+def render_charts(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list, timeout=CHART_TIMEOUT):
+    pool = get_chart_pool()
+    futures = {
+        chart: _submit_chart(pool, func, args, chart_type)
+        for chart, (func, args, chart_type) in _chart_tasks(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list).items()
+    }
+    return {chart: future.result(timeout=timeout) for chart, future in futures.items()}
+
+def submit_charts(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list):
+    pool = get_chart_pool()
+    job_ids = {}
+    for chart, (func, args, chart_type) in _chart_tasks(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list).items():
+        job_id = uuid.uuid4().hex
+        future = _submit_chart(pool, func, args, chart_type)
+        with _chart_lock:
+            _chart_jobs[job_id] = future
+            # Forget the oldest jobs, their charts stay on disk
+            while len(_chart_jobs) > MAX_CHART_JOBS:
+                _chart_jobs.popitem(last=False)
+        job_ids[chart] = job_id
+    return job_ids
+
+def chart_job_status(job_id):
+    with _chart_lock:
+        future = _chart_jobs.get(job_id)
+    if future is None:
+        return None
+    if not future.done():
+        return {"status": "pending"}
+    try:
+        return {"status": "done", "path": future.result()}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
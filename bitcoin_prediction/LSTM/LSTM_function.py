@@ -1,23 +1,181 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
-import requests
 import time
 import joblib
-from tensorflow.keras.models import load_model
 from sklearn.metrics import mean_absolute_error
-from sklearn.preprocessing import MinMaxScaler
 import sys
 import os
+import logging
 
-def predict_bitcoin_prices(start_date, end_date):
+from bitcoin_prediction.LSTM import numpy_lstm
+from bitcoin_prediction.market_data import price_dataset, price_store
+from bitcoin_prediction.serving import metrics
+
+logger = logging.getLogger(__name__)
+
+# 将 config 文件夹添加到 sys.path（config/__init__.py 导入的 DataConfig 不存在，不能作为包导入）
+config_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
+if config_dir not in sys.path:
+    sys.path.append(config_dir)
+from model_config import ModelConfig
+
+# Inference engine: 'keras' runs lstm_model.keras with TensorFlow, 'numpy' runs
+# the weights exported to lstm_weights.npz with numpy_lstm, without TensorFlow
+LSTM_ENGINE = os.environ.get('BITFLOW_LSTM_ENGINE', 'keras')
+
+def load_model(engine=None):
+    """
+    Load the LSTM model and the scalers it was trained with.
+    
+    Args:
+        engine (str, optional): 'keras' or 'numpy', LSTM_ENGINE if omitted
+    
+    Returns:
+        dict: Dictionary containing:
+            - model: Keras LSTM model, or numpy_lstm.NumpyLSTM for the numpy engine
+            - scaler_X (MinMaxScaler): Feature scaler
+            - scaler_y (MinMaxScaler): Target scaler
+            - x_scale, x_min (ndarray): scale_ and min_ of scaler_X as float32
+    """
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+    engine = engine or LSTM_ENGINE
+    if engine == 'numpy':
+        model = numpy_lstm.NumpyLSTM(os.path.join(models_dir, 'lstm_weights.npz'))
+    elif engine == 'keras':
+        from tensorflow.keras.models import load_model as load_keras_model
+
+        # 拼接模型文件的绝对路径
+        lstm_model_path = os.path.join(models_dir, 'lstm_model.keras')
+
+        # 检查模型文件是否存在
+        if not os.path.exists(lstm_model_path):
+            raise FileNotFoundError(f"Model file not found at {lstm_model_path}")
+        model = load_keras_model(lstm_model_path)
+    else:
+        raise ValueError(f"Unknown LSTM engine {engine!r}, expected 'keras' or 'numpy'")
+
+    scaler_X = joblib.load(os.path.join(models_dir, 'scaler_X.pkl'))
+    return {
+        'model': model,
+        'scaler_X': scaler_X,
+        'scaler_y': joblib.load(os.path.join(models_dir, 'scaler_y.pkl')),
+        # scaler_X as float32 arrays, applied in place by normalize_features
+        'x_scale': scaler_X.scale_.astype(np.float32),
+        'x_min': scaler_X.min_.astype(np.float32)
+    }
+
+FEATURES = ['Open', 'Volume', 'sentiment_scores', 'is_real_sentiment']
+TIME_STEPS = ModelConfig.TIME_STEPS
+
+# scaler_X was fitted on the Volume of bitcoin_price_sentiment_addmean.csv, the
+# volume of the last minute bar of each day in BTC, not the daily volume of the
+# price store, so the volume goes through price_dataset.training_volume.
+
+# Scaled features further than this outside [0, 1] are in other units than the
+# scaler was trained on (e.g. an unconverted daily volume)
+MAX_SCALED_DEVIATION = 2.0
+
+def check_scaled_range(X_normalized):
+    """
+    Raise ValueError when a scaled feature lies far outside the range of the
+    training data, instead of predicting from inputs in the wrong units.
+    """
+    if not len(X_normalized):
+        return
+    low, high = X_normalized.min(axis=0), X_normalized.max(axis=0)
+    for index, feature in enumerate(FEATURES):
+        if low[index] < -MAX_SCALED_DEVIATION or high[index] > 1 + MAX_SCALED_DEVIATION:
+            raise ValueError(
+                f"LSTM input {feature} scales to [{low[index]:.2f}, {high[index]:.2f}], "
+                f"far outside the range scaler_X was fitted on"
+            )
+
+def normalize_features(df, model_data):
+    """
+    Scale the model features of daily price rows with the persisted scaler_X.
+    
+    Args:
+        df (DataFrame): Daily rows with 'date', 'Open' and 'Volume' (daily volume
+            in BTC, the store's volumefrom) columns
+        model_data (dict): Artifacts from load_model()
+    
+    Returns:
+        ndarray: Contiguous float32 array of shape (len(df), len(FEATURES))
+    
+    Raises:
+        ValueError: A feature is far outside the range of the training data
+    """
+    # Daily tweet sentiment of the price store; a day without scored tweets is filled in
+    dates = pd.DatetimeIndex(df['date']).normalize()
+    sentiment = price_store.get_sentiment(dates.min(), dates.max()).reindex(dates)
+    X = np.empty((len(df), len(FEATURES)), dtype=np.float32)
+    X[:, 0] = df['Open'].to_numpy()
+    X[:, 1] = price_dataset.training_volume(dates, df['Volume'].to_numpy(), price_store.volume_scale())
+    X[:, 2] = sentiment['sentiment_scores'].to_numpy()
+    X[:, 3] = sentiment['tweet_count'].to_numpy() > 0
+    # MinMaxScaler.transform is X * scale_ + min_
+    X *= model_data['x_scale']
+    X += model_data['x_min']
+    check_scaled_range(X)
+    return X
+
+def windows(X_normalized, time_steps=TIME_STEPS):
+    """
+    Input windows of every day after the first time_steps rows, as a read-only
+    view of X_normalized (no copy): window i holds rows i .. i + time_steps - 1
+    and predicts row i + time_steps.
+    
+    Returns:
+        ndarray: View of shape (len(X_normalized) - time_steps, time_steps, n_features)
+    """
+    view = np.lib.stride_tricks.sliding_window_view(X_normalized, time_steps, axis=0)
+    return view[:-1].transpose(0, 2, 1)
+
+def prepare_sequences(df, model_data):
+    """
+    Build the normalized LSTM input windows from daily price rows.
+    
+    Args:
+        df (DataFrame): Daily rows with 'date', 'Open', 'Volume' and 'Close' columns,
+            the first TIME_STEPS rows only serve as history for the first window
+        model_data (dict): Artifacts from load_model()
+    
+    Returns:
+        tuple: (X_seq, y_actual) where y_actual holds the actual prices of
+            the predicted days
+    """
+    X_seq = windows(normalize_features(df, model_data))
+    y_actual = df['Close'].to_numpy()[TIME_STEPS:]
+    return X_seq, y_actual
+
+def evaluate_predictions(y_pred_normalized, y_actual, scaler_y):
+    """
+    Inverse transform normalized predictions and compute the metrics.
+    
+    Returns:
+        tuple: (y_pred, mae, mape)
+    """
+    # Inverse transform predictions
+    y_pred = scaler_y.inverse_transform(y_pred_normalized)
+    
+    # Calculate metrics
+    mae = mean_absolute_error(y_actual, y_pred)
+    mape = np.mean(np.abs((y_actual - y_pred) / y_actual)) * 100
+    return y_pred, mae, mape
+
+def predict_bitcoin_prices(start_date, end_date, model_data=None, engine=None):
     """
     Predict Bitcoin prices for a specified date range using LSTM model.
     
     Args:
         start_date (str): Start date in format 'YYYY-MM-DD'
         end_date (str): End date in format 'YYYY-MM-DD'
+        model_data (dict, optional): Artifacts from load_model(), e.g. the
+            shared ones from the model registry. Loaded from disk if omitted.
+        engine (str, optional): 'keras' or 'numpy' when model_data is loaded
+            here, LSTM_ENGINE if omitted
     
     Returns:
         dict: Dictionary containing:
@@ -30,28 +188,11 @@ def predict_bitcoin_prices(start_date, end_date):
     
     def fetch_crypto_data(start_date, end_date):
         """
-        Fetch Bitcoin price data from CryptoCompare API
+        Fetch Bitcoin price data from the local price store, starting TIME_STEPS
+        days before start_date as history for the first window
         """
-        start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp())
-        end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp())
-        days = (end_ts - start_ts) // 86400
-        
-        url = "https://min-api.cryptocompare.com/data/v2/histoday"
-        params = {
-            "fsym": "BTC",
-            "tsym": "USD",
-            "limit": days + 30,
-            "toTs": end_ts
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data['Response'] != 'Success':
-            raise Exception(f"API Error: {data.get('Message', 'Unknown error')}")
-            
-        df = pd.DataFrame(data['Data']['Data'])
-        df['date'] = pd.to_datetime(df['time'], unit='s')
+        history_start = pd.to_datetime(start_date) - pd.Timedelta(days=TIME_STEPS)
+        df = price_store.get_prices(history_start, end_date).reset_index()
         df = df.rename(columns={
             'open': 'Open',
             'high': 'High',
@@ -63,104 +204,28 @@ def predict_bitcoin_prices(start_date, end_date):
         return df
     
     try:
-        # 添加项目根目录到 sys.path
-        # current_dir = os.path.dirname(os.path.abspath(__file__))  # 获取 LSTM_function.py 所在目录
-        # project_root = os.path.join(current_dir, '.')  # 获取项目根目录
-        # sys.path.append(project_root)       
-
-        # 现在可以导入 config 内的 model_config
-        #from config.model_config import ModelConfig
-        # Load model and setup
-
-        # 获取当前脚本的绝对路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))        
-
-        # 拼接 config 文件夹的绝对路径
-        config_dir = os.path.join(current_dir, 'config')        
-
-        # 将 config 文件夹添加到 sys.path
-        sys.path.append(config_dir)
-        print("sys.path:", sys.path)
-        #sys.path.append('./config')
-        from model_config import ModelConfig
-
-        # 获取当前脚本的绝对路径
-        lstm_current_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # 拼接模型文件的绝对路径
-        lstm_model_path = os.path.join(lstm_current_dir, 'models', 'lstm_model.keras')
-
-        # 检查模型文件是否存在
-        if not os.path.exists(lstm_model_path):
-            raise FileNotFoundError(f"Model file not found at {lstm_model_path}")
-
         # 加载模型
-        model = load_model(lstm_model_path)
+        if model_data is None:
+            model_data = load_model(engine)
+        model = model_data['model']
 
         #model = load_model('./models/lstm_model.keras')
         
         # Fetch and prepare data
-        df = fetch_crypto_data(start_date, end_date)
-        df['sentiment_scores'] = 0.5
-        df['is_real_sentiment'] = False
-        
-        # Prepare features
-        features = ['Open', 'Volume', 'sentiment_scores', 'is_real_sentiment']
-        X = df[features]
-        y = df['Close']
-        
-        # Normalize data
-        scaler_X_new = MinMaxScaler()
-        scaler_y_new = MinMaxScaler()
-        X_normalized = pd.DataFrame(
-            scaler_X_new.fit_transform(X),
-            columns=X.columns,
-            index=X.index
-        )
-        y_normalized = pd.DataFrame(
-            scaler_y_new.fit_transform(y.values.reshape(-1, 1)),
-            columns=['Close'],
-            index=y.index
-        )
-        
-        # Create sequences
-        def create_sequences(X, y, time_steps=30):
-            Xs, ys = [], []
-            for i in range(len(X) - time_steps):
-                Xs.append(X.iloc[i:(i + time_steps)].values)
-                ys.append(y.iloc[i + time_steps])
-            return np.array(Xs), np.array(ys)
-        
-        X_seq, y_seq = create_sequences(X_normalized, y_normalized)
+        with metrics.stage('LSTM', 'fetch'):
+            df = fetch_crypto_data(start_date, end_date)
+        with metrics.stage('LSTM', 'feature_prep'):
+            X_seq, y_actual = prepare_sequences(df, model_data)
         
         # Make predictions
         start_time = time.time()
-        y_pred_normalized = model.predict(X_seq, verbose=0)
+        with metrics.stage('LSTM', 'inference'):
+            y_pred_normalized = model.predict(X_seq, verbose=0)
         end_time = time.time()
         prediction_runtime = int((end_time - start_time) * 1000)
         
-        # Inverse transform predictions
-        y_pred = scaler_y_new.inverse_transform(y_pred_normalized)
-        y_actual = y.iloc[30:].values
-        
-        # Calculate metrics
-        mae = mean_absolute_error(y_actual, y_pred)
-        mape = np.mean(np.abs((y_actual - y_pred) / y_actual)) * 100
-        
-        # Create and save plot
-        # os.makedirs('./output', exist_ok=True)
-        plt.figure(figsize=(15, 7))
-        plt.plot(df['date'][30:], y_actual, label='Actual Price', color='blue', alpha=0.7)
-        plt.plot(df['date'][30:], y_pred, label='Predicted Price', color='red', alpha=0.7)
-        plt.title('Bitcoin Price: Actual vs Predicted')
-        plt.xlabel('Date')
-        plt.ylabel('Price ($)')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        # plt.savefig('./output/prediction_plot.png')
-        plt.close()
+        with metrics.stage('LSTM', 'metrics'):
+            y_pred, mae, mape = evaluate_predictions(y_pred_normalized, y_actual, model_data['scaler_y'])
         
         return {
             'mae': float(mae),
@@ -177,6 +242,66 @@ def predict_bitcoin_prices(start_date, end_date):
         # print(f"Error during prediction: {str(e)}")
         # return None
 
+def predict_batch(date_ranges, prices, model_data=None):
+    """
+    Predict several date ranges at once, in the same format as predict_bitcoin_prices.
+    The windows of all ranges are stacked and go through a single model.predict call.
+    
+    Args:
+        date_ranges (list): [(start_date, end_date), ...] in format 'YYYY-MM-DD'
+        prices (DataFrame): Daily CryptoCompare histoday rows indexed by date,
+            covering every range plus TIME_STEPS days of history before the earliest
+        model_data (dict, optional): Artifacts from load_model()
+    
+    Returns:
+        list: One result dictionary per date range
+    """
+    if model_data is None:
+        model_data = load_model()
+    model = model_data['model']
+
+    prices = prices.rename(columns={
+        'open': 'Open',
+        'high': 'High',
+        'low': 'Low',
+        'close': 'Close',
+        'volumefrom': 'Volume'
+    })
+    # Normalize the whole frame once; the windows of every range are slices of one view
+    with metrics.stage('LSTM', 'feature_prep'):
+        prices = prices.rename_axis('date').reset_index()
+        all_windows = windows(normalize_features(prices, model_data))
+        all_actual = prices['Close'].to_numpy()
+        dates = pd.DatetimeIndex(prices['date'])
+        prepared = []
+        for start_date, end_date in date_ranges:
+            start = dates.searchsorted(pd.to_datetime(start_date))
+            stop = dates.searchsorted(pd.to_datetime(end_date), side='right')
+            if start < TIME_STEPS:
+                raise ValueError(f"prices need {TIME_STEPS} days of history before {start_date}")
+            prepared.append((all_windows[start - TIME_STEPS:stop - TIME_STEPS], all_actual[start:stop]))
+
+    # Make predictions
+    start_time = time.time()
+    with metrics.stage('LSTM', 'inference'):
+        y_pred_normalized = model.predict(np.concatenate([X_seq for X_seq, _ in prepared]), verbose=0)
+    end_time = time.time()
+    prediction_runtime = int((end_time - start_time) * 1000)
+
+    results = []
+    offset = 0
+    for X_seq, y_actual in prepared:
+        y_pred, mae, mape = evaluate_predictions(y_pred_normalized[offset:offset + len(X_seq)], y_actual, model_data['scaler_y'])
+        offset += len(X_seq)
+        results.append({
+            'mae': float(mae),
+            'mape': float(mape),
+            'runtime': prediction_runtime,
+            'pred_list': y_pred.flatten().tolist(),
+            'actual_prices': y_actual.flatten().tolist()
+        })
+    return results
+
 # Test code 
 '''
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+"""
+NumPy inference engine for the LSTM model, without TensorFlow.
+
+Serving the model only needs its forward pass: two LSTM layers (128 and 64
+units, tanh / sigmoid) and a linear Dense layer; the Dropout layers are the
+identity at inference. The weights are exported once from lstm_model.keras
+into a small .npz file:
+
+    lstm0_kernel, lstm0_recurrent_kernel, lstm0_bias    first LSTM layer
+    lstm1_kernel, ...                                   next LSTM layers
+    dense_kernel, dense_bias                            output layer
+
+The gates are stacked in the Keras order (input, forget, cell, output).
+NumpyLSTM runs the whole batch of windows at once in float32: the input
+projection of every time step is a single matmul, then one recurrent matmul
+per time step.
+
+The export reads the .keras archive (config.json and model.weights.h5) with
+h5py, so it does not need TensorFlow either:
+    python -m bitcoin_prediction.LSTM.numpy_lstm
+
+Usage:
+    from bitcoin_prediction.LSTM import numpy_lstm
+
+    model = numpy_lstm.NumpyLSTM()
+    y_pred_normalized = model.predict(X_seq)  # same call as the Keras model
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import zipfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+KERAS_MODEL_PATH = os.path.join(MODELS_DIR, 'lstm_model.keras')
+WEIGHTS_PATH = os.path.join(MODELS_DIR, 'lstm_weights.npz')
+
+
+def _check(layer_config, **expected):
+    for key, value in expected.items():
+        if layer_config.get(key, value) != value:
+            raise ValueError(f"Layer {layer_config['name']}: {key}={layer_config[key]!r} is not supported, expected {value!r}")
+
+
+# Export the weights of a Keras 3 .keras model into an .npz file for NumpyLSTM
+def export(model_path=KERAS_MODEL_PATH, output=WEIGHTS_PATH):
+    import h5py
+
+    with zipfile.ZipFile(model_path) as archive:
+        config = json.loads(archive.read('config.json'))
+        weights_file = io.BytesIO(archive.read('model.weights.h5'))
+
+    arrays = {}
+    lstm_layers = 0
+    with h5py.File(weights_file, 'r') as weights:
+        for layer in config['config']['layers']:
+            kind, layer_config = layer['class_name'], layer['config']
+            name = layer_config['name']
+            if kind == 'LSTM':
+                _check(layer_config, activation='tanh', recurrent_activation='sigmoid', use_bias=True,
+                       go_backwards=False, stateful=False)
+                variables = weights[f'layers/{name}/cell/vars']
+                prefix = f"lstm{lstm_layers}"
+                arrays[f"{prefix}_kernel"] = variables['0'][()]
+                arrays[f"{prefix}_recurrent_kernel"] = variables['1'][()]
+                arrays[f"{prefix}_bias"] = variables['2'][()]
+                lstm_layers += 1
+            elif kind == 'Dense':
+                if 'dense_kernel' in arrays:
+                    raise ValueError("Only one Dense layer after the LSTM layers is supported")
+                _check(layer_config, activation='linear', use_bias=True)
+                variables = weights[f'layers/{name}/vars']
+                arrays['dense_kernel'] = variables['0'][()]
+                arrays['dense_bias'] = variables['1'][()]
+            elif kind not in ('InputLayer', 'Dropout'):
+                raise ValueError(f"Layer {name} of type {kind} is not supported")
+
+    if not lstm_layers or 'dense_kernel' not in arrays:
+        raise ValueError(f"{model_path} is not an LSTM model with a Dense output layer")
+    np.savez(output, **{key: value.astype(np.float32) for key, value in arrays.items()})
+    logger.info(f"Exported {lstm_layers} LSTM layers and the Dense layer of {model_path} to {output}")
+
+
+def _sigmoid(x):
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+# One LSTM layer over x of shape (windows, time steps, features)
+def _lstm(x, kernel, recurrent_kernel, bias, return_sequences):
+    windows, steps, features = x.shape
+    units = recurrent_kernel.shape[0]
+    projected = (x.reshape(-1, features) @ kernel + bias).reshape(windows, steps, 4 * units)
+
+    h = np.zeros((windows, units), dtype=np.float32)
+    c = np.zeros((windows, units), dtype=np.float32)
+    outputs = np.empty((windows, steps, units), dtype=np.float32) if return_sequences else None
+    for step in range(steps):
+        z = projected[:, step] + h @ recurrent_kernel
+        gates = _sigmoid(z)
+        i, f, o = gates[:, :units], gates[:, units:2 * units], gates[:, 3 * units:]
+        c = f * c + i * np.tanh(z[:, 2 * units:3 * units])
+        h = o * np.tanh(c)
+        if outputs is not None:
+            outputs[:, step] = h
+    return outputs if return_sequences else h
+
+
+class NumpyLSTM:
+    def __init__(self, path=WEIGHTS_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"LSTM weights not found at {path}, export them with: python -m bitcoin_prediction.LSTM.numpy_lstm"
+            )
+        with np.load(path) as data:
+            self.layers = []
+            while f"lstm{len(self.layers)}_kernel" in data:
+                prefix = f"lstm{len(self.layers)}"
+                self.layers.append(tuple(
+                    np.ascontiguousarray(data[f"{prefix}_{name}"], dtype=np.float32)
+                    for name in ('kernel', 'recurrent_kernel', 'bias')
+                ))
+            self.dense_kernel = data['dense_kernel'].astype(np.float32)
+            self.dense_bias = data['dense_bias'].astype(np.float32)
+
+    # Outputs of a batch of windows (windows, time steps, features), shape (windows, 1).
+    # verbose is accepted for compatibility with the Keras model.predict call.
+    def predict(self, X, verbose=0):
+        h = np.asarray(X, dtype=np.float32)
+        for index, (kernel, recurrent_kernel, bias) in enumerate(self.layers):
+            h = _lstm(h, kernel, recurrent_kernel, bias, return_sequences=index < len(self.layers) - 1)
+        return h @ self.dense_kernel + self.dense_bias
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Export the LSTM weights of a .keras model for the NumPy engine.")
+    parser.add_argument('--model', default=KERAS_MODEL_PATH)
+    parser.add_argument('--output', default=WEIGHTS_PATH)
+    args = parser.parse_args()
+    export(args.model, args.output)
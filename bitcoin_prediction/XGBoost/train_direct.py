@@ -0,0 +1,134 @@
+"""
+Train the direct multi-horizon XGBoost model (xgboost_direct_model.pkl).
+
+The recursive model predicts one day and feeds the prediction back as the lag
+of the next day, so a 90-day forecast is 90 dependent model calls. The direct
+model instead predicts the close `horizon` days after the last known day from
+the features of that day and the horizon:
+
+    Open, High, Low, Volume, sentiment_scores   of the last known day t
+    lag1, lag2, lag7, rolling_mean_7/std_7      of the closes up to day t
+    horizon                                     1 .. max_horizon
+    target                                      log(Close of day t + horizon / Close of day t)
+
+The price-level features are divided by the close of day t (see
+xgboost_function.relative_features), so the model does not learn the price
+levels of the training years. Every day of a forecast, and every anchor of a
+batch, is one row of a single predict call. The training data is the bundled
+daily history (bitcoin_price_sentiment_addmean.csv), split 80/20 in time like
+xgboost.ipynb; MAE and MAPE of the test anchors are stored with the model,
+next to the MAPE of repeating the last close (naive_mape).
+
+The direct model is faster, not more accurate: one model for all horizons
+does not beat the recursive model, or even the last close, at long horizons.
+xgboost_function only uses a direct model whose test MAPE beats naive_mape.
+
+Usage:
+    python -m bitcoin_prediction.XGBoost.train_direct --max-horizon 90
+"""
+
+import argparse
+import logging
+import pickle
+import time
+
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
+
+from bitcoin_prediction.XGBoost.xgboost_function import (
+    DIRECT_FEATURE_NAMES, DIRECT_MODEL_PATH, FEATURE_NAMES, relative_features
+)
+from bitcoin_prediction.features import rolling_features
+from bitcoin_prediction.market_data import price_dataset
+
+logger = logging.getLogger(__name__)
+
+MAX_HORIZON = 90
+NUM_ROUNDS = 200
+TRAIN_FRACTION = 0.8
+
+# Parameters of xgboost.ipynb with a higher learning rate, the direct model
+# sees max_horizon times more rows, and shallower trees, deeper ones overfit
+# the trend of the training years
+PARAMS = {
+    'booster': 'gbtree',
+    'objective': 'reg:squarederror',
+    'learning_rate': 0.05,
+    'max_depth': 3,
+    'min_child_weight': 9,
+    'gamma': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'lambda': 20,
+    'alpha': 5,
+    'eval_metric': 'mae'
+}
+
+
+# Feature rows of every anchor day (the last known day of a forecast),
+# indexed by date, and the dense daily closes used as targets
+def anchor_features():
+    frame = price_dataset.load().frame()
+    closes = frame['Close'].dropna()
+    # Features of the day after each close are the state after pushing it
+    rolling = rolling_features.history_features(closes).shift(-1)
+    anchors = frame[['Open', 'High', 'Low', 'Volume', 'sentiment_scores']].join(rolling, how='inner')
+    return anchors[FEATURE_NAMES].dropna(), frame['Close']
+
+
+# Stack one row per (anchor, horizon) of the direct model features, with its
+# target close and the last known close of the anchor
+def horizon_rows(anchors, closes, max_horizon):
+    positions = closes.index.get_indexer(anchors.index)
+    close_values = closes.to_numpy()
+    features = relative_features(anchors).to_numpy()
+    last_close = anchors['lag1'].to_numpy()
+    blocks, targets, last_closes = [], [], []
+    for horizon in range(1, max_horizon + 1):
+        target_positions = positions + horizon
+        inside = target_positions < len(close_values)
+        target = np.full(len(positions), np.nan)
+        target[inside] = close_values[target_positions[inside]]
+        block = np.column_stack([features, np.full(len(anchors), horizon)])
+        keep = ~np.isnan(target)
+        blocks.append(block[keep])
+        targets.append(target[keep])
+        last_closes.append(last_close[keep])
+    return np.concatenate(blocks).astype(np.float32), np.concatenate(targets), np.concatenate(last_closes)
+
+
+def train(max_horizon=MAX_HORIZON, num_rounds=NUM_ROUNDS, output=DIRECT_MODEL_PATH):
+    anchors, closes = anchor_features()
+    split = int(len(anchors) * TRAIN_FRACTION)
+    X_train, y_train, last_train = horizon_rows(anchors.iloc[:split], closes, max_horizon)
+    X_test, y_test, last_test = horizon_rows(anchors.iloc[split:], closes, max_horizon)
+    logger.info(f"Training on {len(X_train)} rows ({split} anchors x {max_horizon} horizons)")
+
+    training_start_time = time.time()
+    dtrain = xgb.DMatrix(X_train, label=np.log(y_train / last_train), feature_names=DIRECT_FEATURE_NAMES)
+    bst = xgb.train(PARAMS, dtrain, num_boost_round=num_rounds)
+    logger.info(f"Training time: {time.time() - training_start_time:.2f} seconds")
+
+    y_pred = np.exp(bst.inplace_predict(X_test).astype(np.float64)) * last_test
+    mae = mean_absolute_error(y_test, y_pred)
+    mape = mean_absolute_percentage_error(y_test, y_pred) * 100
+    naive_mape = mean_absolute_percentage_error(y_test, last_test) * 100
+    logger.info(f"Test MAE: {mae:.2f}, MAPE: {mape:.2f}% (last close: {naive_mape:.2f}%)")
+
+    with open(output, 'wb') as file:
+        pickle.dump(
+            {'model': bst, 'max_horizon': max_horizon, 'mae': mae, 'mape': mape, 'naive_mape': naive_mape}, file
+        )
+    logger.info(f"Saved the direct model to {output}")
+    return bst
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Train the direct multi-horizon XGBoost model.")
+    parser.add_argument('--max-horizon', type=int, default=MAX_HORIZON)
+    parser.add_argument('--num-rounds', type=int, default=NUM_ROUNDS)
+    parser.add_argument('--output', default=DIRECT_MODEL_PATH)
+    args = parser.parse_args()
+    train(args.max_horizon, args.num_rounds, args.output)
@@ -4,12 +4,33 @@ import numpy as np
 import time
 from datetime import datetime
 import xgboost as xgb
-import requests
 import os
+import logging
 from sklearn.metrics import mean_absolute_error, mean_squared_error, mean_absolute_percentage_error
 
-# Load the xgboost model
-def load_model():
+from bitcoin_prediction.features import rolling_features
+from bitcoin_prediction.market_data import price_dataset, price_store
+from bitcoin_prediction.serving import metrics
+
+logger = logging.getLogger(__name__)
+
+# Forecasting mode:
+#   recursive   one model call per day, every prediction is the lag of the next day
+#   direct      every day of the horizon at once from the last known day, with the
+#               multi-horizon model of train_direct.py; horizons longer than it
+#               was trained for fall back to recursive. Faster but less
+#               accurate than recursive; opt-in only, and a direct model whose
+#               test MAPE does not beat repeating the last close is not used
+XGBOOST_MODE = os.environ.get('BITFLOW_XGBOOST_MODE', 'recursive')
+DIRECT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xgboost_direct_model.pkl')
+
+# Whether a direct model from train_direct.py beats repeating the last close on its test anchors
+def direct_model_validated(direct):
+    return direct.get('naive_mape') is not None and direct['mape'] < direct['naive_mape']
+
+# Load the xgboost model, with the direct model under 'direct' in direct mode
+# when it is validated (see direct_model_validated)
+def load_model(mode=None):
     # 获取当前文件所在目录
     current_dir = os.path.dirname(os.path.abspath(__file__))
     # 拼接模型文件的完整路径
@@ -18,6 +39,20 @@ def load_model():
     # 加载模型
     with open(model_path, 'rb') as file:
         model_data = pickle.load(file)
+
+    mode = mode or XGBOOST_MODE
+    if mode == 'direct':
+        with open(DIRECT_MODEL_PATH, 'rb') as file:
+            direct = pickle.load(file)
+        if direct_model_validated(direct):
+            model_data['direct'] = direct
+        else:
+            logger.warning(
+                f"The direct XGBoost model (test MAPE {direct['mape']:.2f}%) does not beat the last close "
+                f"(MAPE {direct.get('naive_mape', float('nan')):.2f}%), forecasting recursively"
+            )
+    elif mode != 'recursive':
+        raise ValueError(f"Unknown XGBoost mode {mode!r}, expected 'recursive' or 'direct'")
     
     return model_data
 # def load_model():
@@ -27,28 +62,9 @@ def load_model():
 
 def fetch_crypto_data(start_date, end_date):
         """
-        Fetch Bitcoin price data from CryptoCompare API
+        Fetch Bitcoin price data from the local price store
         """
-        start_ts = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp())
-        end_ts = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp())
-        days = (end_ts - start_ts) // 86400 + 1
-        
-        url = "https://min-api.cryptocompare.com/data/v2/histoday"
-        params = {
-            "fsym": "BTC",
-            "tsym": "USD",
-            "limit": days,
-            "toTs": end_ts
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data['Response'] != 'Success':
-            raise Exception(f"API Error: {data.get('Message', 'Unknown error')}")
-            
-        df = pd.DataFrame(data['Data']['Data'])
-        df['date'] = pd.to_datetime(df['time'], unit='s')
+        df = price_store.get_prices(start_date, end_date)
         df = df.rename(columns={
             'open': 'Open',
             'high': 'High',
@@ -57,74 +73,156 @@ def fetch_crypto_data(start_date, end_date):
             'volumefrom': 'Volume'
         })
         
-        # Debugging
-        # print(f"Requested days: {days}, Actual returned rows: {len(df)}")
-        # print(f"Fetched data: {df[['date', 'Close']].head()}")
-
-        # Ensure data length matches the requested range
-        df = df[-days:]  # Only keep the last 'days' rows, if extra data is returned
-        
         # Fill or align data to match requested date range
         expected_dates = pd.date_range(start_date, end_date)
-        df = df.set_index('date').reindex(expected_dates, method='nearest').reset_index()
+        df = df.reindex(expected_dates, method='nearest').reset_index()
 
         return df
 
+FEATURE_NAMES = ['Open', 'High', 'Low', 'Volume', 'sentiment_scores', 'lag1', 'lag2', 'lag7', 'rolling_mean_7', 'rolling_std_7']
+DIRECT_FEATURE_NAMES = FEATURE_NAMES + ['horizon']
+
+# Price-level features the direct model sees relative to the last known close
+# (lag1); it predicts log(close / last close), so it does not depend on the
+# price level of the training years
+RELATIVE_FEATURE_NAMES = ['Open', 'High', 'Low', 'lag2', 'lag7', 'rolling_mean_7', 'rolling_std_7', 'lag1']
+
+# Direct model features of a feature row (a dict, or a DataFrame of rows)
+def relative_features(features):
+    features = features.copy()
+    last_close = features['lag1']
+    for name in RELATIVE_FEATURE_NAMES:
+        features[name] = features[name] / last_close
+    return features
+
+# Initial state of a recursive forecast starting at start_date: the lag and
+# rolling features after the last known close before start_date, the feature
+# row of that day and the number of days between it and start_date.
+# Volume is in the units of the training CSV (see price_dataset.training_volume).
+# No tweets are scored for the forecast days yet, so they get the mean
+# sentiment of the days before start_date.
+def forecast_state(start_date):
+    state, last_known = rolling_features.state_before(start_date)
+    row = {
+        'Open': last_known['open'],
+        'High': last_known['high'],
+        'Low': last_known['low'],
+        'Volume': price_dataset.training_volume(
+            pd.DatetimeIndex([last_known.name]), [last_known['volumefrom']], price_store.volume_scale()
+        )[0],
+        'sentiment_scores': price_store.sentiment_before(start_date)
+    }
+    gap = (pd.Timestamp(start_date).normalize() - last_known.name).days - 1
+    return state, row, gap
+
+# Recursively predict the next `steps` days after the state from forecast_state().
+# Every predicted close is pushed into the rolling features (O(1) per step), so
+# the lags of the next step are correct. Open follows the previous predicted
+# close; High, Low and Volume stay at the last known day.
+# The feature row lives in one preallocated float32 buffer that is updated in
+# place and passed to Booster.inplace_predict, so a step costs no DataFrame or
+# DMatrix construction. The mean time of a step goes to
+# metrics.forecast_step_seconds.
+def recursive_forecast(model, steps, state, row):
+    state = state.copy()
+    buffer = np.array([[row.get(name, np.nan) for name in FEATURE_NAMES]], dtype=np.float32)
+    lag_columns = [(FEATURE_NAMES.index(f"lag{lag}"), lag) for lag in state.lags]
+    mean_column = FEATURE_NAMES.index(f"rolling_mean_{state.window}")
+    std_column = FEATURE_NAMES.index(f"rolling_std_{state.window}")
+    open_column = FEATURE_NAMES.index('Open')
+    future_predictions = np.empty(steps)
+
+    start_time = time.perf_counter()
+    for step in range(steps):
+        for column, lag in lag_columns:
+            buffer[0, column] = state.lag(lag)
+        buffer[0, mean_column] = state.mean()
+        buffer[0, std_column] = state.std()
+
+        next_pred = float(model.inplace_predict(buffer)[0])
+        future_predictions[step] = next_pred
+
+        state.push(next_pred)
+        buffer[0, open_column] = next_pred
+    if steps:
+        metrics.forecast_step_seconds.observe((time.perf_counter() - start_time) / steps, model='XGBoost')
+
+    return future_predictions.tolist()
+
+# Predict every horizon of several anchors with the direct model in one call.
+# anchors: [(state, row, first_horizon, last_horizon), ...] with state and row
+# from forecast_state(); returns one list of predictions per anchor.
+def direct_forecast(model, anchors):
+    blocks, last_closes = [], []
+    for state, row, first_horizon, last_horizon in anchors:
+        features = dict(row)
+        features.update(state.features())
+        block = np.empty((last_horizon - first_horizon + 1, len(DIRECT_FEATURE_NAMES)), dtype=np.float32)
+        relative = relative_features(features)
+        block[:, :-1] = [relative[name] for name in FEATURE_NAMES]
+        block[:, -1] = np.arange(first_horizon, last_horizon + 1)
+        blocks.append(block)
+        last_closes.append(np.full(len(block), features['lag1']))
+
+    start_time = time.perf_counter()
+    log_ratios = model.inplace_predict(np.concatenate(blocks)).astype(np.float64)
+    predictions = np.exp(log_ratios) * np.concatenate(last_closes)
+    metrics.forecast_step_seconds.observe((time.perf_counter() - start_time) / len(predictions), model='XGBoost')
+    return [part.tolist() for part in np.split(predictions, np.cumsum([len(block) for block in blocks])[:-1])]
+
+# Forecast the days from start to start + steps - 1 of every (state, row, gap, steps)
+# from forecast_state(), with the direct model when it is loaded and covers the
+# horizon, else recursively. Returns one list of predictions per forecast.
+def forecast(model_data, forecasts):
+    direct = model_data.get('direct')
+    results = [None] * len(forecasts)
+    anchors, anchor_indexes = [], []
+    for index, (state, row, gap, steps) in enumerate(forecasts):
+        if direct is not None and gap + steps <= direct['max_horizon']:
+            anchors.append((state, row, gap + 1, gap + steps))
+            anchor_indexes.append(index)
+        else:
+            if direct is not None:
+                logger.debug(f"Horizon of {gap + steps} days is beyond the direct model, forecasting recursively")
+            results[index] = recursive_forecast(model_data['model'], gap + steps, state, row)[gap:]
+    if anchors:
+        for index, predictions in zip(anchor_indexes, direct_forecast(direct['model'], anchors)):
+            results[index] = predictions
+    return results
+
 # Predict Bitcoin prices using xgboost model
-def predict_prices(start_date, end_date):
-    model_data = load_model()
-    model = model_data['model']
+# model_data: artifacts from load_model(), e.g. the shared ones from the model registry
+def predict_prices(start_date, end_date, model_data=None):
+    if model_data is None:
+        model_data = load_model()
     # mae = model_data['mae']
     # mape = model_data['mape']
 
-    # Generate the future date range
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    # Placeholder for exogenous data if needed
-    exogenous_data = pd.DataFrame({'sentiment_scores': [0] * len(date_range)}, index=date_range)
-
-    # Placeholder for storing predictions
-    future_predictions = []
-
-    # Assume we have the last row of data as the starting point
-    last_row = pd.Series({
-        'Open': 73297.0,  # Replace with the last known open value
-        'High': 73508.0,  # Replace with the last known high value
-        'Low': 73297.0,   # Replace with the last known low value
-        'Volume': 146.055446, # Replace with the last known volume value
-        'sentiment_scores': 0.318447,  # Replace with the last known sentiment score if applicable
-        'lag1': 73468.0,
-        'lag2': 73468.0,
-        'lag7': 73468.0,
-        'rolling_mean_7': 70463.285714,
-        'rolling_std_7': 4689.409537,
-    })
-
-    start_time = time.time()
-    # Iteratively predict the next day's price
-    for _ in range(len(date_range)):
-        input_data = np.array([last_row.values]).reshape(1, -1)
-
-        feature_names = ['Open', 'High', 'Low', 'Volume', 'sentiment_scores', 'lag1', 'lag2', 'lag7', 'rolling_mean_7', 'rolling_std_7']
-        dmatrix = xgb.DMatrix(input_data, feature_names=feature_names)  # Convert to DMatrix format
+    with metrics.stage('XGBoost', 'feature_prep'):
+        # Generate the future date range
+        start_date = pd.to_datetime(start_date)
+        end_date = pd.to_datetime(end_date)
+        date_range = pd.date_range(start=start_date, end=end_date, freq='D')
         
-        next_pred = model.predict(dmatrix)[0]
-        future_predictions.append(next_pred)
-        
-        # Update last_row for the next iteration (simulate lag features if necessary)
-        last_row['Open'] = next_pred  # You can update based on your feature engineering logic
+        # Days between the last known close and start_date are forecast too, then dropped
+        state, row, gap = forecast_state(start_date)
 
+    steps = gap + len(date_range)
+    start_time = time.time()
+    with metrics.stage('XGBoost', 'inference'):
+        future_predictions = forecast(model_data, [(state, row, gap, len(date_range))])[0]
     end_time = time.time()
     runtime = int((end_time - start_time) * 1000) # milliseconds
+    step_runtime = (end_time - start_time) * 1e6 / steps # microseconds per forecast day
 
     future_predictions = [round(pred, 3) for pred in future_predictions]
 
-    df = fetch_crypto_data(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-    actual_price = df['Close']
-    mae = mean_absolute_error(future_predictions, actual_price)
-    mape = mean_absolute_percentage_error(future_predictions, actual_price) * 100
+    with metrics.stage('XGBoost', 'fetch'):
+        df = fetch_crypto_data(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    with metrics.stage('XGBoost', 'metrics'):
+        actual_price = df['Close']
+        mae = mean_absolute_error(future_predictions, actual_price)
+        mape = mean_absolute_percentage_error(future_predictions, actual_price) * 100
 
     # Convert predictions to DataFrame
     pred_df = pd.DataFrame({'Date': date_range, 'Predicted_Price': future_predictions})
@@ -133,9 +231,51 @@ def predict_prices(start_date, end_date):
         'mae': mae,
         'mape': mape,
         'runtime': runtime,
+        'step_runtime_us': round(step_runtime, 1),
         'predictions': pred_df
     }
 
+# Predict several date ranges at once, in the same format as predict_prices.
+# The forecast runs once per start date for the longest horizon and every range
+# with that start date takes its prefix; in direct mode all start dates share a
+# single predict call.
+# date_ranges: [(start_date, end_date), ...]
+# prices: daily CryptoCompare histoday rows indexed by date, covering every range
+def predict_batch(date_ranges, prices, model_data=None):
+    if model_data is None:
+        model_data = load_model()
+
+    date_ranges = [pd.date_range(start=start_date, end=end_date, freq='D') for start_date, end_date in date_ranges]
+    horizons = {}
+    for date_range in date_ranges:
+        horizons[date_range[0]] = max(horizons.get(date_range[0], 0), len(date_range))
+
+    with metrics.stage('XGBoost', 'feature_prep'):
+        states = {start_date: forecast_state(start_date) for start_date in horizons}
+
+    start_time = time.time()
+    all_predictions = {}
+    with metrics.stage('XGBoost', 'inference'):
+        forecasts = forecast(model_data, [states[start_date] + (steps,) for start_date, steps in horizons.items()])
+        for start_date, predictions in zip(horizons, forecasts):
+            all_predictions[start_date] = [round(pred, 3) for pred in predictions]
+    end_time = time.time()
+    runtime = int((end_time - start_time) * 1000) # milliseconds
+
+    results = []
+    for date_range in date_ranges:
+        future_predictions = all_predictions[date_range[0]][:len(date_range)]
+        actual_price = prices['close'].reindex(date_range, method='nearest')
+        mae = mean_absolute_error(future_predictions, actual_price)
+        mape = mean_absolute_percentage_error(future_predictions, actual_price) * 100
+        results.append({
+            'mae': mae,
+            'mape': mape,
+            'runtime': runtime,
+            'predictions': pd.DataFrame({'Date': date_range, 'Predicted_Price': future_predictions})
+        })
+    return results
+
 # if __name__ == "__main__":
 #     start_date = "2024-10-03"
 #     end_date = "2024-11-02"
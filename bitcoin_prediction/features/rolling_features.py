@@ -0,0 +1,121 @@
+"""
+Incremental lag and rolling-window features of the daily close.
+
+The models were trained with (see the XGBoost and Prophet notebooks):
+    lag1, lag2, lag7                close 1, 2 and 7 days before
+    rolling_mean_7, rolling_std_7   mean and sample std of the last 7 closes
+
+RollingFeatures keeps the last closes in a ring buffer with a running sum and
+sum of squares of the window, so adding a day and reading the features are
+O(1), both when walking through the history and at every step of a recursive
+forecast, where the predicted close is pushed as the next day:
+
+    state = rolling_features.state_before('2024-11-01')  # from the price store
+    for _ in range(steps):
+        row = state.features()  # {'lag1': ..., 'rolling_std_7': ...}
+        prediction = predict(row)
+        state.push(prediction)
+
+The features of a day are computed from the closes before it, i.e. the ones
+known when the day is predicted.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from bitcoin_prediction.market_data import price_store
+
+LAGS = (1, 2, 7)
+WINDOW = 7
+FEATURE_NAMES = [f"lag{lag}" for lag in LAGS] + [f"rolling_mean_{WINDOW}", f"rolling_std_{WINDOW}"]
+
+# Days of price history read before a forecast start; more than the ring
+# buffer needs, so a few missing days are tolerated
+HISTORY_DAYS = 30
+
+
+class RollingFeatures:
+    def __init__(self, lags=LAGS, window=WINDOW):
+        self.lags = tuple(lags)
+        self.window = window
+        self.size = max(max(self.lags), window)
+        self._buffer = np.zeros(self.size)
+        self._next = 0  # slot of the next close
+        self._count = 0
+        self._sum = 0.0  # of the last `window` closes
+        self._sum_sq = 0.0
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    # Add the close of the next day
+    def push(self, close):
+        close = float(close)
+        if self._count >= self.window:
+            leaving = self._buffer[(self._next - self.window) % self.size]
+            self._sum -= leaving
+            self._sum_sq -= leaving * leaving
+        self._sum += close
+        self._sum_sq += close * close
+        self._buffer[self._next] = close
+        self._next = (self._next + 1) % self.size
+        self._count += 1
+
+    # Close `lag` days back, lag(1) is the last close pushed
+    def lag(self, lag):
+        if lag > len(self):
+            return math.nan
+        return self._buffer[(self._next - lag) % self.size]
+
+    # Mean and sample std of the window, NaN until `window` closes were pushed
+    def mean(self):
+        if self._count < self.window:
+            return math.nan
+        return self._sum / self.window
+
+    def std(self):
+        if self._count < self.window:
+            return math.nan
+        n = self.window
+        return math.sqrt(max(0.0, (self._sum_sq - self._sum * self._sum / n) / (n - 1)))
+
+    # Features of the day after the last close pushed
+    def features(self):
+        features = {f"lag{lag}": self.lag(lag) for lag in self.lags}
+        features[f"rolling_mean_{self.window}"] = self.mean()
+        features[f"rolling_std_{self.window}"] = self.std()
+        return features
+
+    def copy(self):
+        state = RollingFeatures.__new__(RollingFeatures)
+        state.__dict__.update(self.__dict__)
+        state._buffer = self._buffer.copy()
+        return state
+
+
+# Features of every day of a close series (indexed by date), one push per day.
+# The first days lack history and are NaN.
+def history_features(closes, lags=LAGS, window=WINDOW):
+    state = RollingFeatures(lags, window)
+    rows = []
+    for close in np.asarray(closes, dtype=np.float64):
+        rows.append(state.features())
+        state.push(close)
+    return pd.DataFrame(rows, index=closes.index, columns=list(state.features()))
+
+
+# State after the closes of the price store up to the day before start_date.
+# Returns (state, last_row), last_row being the price store row of the last
+# day known (with the raw histoday columns).
+def state_before(start_date, lags=LAGS, window=WINDOW, history_days=HISTORY_DAYS):
+    start = pd.Timestamp(start_date).normalize()
+    prices = price_store.get_prices(start - pd.Timedelta(days=history_days), start - pd.Timedelta(days=1))
+    prices = prices.dropna(subset=['close'])
+    if prices.empty:
+        raise ValueError(f"No price history before {start.date()} to compute the lag features")
+    state = RollingFeatures(lags, window)
+    for close in prices['close'].to_numpy()[-state.size:]:
+        state.push(close)
+    return state, prices.iloc[-1]
@@ -3,9 +3,14 @@ import pandas as pd
 import time
 from datetime import datetime
 import os
+import logging
 from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
 import matplotlib.pyplot as plt
-import requests
+
+from bitcoin_prediction.market_data import price_store
+from bitcoin_prediction.serving import metrics
+
+logger = logging.getLogger(__name__)
 
 
 # Load the ARIMA model
@@ -39,9 +44,11 @@ def load_model():
 #     return model_data
 
 # Predict Bitcoin prices using ARIMA model
-def predict_prices(start_date, end_date):
+# model_data: artifacts from load_model(), e.g. the shared ones from the model registry
+def predict_prices(start_date, end_date, model_data=None):
     start_time = time.time()
-    model_data = load_model()
+    if model_data is None:
+        model_data = load_model()
     model = model_data['model']
     # mae = model_data['mae']
     # mape = model_data['mape']
@@ -49,21 +56,22 @@ def predict_prices(start_date, end_date):
     start_date = pd.to_datetime(start_date)
     end_date = pd.to_datetime(end_date)
     date_range = pd.date_range(start=start_date, end=end_date, freq='D').to_period('D')
-    exogenous_data = pd.DataFrame({'sentiment_scores': [0] * len(date_range)}, index=date_range)
 
-    forecast_object = model.get_forecast(steps=len(date_range), exog=exogenous_data)
-    predictions = forecast_object.predicted_mean # Predicted values
+    with metrics.stage('ARIMA', 'inference'):
+        predictions = forecast(model, date_range)
     # Fetch actual prices
-    actual_prices = fetch_actual_prices(start_date, end_date)
+    with metrics.stage('ARIMA', 'fetch'):
+        actual_prices = fetch_actual_prices(start_date, end_date)
      # Calculate metrics
-    mae = mean_absolute_error(actual_prices, predictions)
-    mape = mean_absolute_percentage_error(actual_prices, predictions) * 100
+    with metrics.stage('ARIMA', 'metrics'):
+        mae = mean_absolute_error(actual_prices, predictions)
+        mape = mean_absolute_percentage_error(actual_prices, predictions) * 100
 
     end_time = time.time()
     runtime = int((end_time - start_time) * 1000) # milliseconds
 
     pred_list = [(str(date), round(pred, 3)) for date, pred in zip(date_range, predictions)] # List of predictions
-    print(f'Predicted prices: {pred_list}, Runtime: {runtime:.0f} milliseconds, MAE: {mae:.2f}, MAPE: {mape:.2f}%')
+    logger.debug('Predicted prices: %s, Runtime: %.0f milliseconds, MAE: %.2f, MAPE: %.2f%%', pred_list, runtime, mae, mape)
     return {
         'mae': mae,
         'mape': mape,
@@ -71,24 +79,48 @@ def predict_prices(start_date, end_date):
         'pred_list': pred_list
     }
 
-# Fetch actual Bitcoin prices from the API
+# Forecast one step per date in date_range (a daily PeriodIndex).
+# The forecast starts where the training data ends, so a shorter range is a
+# prefix of a longer one.
+def forecast(model, date_range):
+    exogenous_data = pd.DataFrame({'sentiment_scores': [0] * len(date_range)}, index=date_range)
+    forecast_object = model.get_forecast(steps=len(date_range), exog=exogenous_data)
+    return forecast_object.predicted_mean # Predicted values
+
+# Predict several date ranges at once, in the same format as predict_prices.
+# A single get_forecast runs for the longest horizon and every range is a slice of it.
+# date_ranges: [(start_date, end_date), ...]
+# prices: daily CryptoCompare histoday rows indexed by date, covering every range
+def predict_batch(date_ranges, prices, model_data=None):
+    start_time = time.time()
+    if model_data is None:
+        model_data = load_model()
+    model = model_data['model']
+
+    date_ranges = [pd.date_range(start=start_date, end=end_date, freq='D').to_period('D') for start_date, end_date in date_ranges]
+    with metrics.stage('ARIMA', 'inference'):
+        all_predictions = forecast(model, max(date_ranges, key=len))
+
+    end_time = time.time()
+    runtime = int((end_time - start_time) * 1000) # milliseconds
+
+    results = []
+    for date_range in date_ranges:
+        predictions = all_predictions[:len(date_range)]
+        actual_prices = prices.loc[date_range[0].start_time:date_range[-1].start_time, 'close']
+        mae = mean_absolute_error(actual_prices, predictions)
+        mape = mean_absolute_percentage_error(actual_prices, predictions) * 100
+        results.append({
+            'mae': mae,
+            'mape': mape,
+            'runtime': runtime,
+            'pred_list': [(str(date), round(pred, 3)) for date, pred in zip(date_range, predictions)]
+        })
+    return results
+
+# Fetch actual Bitcoin prices from the local price store
 def fetch_actual_prices(start_date, end_date):
-    url = "https://min-api.cryptocompare.com/data/v2/histoday"
-    params = {
-        "fsym": "BTC",
-        "tsym": "USD",
-        "limit": 2000,
-        "toTs": int(pd.Timestamp(end_date).timestamp()),  # End timestamp
-    }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()["Data"]["Data"]
-        df = pd.DataFrame(data)
-        df["time"] = pd.to_datetime(df["time"], unit="s")
-        df.set_index("time", inplace=True)
-        return df.loc[start_date:end_date, "close"]
-    else:
-        raise ValueError(f"Failed to fetch data: {response.status_code}")
+    return price_store.get_prices(start_date, end_date)["close"]
 
 # Predict and compare prices for 2024-10-25 to 2024-11-21
 def predict_and_compare_future():
@@ -9,19 +9,20 @@ import time
 from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
 import numpy as np
 import sys
+import logging
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
 import utlis as utlis
+from bitcoin_prediction.features import rolling_features
+from bitcoin_prediction.market_data import price_dataset
+from bitcoin_prediction.serving import metrics
+
+logger = logging.getLogger(__name__)
 
 def load_data():
-    # read the data
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(current_dir, "bitcoin_price_sentiment_addmean.csv")
-    df = pd.read_csv(file_path)
-    #df = pd.read_csv('./bitcoin_price_sentiment_addmean.csv')
-    # make sure the date is in datetime format
-    df['date'] = pd.to_datetime(df['date'])
+    # read the data from the memory-mapped price dataset (bitcoin_price_sentiment_addmean.csv)
+    df = price_dataset.load().frame().dropna(subset=['Close']).rename_axis('date').reset_index()
     # prepare the dataframe for prophet
     prophet_df = df[['date', 'Close']].rename(columns={'date': 'ds', 'Close': 'y'})
     # prophet_df = df[['date', 'Close', 'sentiment_scores']].rename(columns={'date': 'ds', 'Close': 'y'})
@@ -41,15 +42,8 @@ def load_data():
     return train_df, test_df, df, features
 
 
-def predict(start_date, end_date):
-    last_row = pd.Series({
-        'sentiment_scores': 8.8205,
-        'rolling_mean_7': 2.966253,
-        'rolling_std_7': 5.614631
-    })
-    # train_df, test_df, df, features = load_data()
-    features = ['sentiment_scores', 'rolling_mean_7', 'rolling_std_7']
-    start_time = time.time()
+# Load the prophet model
+def load_model():
     current_dir = os.path.dirname(os.path.abspath(__file__))
     model_file_path = os.path.join(current_dir, "prophet_model.pkl")
     # model_file_path = "prophet_model.pkl"
@@ -57,25 +51,64 @@ def predict(start_date, end_date):
         model = joblib.load(model_file_path)
     else:
         raise FileNotFoundError(f"Model file '{model_file_path}' not found. Please ensure the model is trained and saved.")
+    return {'model': model, 'feature_scaling': feature_scaling()}
+
+
+ROLLING_FEATURES = ['rolling_mean_7', 'rolling_std_7']
+FEATURES = ['sentiment_scores'] + ROLLING_FEATURES
+# Standardized sentiment score used for the forecast days, no scores are known for them yet
+FORECAST_SENTIMENT = 8.8205
+
+# Mean and std of the rolling features over the bundled history, to standardize
+# them like StandardScaler did in training (see Prophet/prophet.ipynb)
+def feature_scaling():
+    dataset = price_dataset.load()
+    closes = pd.Series(dataset.column('Close'), index=dataset.dates()).dropna()
+    history = rolling_features.history_features(closes)[ROLLING_FEATURES].dropna()
+    return {'mean': history.mean(), 'std': history.std(ddof=0)}
+
+# Regressor values of the forecast days: the rolling features after the last
+# close known before start_date, standardized
+def forecast_features(start_date, scaling):
+    state, _ = rolling_features.state_before(start_date)
+    features = pd.Series(state.features())[ROLLING_FEATURES]
+    features = (features - scaling['mean']) / scaling['std']
+    features['sentiment_scores'] = FORECAST_SENTIMENT
+    return features
+
+# Run the prophet model on future_dates, returns the prophet forecast dataframe
+def forecast_dates(model, future_dates, features):
+    future_df = pd.DataFrame({'ds': future_dates})
+    # 为未来日期添加特征值，使用最后一个已知的值
+    for feature in FEATURES:
+        future_df[feature] = features[feature]
+    # 进行预测
+    return model.predict(future_df)
+
+
+# model_data: artifacts from load_model(), e.g. the shared ones from the model registry
+def predict(start_date, end_date, model_data=None):
+    start_time = time.time()
+    if model_data is None:
+        model_data = load_model()
+    model = model_data['model']
 
     # start_date = pd.to_datetime(start_date)
     # end_date = pd.to_datetime(end_date)
-    actual_df = utlis.fetch_crypto_data(pd.to_datetime(start_date).strftime('%Y-%m-%d'), pd.to_datetime(end_date).strftime('%Y-%m-%d'))
+    with metrics.stage('Prophet', 'fetch'):
+        actual_df = utlis.fetch_crypto_data(pd.to_datetime(start_date).strftime('%Y-%m-%d'), pd.to_datetime(end_date).strftime('%Y-%m-%d'))
     actual_price = actual_df['Close'].values  # Ensure it is a numpy array
 
     future_dates = pd.date_range(start=start_date, end=end_date)
-    future_df = pd.DataFrame({'ds': future_dates})
-    # print(future_dates)
-    # 为未来日期添加特征值
-    # 这里我们使用最后一个已知的值，你可能需要根据实际情况调整这个逻辑
-    for feature in features:
-        future_df[feature] = last_row[feature]
-    # 进行预测
-    forecast = model.predict(future_df)
+    with metrics.stage('Prophet', 'feature_prep'):
+        features = forecast_features(start_date, model_data['feature_scaling'])
+    with metrics.stage('Prophet', 'inference'):
+        forecast = forecast_dates(model, future_dates, features)
     predicted_price = forecast['yhat'].values  # Extract predicted values as numpy array
 
-    mae = mean_absolute_error(predicted_price, actual_price)
-    mape = mean_absolute_percentage_error(predicted_price, actual_price) * 100
+    with metrics.stage('Prophet', 'metrics'):
+        mae = mean_absolute_error(predicted_price, actual_price)
+        mape = mean_absolute_percentage_error(predicted_price, actual_price) * 100
 
     # read the prediction result
     forecast_filtered = forecast[['ds', 'yhat']]
@@ -85,11 +118,48 @@ def predict(start_date, end_date):
     end_time = time.time()
     runtime = (end_time - start_time) * 1000
     # print(f'Runtime: {runtime:.0f} milliseconds')
-    print(f'MAE: {mae}')
-    print(f'MAPE: {mape}')
+    logger.debug('MAE: %s', mae)
+    logger.debug('MAPE: %s', mape)
 
     return mae, mape, runtime, forecast_array
 
+# Predict several date ranges at once, in the same format as predict.
+# The model runs once per start date on the union of the dates of its ranges
+# and every range is a slice of it.
+# date_ranges: [(start_date, end_date), ...]
+# prices: daily CryptoCompare histoday rows indexed by date, covering every range
+def predict_batch(date_ranges, prices, model_data=None):
+    start_time = time.time()
+    if model_data is None:
+        model_data = load_model()
+    model = model_data['model']
+
+    date_ranges = [pd.date_range(start=start_date, end=end_date) for start_date, end_date in date_ranges]
+    groups = {}
+    for date_range in date_ranges:
+        groups.setdefault(date_range[0], []).append(date_range.values)
+
+    forecasts = {}
+    for start_date, group in groups.items():
+        with metrics.stage('Prophet', 'feature_prep'):
+            features = forecast_features(start_date, model_data['feature_scaling'])
+        future_dates = pd.DatetimeIndex(np.unique(np.concatenate(group)))
+        with metrics.stage('Prophet', 'inference'):
+            forecasts[start_date] = forecast_dates(model, future_dates, features).set_index('ds')['yhat']
+
+    end_time = time.time()
+    runtime = (end_time - start_time) * 1000
+
+    results = []
+    for future_dates in date_ranges:
+        predicted_price = forecasts[future_dates[0]].loc[future_dates].values
+        actual_price = prices['close'].reindex(future_dates, method='nearest').values
+        mae = mean_absolute_error(predicted_price, actual_price)
+        mape = mean_absolute_percentage_error(predicted_price, actual_price) * 100
+        forecast_array = list(zip(future_dates.tolist(), predicted_price.tolist()))
+        results.append((mae, mape, runtime, forecast_array))
+    return results
+
 def main():
     start_date = '2024-10-20'
     end_date = '2024-11-10'
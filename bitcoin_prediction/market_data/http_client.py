@@ -0,0 +1,131 @@
+"""
+Shared HTTP client for the upstream price APIs.
+
+A bare `requests.get` opens a new TCP + TLS connection for every call and
+waits forever on a server that stops answering. HttpClient keeps one
+`requests.Session` per process with a pool of keep-alive connections, and
+every call has:
+- connect and read timeouts,
+- retries of connection errors, timeouts, 429 and 5xx responses with
+  exponential backoff and full jitter (sleep random(0, min(cap, base * 2**n))),
+- a total deadline: no retry is started that could not finish before it,
+  so a flaky upstream costs at most `deadline` seconds instead of piling up.
+
+Usage:
+    from bitcoin_prediction.market_data import http_client
+
+    data = http_client.cryptocompare.get_json(url, params={"fsym": "BTC", "tsym": "USD"})
+
+Timeouts and retries can be tuned with the BITFLOW_HTTP_* environment variables.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bitcoin_prediction.serving import metrics
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = float(os.environ.get('BITFLOW_HTTP_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('BITFLOW_HTTP_READ_TIMEOUT', 10))
+MAX_RETRIES = int(os.environ.get('BITFLOW_HTTP_MAX_RETRIES', 4))
+BACKOFF_BASE = float(os.environ.get('BITFLOW_HTTP_BACKOFF_BASE', 0.25))
+BACKOFF_MAX = float(os.environ.get('BITFLOW_HTTP_BACKOFF_MAX', 4))
+DEADLINE = float(os.environ.get('BITFLOW_HTTP_DEADLINE', 20))
+POOL_SIZE = int(os.environ.get('BITFLOW_HTTP_POOL_SIZE', 10))
+
+# Responses worth another try; other 4xx will not get better
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class HttpClient:
+    def __init__(self, name, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 deadline=DEADLINE, pool_size=POOL_SIZE):
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.pool_size = pool_size
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # The session of this process. A forked `serve` worker must not share the
+    # master's pooled sockets, so it opens its own session on first use.
+    def session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    # GET url and return the response, retrying within the deadline.
+    # Raises UpstreamError once the retries or the deadline are used up.
+    def get(self, url, params=None):
+        give_up_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = give_up_at - time.monotonic()
+            timeout = (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+            retry_after = None
+            try:
+                response = self.session().get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason, error = type(e).__name__, e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                reason, error = f"HTTP {response.status_code}", response.reason
+                retry_after = _retry_after(response)
+
+            sleep = self._backoff(attempt, retry_after)
+            if attempt >= self.max_retries or time.monotonic() + sleep >= give_up_at:
+                raise UpstreamError(f"{self.name}: {reason} after {attempt + 1} attempts: {error}")
+            metrics.upstream_retries.inc(upstream=self.name, reason=reason)
+            logger.warning(f"{self.name}: {reason}, retrying in {sleep:.2f} s")
+            time.sleep(sleep)
+            attempt += 1
+
+    def get_json(self, url, params=None):
+        return self.get(url, params).json()
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+
+# Seconds from a Retry-After header, if it is given in seconds
+def _retry_after(response):
+    try:
+        return max(0.0, float(response.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+cryptocompare = HttpClient('cryptocompare')
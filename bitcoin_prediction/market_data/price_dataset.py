@@ -0,0 +1,206 @@
+"""
+Memory-mapped columnar copy of the bundled daily BTC/USD history
+(bitcoin_price_sentiment_addmean.csv, 2012-01-01 to 2024-10-03).
+
+Parsing the CSV with pandas costs every process time and a private copy of
+the data. Instead the CSV is converted once into a directory of .npy files,
+one per column, next to an int32 `day` column (days since 1970-01-01):
+
+    data/btc_usd_daily_columns/
+        meta.json       first day, columns and the mtime and size of the source CSV
+        day.npy         int32
+        Open.npy ... sentiment_scores.npy    float64
+
+The rows are dense, one per day from the first to the last day (a day missing
+from the CSV is NaN), so a date is found by subtraction, not by a search:
+    row = day_number(date) - first_day
+and a date range is a slice of memory-mapped arrays, without copying. The
+files are opened with mmap, so all processes on a host share the same pages
+from the page cache.
+
+The dataset is rebuilt automatically when the modification time or size of
+the CSV changes; checking them is a stat call, the CSV is not read. To build
+it ahead of time (e.g. in a deployment step):
+    python -m bitcoin_prediction.market_data.price_dataset
+
+Usage:
+    from bitcoin_prediction.market_data import price_dataset
+
+    dataset = price_dataset.load()
+    closes = dataset.column('Close', '2024-09-01', '2024-09-30')  # read-only view
+    frame = dataset.frame('2024-09-01', '2024-09-30')  # DataFrame indexed by date
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HISTORY_CSV = os.environ.get(
+    'BITFLOW_PRICE_HISTORY', os.path.join(PROJECT_ROOT, 'bitcoin_prediction', 'bitcoin_price_sentiment_addmean.csv')
+)
+DATASET_DIR = os.environ.get('BITFLOW_PRICE_DATASET', os.path.join(PROJECT_ROOT, 'data', 'btc_usd_daily_columns'))
+
+# Columns of the CSV stored in the dataset
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'sentiment_scores']
+
+_datasets = {}  # dataset directory -> PriceDataset
+_lock = threading.Lock()
+
+
+# Days since 1970-01-01 of a date or an array of dates
+def day_number(value):
+    if np.ndim(value):
+        return pd.DatetimeIndex(value).values.astype('datetime64[D]').astype(np.int32)
+    return int(pd.Timestamp(value).to_datetime64().astype('datetime64[D]').astype(np.int64))
+
+
+# Modification time and size of a file, compared to tell a stale dataset
+def _file_stamp(path):
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _save(path, name, array):
+    # Write to a temporary file first, so a process loading the dataset never
+    # maps a half-written file
+    tmp_path = os.path.join(path, f".{name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, os.path.join(path, name))
+
+
+# Convert the CSV into the columnar dataset directory
+def build(source=HISTORY_CSV, path=DATASET_DIR):
+    # Stamped before reading, so a CSV changed during the build is stale
+    source_stamp = _file_stamp(source)
+    data = pd.read_csv(source, parse_dates=['date']).drop_duplicates('date').set_index('date').sort_index()
+    days = day_number(data.index)
+    first_day = int(days[0])
+    rows = int(days[-1]) - first_day + 1
+
+    os.makedirs(path, exist_ok=True)
+    _save(path, 'day.npy', np.arange(first_day, first_day + rows, dtype=np.int32))
+    for column in COLUMNS:
+        values = np.full(rows, np.nan)
+        values[days - first_day] = data[column].to_numpy(dtype=np.float64)
+        _save(path, f"{column}.npy", values)
+
+    meta = {"first_day": first_day, "rows": rows, "columns": COLUMNS, "source_stamp": source_stamp}
+    tmp_path = os.path.join(path, f".meta.json.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, 'meta.json'))
+    logger.info(f"Built price dataset {path} with {rows} days from {source}")
+
+
+class PriceDataset:
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.path = path
+        self.first_day = meta['first_day']
+        self.columns = meta['columns']
+        self.source_stamp = meta['source_stamp']
+        self.day = np.load(os.path.join(path, 'day.npy'), mmap_mode='r')
+        self._columns = {
+            column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode='r')
+            for column in self.columns
+        }
+
+    def __len__(self):
+        return len(self.day)
+
+    @property
+    def first_date(self):
+        return pd.Timestamp(self.first_day, unit='D')
+
+    @property
+    def last_date(self):
+        return pd.Timestamp(self.first_day + len(self) - 1, unit='D')
+
+    # Row of a date; may lie outside the dataset
+    def offset(self, date):
+        return day_number(date) - self.first_day
+
+    # Row slice of start_date..end_date (inclusive), clipped to the dataset
+    def rows(self, start_date=None, end_date=None):
+        start = 0 if start_date is None else max(0, self.offset(start_date))
+        stop = len(self) if end_date is None else min(len(self), self.offset(end_date) + 1)
+        return slice(start, max(start, stop))
+
+    # Read-only view of a column from start_date to end_date, no copy is made
+    def column(self, name, start_date=None, end_date=None):
+        return self._columns[name][self.rows(start_date, end_date)]
+
+    def dates(self, start_date=None, end_date=None):
+        days = self.day[self.rows(start_date, end_date)]
+        return pd.DatetimeIndex(days.astype('datetime64[D]').astype('datetime64[ns]'), name='date')
+
+    # DataFrame of start_date..end_date indexed by date, with the CSV columns
+    def frame(self, start_date=None, end_date=None, columns=None):
+        rows = self.rows(start_date, end_date)
+        return pd.DataFrame(
+            {column: self._columns[column][rows] for column in (columns or self.columns)},
+            index=self.dates(start_date, end_date)
+        )
+
+
+# The dataset built from source, (re)built first if it is missing or stale.
+# Every caller in a process shares one instance per directory.
+def load(source=HISTORY_CSV, path=DATASET_DIR):
+    with _lock:
+        dataset = _datasets.get(path)
+        if dataset is not None:
+            return dataset
+        source_stamp = _file_stamp(source)
+        try:
+            dataset = PriceDataset(path)
+        except (OSError, ValueError, KeyError):
+            dataset = None
+        if dataset is None or dataset.source_stamp != source_stamp:
+            build(source, path)
+            dataset = PriceDataset(path)
+        _datasets[path] = dataset
+        return dataset
+
+
+# The CSV Volume is the BTC volume of the last minute bar of each day, the
+# unit the models were trained on. Without a fitted scale (see
+# price_store.volume_scale) a daily volume such as the histoday volumefrom is
+# spread over the minutes of the day to match it.
+MINUTES_PER_DAY = 1440
+
+
+# Volume of every date in the units of the CSV: the bundled value where the
+# history covers the date, the daily volume times scale after it.
+# dates: normalized DatetimeIndex, daily_volume: daily volume in BTC of the same dates
+def training_volume(dates, daily_volume, scale=1 / MINUTES_PER_DAY):
+    dataset = load()
+    bundled = pd.Series(
+        dataset.column('Volume', dates.min(), dates.max()), index=dataset.dates(dates.min(), dates.max())
+    ).reindex(dates).to_numpy()
+    converted = np.asarray(daily_volume, dtype=np.float64) * scale
+    return np.where(np.isnan(bundled), converted, bundled)
+
+
+def clear():
+    with _lock:
+        _datasets.clear()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Build the memory-mapped daily price dataset from the CSV.")
+    parser.add_argument('--source', default=HISTORY_CSV)
+    parser.add_argument('--output', default=DATASET_DIR)
+    args = parser.parse_args()
+    build(args.source, args.output)
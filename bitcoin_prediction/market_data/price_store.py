@@ -0,0 +1,487 @@
+"""
+Local store of the daily BTC/USD OHLCV rows from CryptoCompare.
+
+Every model, the batch endpoint and the plotting code read their prices from
+here instead of calling the `histoday` API themselves. The rows are kept in
+a SQLite file and a hot in-memory DataFrame, and only the days that are not in
+the store yet are fetched upstream:
+- Complete days never change. The store records the contiguous range of days
+  it has fetched (covered_start..covered_end) and only fetches outside it.
+- Today's row is still moving; it is refetched once it is older than
+  PRICE_TODAY_TTL seconds.
+
+BITFLOW_PRICE_MODE selects where the prices come from:
+    online   (default) every date from the store, synced from the API
+    hybrid   dates covered by the bundled daily history (see price_dataset) are
+             read from it, later dates from the store
+    offline  like hybrid, but nothing is fetched: later dates must already be
+             in the SQLite file, otherwise PricesUnavailable is raised.
+             Backtests and air-gapped environments run without network calls.
+
+Several processes (e.g. the `serve` workers) can share one file. A sync holds
+the SQLite write lock while it fetches, so concurrent processes do not fetch
+the same days twice. Within a process the fetch runs outside the lock of the
+hot copy, so requests for stored days are served meanwhile, and concurrent
+requests for the same range share one sync. A sync only reads back the rows
+written since the hot copy was read.
+
+Usage:
+    from bitcoin_prediction.market_data import price_store
+
+    prices = price_store.get_prices('2024-10-01', '2024-11-01')
+    prices['close']  # indexed by date
+
+The store also keeps the daily tweet sentiment scored by sentiment_ingest, as
+a sum and count of the scores per day, and the number of rows ingested per
+tweet file, so a rerun only appends new tweets:
+
+    price_store.get_sentiment('2024-10-01', '2024-11-01')['sentiment_scores']
+
+A day without scored tweets falls back to the bundled history, then to the
+mean of all daily scores, the way bitcoin_price_sentiment_addmean.csv was
+filled.
+
+Upstream calls go through the shared HTTP client (http_client), which pools
+connections and retries a flaky API within a deadline.
+
+BITFLOW_CRYPTOCOMPARE_URL points the store at another server, e.g. a local
+stub in tests.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from bitcoin_prediction.market_data import http_client
+from bitcoin_prediction.market_data import price_dataset
+from bitcoin_prediction.serving.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PRICE_DB_PATH = os.environ.get('BITFLOW_PRICE_DB', os.path.join(PROJECT_ROOT, 'data', 'btc_usd_daily.sqlite'))
+CRYPTOCOMPARE_URL = os.environ.get('BITFLOW_CRYPTOCOMPARE_URL', 'https://min-api.cryptocompare.com')
+PRICE_TODAY_TTL = int(os.environ.get('BITFLOW_PRICE_TODAY_TTL', 5 * 60))
+PRICE_MODE = os.environ.get('BITFLOW_PRICE_MODE', 'online')
+
+PRICE_MODES = ('online', 'hybrid', 'offline')
+
+# CryptoCompare returns at most 2000 days per call
+HISTODAY_LIMIT = 2000
+
+# Columns of the stored rows, as named by the histoday API
+PRICE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volumefrom', 'volumeto']
+
+ONE_DAY = pd.Timedelta(days=1)
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS daily_prices (
+        time INTEGER PRIMARY KEY,
+        open REAL, high REAL, low REAL, close REAL, volumefrom REAL, volumeto REAL,
+        fetched_at REAL
+    )""",
+    "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value INTEGER)",
+    "CREATE TABLE IF NOT EXISTS daily_sentiment (time INTEGER PRIMARY KEY, score_sum REAL, score_count INTEGER)",
+    "CREATE TABLE IF NOT EXISTS sentiment_sources (source TEXT PRIMARY KEY, rows INTEGER)"
+]
+
+# Days of sentiment averaged for the days after the last known one
+RECENT_SENTIMENT_DAYS = 7
+
+# Fewest days both in the bundled history and fetched into the store to fit
+# the volume scale on
+MIN_VOLUME_OVERLAP_DAYS = 30
+
+
+class PricesUnavailable(ValueError):
+    pass
+
+
+def _day(value):
+    return pd.Timestamp(value).normalize()
+
+
+def _today():
+    return pd.Timestamp.now('UTC').tz_localize(None).normalize()
+
+
+def _timestamp(day):
+    return int(day.timestamp())
+
+
+# Price rows of an empty date range
+def _empty_prices():
+    return pd.DataFrame(
+        {column: np.empty(0, dtype=np.int64 if column == 'time' else np.float64) for column in PRICE_COLUMNS},
+        index=pd.DatetimeIndex([], name='date')
+    )
+
+
+class PriceStore:
+    def __init__(self, db_path, base_url, fsym='BTC', tsym='USD', today_ttl=PRICE_TODAY_TTL,
+                 client=http_client.cryptocompare, mode=PRICE_MODE, history_path=price_dataset.HISTORY_CSV,
+                 dataset_path=price_dataset.DATASET_DIR):
+        if mode not in PRICE_MODES:
+            raise ValueError(f"Unsupported price mode: {mode}, expected one of {', '.join(PRICE_MODES)}")
+        self.db_path = db_path
+        self.mode = mode
+        self.history_path = history_path
+        self.dataset_path = dataset_path
+        self.client = client
+        self.histoday_url = base_url.rstrip('/') + '/data/v2/histoday'
+        self.fsym = fsym
+        self.tsym = tsym
+        self.today_ttl = today_ttl
+        self._frame = None  # hot copy, indexed by date
+        self._fetched_at = None  # time -> fetched_at of the rows
+        self._last_fetched_at = 0.0  # latest fetched_at in the hot copy
+        self._covered = None  # (first_day, last_day) of the complete days fetched
+        self._history = None  # bundled daily history
+        self._sentiment = None  # daily mean and count of the scored tweets, indexed by date
+        self._volume_scale = None  # bundled Volume per unit of stored volumefrom
+        self._lock = threading.RLock()
+        self._syncs = SingleFlight('price_sync')
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    # Read the whole store into the hot copy
+    def _read(self, conn):
+        sentiment = pd.read_sql_query("SELECT * FROM daily_sentiment ORDER BY time", conn)
+        self._sentiment = pd.DataFrame({
+            'sentiment_scores': sentiment['score_sum'] / sentiment['score_count'],
+            'tweet_count': sentiment['score_count']
+        }).set_index(pd.to_datetime(sentiment['time'], unit='s').rename('date'))
+
+        self._frame = None
+        self._fetched_at = {}
+        self._last_fetched_at = 0.0
+        self._merge(pd.read_sql_query("SELECT * FROM daily_prices ORDER BY time", conn))
+        self._read_state(conn)
+
+    # Read the price rows written since the hot copy was read, by this or
+    # another process. A cleared hot copy is loaded in full on the next read.
+    def _refresh(self, conn):
+        if self._frame is None:
+            return
+        self._merge(pd.read_sql_query(
+            "SELECT * FROM daily_prices WHERE fetched_at > ? ORDER BY time", conn, params=(self._last_fetched_at,)
+        ))
+        self._read_state(conn)
+
+    # Add stored rows to the hot copy, replacing the rows of the same days
+    def _merge(self, rows):
+        if self._frame is not None and rows.empty:
+            return
+        self._fetched_at.update(zip(rows['time'], rows['fetched_at']))
+        self._volume_scale = None
+        if not rows.empty:
+            self._last_fetched_at = max(self._last_fetched_at, float(rows['fetched_at'].max()))
+        frame = rows[PRICE_COLUMNS].copy()
+        frame['date'] = pd.to_datetime(frame['time'], unit='s')
+        frame = frame.set_index('date')
+        if self._frame is not None and not self._frame.empty:
+            frame = pd.concat([self._frame.drop(frame.index, errors='ignore'), frame]).sort_index()
+        self._frame = frame
+
+    def _read_state(self, conn):
+        state = dict(conn.execute("SELECT name, value FROM sync_state").fetchall())
+        if 'covered_start' in state:
+            self._covered = (
+                pd.to_datetime(state['covered_start'], unit='s'),
+                pd.to_datetime(state['covered_end'], unit='s')
+            )
+        else:
+            self._covered = None
+
+    # Read the whole store into memory, e.g. in the `serve` master before forking
+    def load(self):
+        with self._lock, closing(self._connect()) as conn:
+            if self.mode != 'online':
+                self._load_history()
+            self._read(conn)
+            return self._frame
+
+    def _load_history(self):
+        if self._history is None:
+            self._history = price_dataset.load(self.history_path, self.dataset_path)
+        return self._history
+
+    # Rows of the bundled history from start to end in the layout of the store.
+    # Volume is in BTC, volumeto (USD) is estimated as Volume * Close.
+    def _history_prices(self, start, end):
+        dataset = self._load_history()
+        rows = dataset.rows(start, end)
+        close = dataset.column('Close')[rows]
+        volume = dataset.column('Volume')[rows]
+        return pd.DataFrame({
+            'time': dataset.day[rows].astype(np.int64) * 86400,
+            'open': dataset.column('Open')[rows],
+            'high': dataset.column('High')[rows],
+            'low': dataset.column('Low')[rows],
+            'close': close,
+            'volumefrom': volume,
+            'volumeto': volume * close
+        }, index=dataset.dates(start, end))
+
+    # Date ranges [(first_day, last_day), ...] that must be fetched to serve start..end
+    def _missing(self, start, end):
+        today = _today()
+        end = min(end, today)
+        if start > end:
+            return []
+
+        missing = []
+        last_complete = min(end, today - ONE_DAY)
+        if start <= last_complete:
+            if self._covered is None:
+                missing.append((start, last_complete))
+            else:
+                covered_start, covered_end = self._covered
+                # Extend the covered range without leaving a gap
+                if start < covered_start:
+                    missing.append((start, covered_start - ONE_DAY))
+                if last_complete > covered_end:
+                    missing.append((covered_end + ONE_DAY, last_complete))
+
+        if end == today:
+            fetched_at = self._fetched_at.get(_timestamp(today))
+            if fetched_at is None or fetched_at < time.time() - self.today_ttl:
+                missing.append((today, today))
+        return missing
+
+    # Fetch daily rows from first_day to last_day, paging backwards through the
+    # API when the range is longer than one call allows
+    def fetch(self, first_day, last_day):
+        start_ts = _timestamp(first_day)
+        to_ts = _timestamp(last_day)
+        frames = []
+        while to_ts >= start_ts:
+            params = {
+                "fsym": self.fsym,
+                "tsym": self.tsym,
+                "limit": max(1, min(HISTODAY_LIMIT, (to_ts - start_ts) // 86400)),
+                "toTs": to_ts
+            }
+            data = self.client.get_json(self.histoday_url, params)
+            if data.get('Response') != 'Success':
+                raise ValueError(f"API Error: {data.get('Message', 'Unknown error')}")
+            frame = pd.DataFrame(data['Data']['Data'])
+            if frame.empty:
+                break
+            frames.append(frame)
+            to_ts = int(frame['time'].min()) - 86400
+
+        if not frames:
+            raise ValueError("Could not retrieve data from API")
+        rows = pd.concat(frames, ignore_index=True)
+        return rows[PRICE_COLUMNS].drop_duplicates('time')
+
+    # Fetch and store what is missing to serve start..end. Only the hot copy
+    # is read and updated under the lock, not the upstream calls.
+    def _sync(self, start, end):
+        with closing(self._connect()) as conn:
+            # The write lock makes other processes wait instead of fetching the same days
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have fetched some of the days in the meantime
+                with self._lock:
+                    self._refresh(conn)
+                    missing = self._missing(start, end)
+                now = time.time()
+                last_complete = _today() - ONE_DAY
+                for first_day, last_day in missing:
+                    logger.info(f"Fetching {self.fsym}/{self.tsym} prices from {first_day.date()} to {last_day.date()}")
+                    rows = self.fetch(first_day, last_day)
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO daily_prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(int(row[0]),) + tuple(float(value) for value in row[1:]) + (now,)
+                         for row in rows.itertuples(index=False, name=None)]
+                    )
+                    if first_day <= last_complete:
+                        self._extend_covered(conn, first_day, min(last_day, last_complete))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            with self._lock:
+                self._refresh(conn)
+
+    def _extend_covered(self, conn, first_day, last_day):
+        conn.execute(
+            "INSERT INTO sync_state VALUES ('covered_start', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = MIN(value, excluded.value)",
+            (_timestamp(first_day),)
+        )
+        conn.execute(
+            "INSERT INTO sync_state VALUES ('covered_end', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)",
+            (_timestamp(last_day),)
+        )
+
+    # Daily rows from start_date to end_date (inclusive) indexed by date, with
+    # the raw histoday columns. Missing days are fetched first (except offline).
+    def get_prices(self, start_date, end_date):
+        start = _day(start_date)
+        end = _day(end_date)
+        if start > end:
+            return _empty_prices()
+        with self._lock:
+            if self._frame is None:
+                self.load()
+
+            parts = []
+            if self.mode != 'online':
+                last_local = self._load_history().last_date
+                if start <= last_local:
+                    parts.append(self._history_prices(start, end))
+                    start = last_local + ONE_DAY
+            if start > end:
+                return parts[0].copy()
+
+            if self.mode == 'offline':
+                self._check_offline(start, end)
+                missing = False
+            else:
+                missing = bool(self._missing(start, end))
+
+        # Fetch without holding the lock; concurrent requests for the same
+        # range wait for one sync
+        if missing:
+            self._syncs.do((start, end), self._sync, start, end)
+
+        with self._lock:
+            if self._frame is None:
+                self.load()
+            parts.append(self._frame.loc[start:end])
+        return pd.concat(parts) if len(parts) > 1 else parts[0].copy()
+
+    # Offline, the days up to today must already be stored
+    def _check_offline(self, start, end):
+        expected = pd.date_range(start, min(end, _today()))
+        absent = expected.difference(self._frame.index)
+        if len(absent):
+            raise PricesUnavailable(
+                f"No local {self.fsym}/{self.tsym} prices from {absent[0].date()} to {absent[-1].date()} "
+                f"and the price store is offline"
+            )
+
+    # Daily mean sentiment from start_date to end_date indexed by date, with the
+    # columns sentiment_scores and tweet_count (0 for a day filled in)
+    def get_sentiment(self, start_date, end_date):
+        days = pd.date_range(_day(start_date), _day(end_date), name='date')
+        with self._lock:
+            if self._frame is None:
+                self.load()
+            stored = self._sentiment.reindex(days)
+            dataset = self._load_history()
+            bundled = pd.Series(
+                dataset.column('sentiment_scores', days[0], days[-1]), index=dataset.dates(days[0], days[-1])
+            )
+            if len(self._sentiment):
+                fill_value = self._sentiment['sentiment_scores'].mean()
+            else:
+                fill_value = np.nanmean(dataset.column('sentiment_scores'))
+        scores = stored['sentiment_scores'].fillna(bundled.reindex(days)).fillna(fill_value)
+        return pd.DataFrame({'sentiment_scores': scores, 'tweet_count': stored['tweet_count'].fillna(0).astype(int)})
+
+    # Mean sentiment of the days before start_date, used for forecast days
+    def sentiment_before(self, start_date, days=RECENT_SENTIMENT_DAYS):
+        start = _day(start_date)
+        return float(self.get_sentiment(start - pd.Timedelta(days=days), start - ONE_DAY)['sentiment_scores'].mean())
+
+    # Factor from the daily volumefrom of the store to the Volume of the bundled
+    # history (the last minute bar of the day), the unit the models were
+    # trained on: the median ratio over the fetched days the history also
+    # covers. Without MIN_VOLUME_OVERLAP_DAYS such days the daily volume is
+    # assumed to be spread evenly over the day, 1 / MINUTES_PER_DAY.
+    def volume_scale(self):
+        with self._lock:
+            if self._frame is None:
+                self.load()
+            if self._volume_scale is None:
+                dataset = self._load_history()
+                stored = self._frame['volumefrom']
+                bundled = pd.Series(dataset.column('Volume'), index=dataset.dates()).reindex(stored.index)
+                overlap = (bundled > 0) & (stored > 0)
+                if overlap.sum() >= MIN_VOLUME_OVERLAP_DAYS:
+                    self._volume_scale = float((bundled[overlap] / stored[overlap]).median())
+                else:
+                    self._volume_scale = 1 / price_dataset.MINUTES_PER_DAY
+            return self._volume_scale
+
+    # Rows of a tweet file already ingested
+    def sentiment_progress(self, source):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT rows FROM sentiment_sources WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else 0
+
+    # Add the score sums and counts of scored tweets, {day timestamp: (sum, count)},
+    # and record that `rows` rows of source are ingested, in one transaction
+    def add_sentiment(self, day_scores, source, rows):
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO daily_sentiment VALUES (?, ?, ?) ON CONFLICT(time) DO UPDATE SET "
+                    "score_sum = score_sum + excluded.score_sum, score_count = score_count + excluded.score_count",
+                    [(int(day), float(total), int(count)) for day, (total, count) in day_scores.items()]
+                )
+                conn.execute(
+                    "INSERT INTO sentiment_sources VALUES (?, ?) ON CONFLICT(source) DO UPDATE SET rows = excluded.rows",
+                    (source, int(rows))
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._read(conn)
+
+    def clear(self):
+        with self._lock:
+            self._frame = None
+            self._fetched_at = None
+            self._last_fetched_at = 0.0
+            self._covered = None
+            self._history = None
+            self._sentiment = None
+            self._volume_scale = None
+
+
+daily_prices = PriceStore(PRICE_DB_PATH, CRYPTOCOMPARE_URL)
+
+
+def get_prices(start_date, end_date):
+    return daily_prices.get_prices(start_date, end_date)
+
+
+def load():
+    return daily_prices.load()
+
+
+def get_sentiment(start_date, end_date):
+    return daily_prices.get_sentiment(start_date, end_date)
+
+
+def sentiment_before(start_date):
+    return daily_prices.sentiment_before(start_date)
+
+
+def volume_scale():
+    return daily_prices.volume_scale()
+
+
+# Drop the hot copy, the next read loads it from disk again
+def clear():
+    daily_prices.clear()
@@ -0,0 +1,178 @@
+"""
+Streaming resampler from minute OHLCV bars to hourly and daily bars.
+
+bitcoin_daily_last_price.csv keeps only the last minute of each day, so its
+"daily" High, Low and Volume are those of one minute. This tool reads a full
+minute-level CSV (e.g. the Bitstamp 1-min export:
+Timestamp,Open,High,Low,Close,Volume) in chunks of `chunk_rows` rows and
+aggregates every period as
+    Open first, High max, Low min, Close last, Volume sum
+so memory stays constant whatever the size of the input. The minute rows must
+be sorted by Timestamp; minutes without a Close (no trades) are skipped.
+
+Each resolution is written to its own CSV (date,Open,High,Low,Close,Volume).
+On a rerun, e.g. after new minutes were appended to the input, only the
+periods from the last written one onwards are aggregated: the last period
+may have been incomplete, so it is replaced, and newer periods are appended.
+
+Usage:
+    python -m bitcoin_prediction.market_data.resample_minutes btcusd_1-min_data.csv \
+        --output-dir data --resolutions 1d 1h
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OUTPUT_DIR = os.path.join(PROJECT_ROOT, 'data')
+CHUNK_ROWS = 1_000_000
+
+# Resolution name -> (period length in seconds, date format of the output)
+RESOLUTIONS = {
+    '1d': (86400, '%Y-%m-%d'),
+    '1h': (3600, '%Y-%m-%d %H:%M:%S')
+}
+
+TIME_COLUMN = 'Timestamp'
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+# Aggregates sorted minute rows into bars of one resolution. The last bar is
+# kept pending until a row of a later period arrives, so a bar may span chunks.
+class BarAggregator:
+    def __init__(self, seconds, resume_from=None):
+        self.seconds = seconds
+        self.resume_from = resume_from  # skip minutes before this period start
+        self.pending = None  # [start, open, high, low, close, volume]
+
+    # Add a chunk of minute rows, return the bars it completed as a DataFrame
+    def add(self, ts, opens, highs, lows, closes, volumes):
+        if self.resume_from is not None:
+            keep = ts >= self.resume_from
+            ts, opens, highs, lows, closes, volumes = (
+                ts[keep], opens[keep], highs[keep], lows[keep], closes[keep], volumes[keep]
+            )
+        if len(ts) == 0:
+            return _bars([])
+
+        periods = ts // self.seconds * self.seconds
+        if np.any(np.diff(periods) < 0) or (self.pending is not None and periods[0] < self.pending[0]):
+            raise ValueError("The minute rows must be sorted by Timestamp")
+
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(periods)) + 1))
+        ends = np.append(starts[1:], len(ts))
+        bars = np.column_stack([
+            periods[starts],
+            opens[starts],
+            np.maximum.reduceat(highs, starts),
+            np.minimum.reduceat(lows, starts),
+            closes[ends - 1],
+            np.add.reduceat(volumes, starts)
+        ])
+
+        # The first bar continues the pending one when they share a period
+        if self.pending is not None and bars[0, 0] == self.pending[0]:
+            first = bars[0]
+            bars[0] = [
+                self.pending[0], self.pending[1], max(self.pending[2], first[2]),
+                min(self.pending[3], first[3]), first[4], self.pending[5] + first[5]
+            ]
+            completed = list(bars[:-1])
+        else:
+            completed = ([self.pending] if self.pending is not None else []) + list(bars[:-1])
+        self.pending = bars[-1]
+        return _bars(completed)
+
+    # The last, possibly incomplete bar
+    def flush(self):
+        completed = [self.pending] if self.pending is not None else []
+        self.pending = None
+        return _bars(completed)
+
+
+def _bars(rows):
+    frame = pd.DataFrame(np.array(rows).reshape(-1, 6), columns=['start'] + OHLCV_COLUMNS)
+    frame['start'] = frame['start'].astype(np.int64)
+    return frame
+
+
+def _write_bars(path, bars, date_format):
+    if bars.empty:
+        return
+    out = bars[OHLCV_COLUMNS].copy()
+    out.insert(0, 'date', pd.to_datetime(bars['start'], unit='s').dt.strftime(date_format))
+    write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+    out.to_csv(path, mode='a', header=write_header, index=False)
+
+
+# Remove the last bar of an output file and return its period start, so a
+# rerun aggregates it again. None when the file has no bars yet.
+def _pop_last_bar(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        position, tail = size, b''
+        # Read backwards until the start of the last line
+        while position > 0 and b'\n' not in tail.rstrip(b'\n'):
+            position = max(0, position - 4096)
+            f.seek(position)
+            tail = f.read(size - position)
+        body = tail.rstrip(b'\n')
+        if b'\n' not in body:
+            return None  # header only
+        line_start = body.rindex(b'\n') + 1
+        last_line = body[line_start:]
+        f.truncate(position + line_start)
+    return int(pd.Timestamp(last_line.split(b',', 1)[0].decode()).timestamp())
+
+
+# Aggregate the minute CSV at source into one CSV per resolution in output_dir.
+# Returns {resolution: number of bars written}.
+def resample(source, output_dir=OUTPUT_DIR, resolutions=('1d', '1h'), chunk_rows=CHUNK_ROWS, prefix='btc_usd'):
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {}
+    for resolution in resolutions:
+        seconds, date_format = RESOLUTIONS[resolution]
+        path = os.path.join(output_dir, f"{prefix}_{resolution}.csv")
+        outputs[resolution] = (path, date_format, BarAggregator(seconds, _pop_last_bar(path)))
+    written = dict.fromkeys(resolutions, 0)
+
+    chunks = pd.read_csv(
+        source, usecols=[TIME_COLUMN] + OHLCV_COLUMNS, chunksize=chunk_rows,
+        dtype={column: np.float64 for column in [TIME_COLUMN] + OHLCV_COLUMNS}
+    )
+    for chunk in chunks:
+        chunk = chunk.dropna(subset=['Close'])
+        ts = chunk[TIME_COLUMN].to_numpy().astype(np.int64)
+        columns = [chunk[column].to_numpy() for column in OHLCV_COLUMNS]
+        for resolution, (path, date_format, aggregator) in outputs.items():
+            bars = aggregator.add(ts, *columns)
+            _write_bars(path, bars, date_format)
+            written[resolution] += len(bars)
+
+    for resolution, (path, date_format, aggregator) in outputs.items():
+        bars = aggregator.flush()
+        _write_bars(path, bars, date_format)
+        written[resolution] += len(bars)
+        logger.info(f"Wrote {written[resolution]} {resolution} bars to {path}")
+    return written
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Resample a minute OHLCV CSV into hourly and daily bars.")
+    parser.add_argument('source', help="minute CSV with Timestamp,Open,High,Low,Close,Volume columns")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--resolutions', nargs='+', choices=sorted(RESOLUTIONS), default=['1d', '1h'])
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--prefix', default='btc_usd')
+    args = parser.parse_args()
+    resample(args.source, args.output_dir, args.resolutions, args.chunk_rows, args.prefix)
@@ -0,0 +1,149 @@
+"""
+Batched, multi-process scoring of tweets into the daily sentiment of the
+price store.
+
+This is the pipeline of tweets_sentiment.ipynb for files of any size: the
+tweet CSV (date,text,...) is read in chunks of `chunk_rows` rows, the texts
+are cleaned and scored with VADER (compound score) in batches of
+`batch_size` tweets across a process pool, and every chunk is reduced to a
+sum and count of the scores per day. The per-day sums are added to the price
+store together with the number of rows done, in one transaction, so an
+interrupted or repeated run continues after the last chunk stored and the
+daily means stay exact across runs. Throughput grows with the number of
+worker processes.
+
+Requires nltk and its VADER lexicon:
+    pip install nltk && python -m nltk.downloader vader_lexicon
+
+Usage:
+    python -m bitcoin_prediction.market_data.sentiment_ingest bitcoin_tweets.csv --workers 8
+"""
+
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from bitcoin_prediction.market_data import price_store
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 200_000
+BATCH_SIZE = 5_000
+WORKERS = os.cpu_count() or 1
+MAX_PENDING_CHUNKS = 2
+
+HASHTAG_PATTERN = re.compile(r'#\w+')
+URL_PATTERN = re.compile(r'http\S+|www\S+|https\S+')
+MENTION_PATTERN = re.compile(r'@\w+')
+SPECIAL_CHARACTER_PATTERN = re.compile(r'[^a-zA-Z\s]')
+
+_analyzer = None  # per worker process
+
+
+# Same cleaning as tweets_sentiment.ipynb
+def clean_text(text):
+    text = HASHTAG_PATTERN.sub('', text)
+    text = URL_PATTERN.sub('', text)
+    text = MENTION_PATTERN.sub('', text)
+    text = SPECIAL_CHARACTER_PATTERN.sub('', text)
+    return text.replace('\n', ' ')
+
+
+def _init_worker():
+    global _analyzer
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    _analyzer = SentimentIntensityAnalyzer()
+
+
+# Score a batch of tweets, returns {day timestamp: (score sum, count)}
+def score_batch(days, texts):
+    totals = {}
+    for day, text in zip(days, texts):
+        score = _analyzer.polarity_scores(clean_text(text))['compound']
+        total, count = totals.get(day, (0.0, 0))
+        totals[day] = (total + score, count + 1)
+    return totals
+
+
+def _merge(into, totals):
+    for day, (total, count) in totals.items():
+        previous_total, previous_count = into.get(day, (0.0, 0))
+        into[day] = (previous_total + total, previous_count + count)
+
+
+# Day timestamps and texts of the valid tweets of a chunk
+def _prepare_chunk(chunk):
+    dates = pd.to_datetime(chunk['date'], errors='coerce', utc=True)
+    valid = dates.notna() & chunk['text'].notna()
+    days = dates[valid].dt.normalize().dt.tz_localize(None).astype('datetime64[s]').astype('int64')
+    return days.to_numpy(), chunk.loc[valid, 'text'].astype(str).tolist()
+
+
+# Score the tweets of source into the daily sentiment of store.
+# Returns the number of rows ingested by this run.
+def ingest(source, store=price_store.daily_prices, workers=WORKERS, chunk_rows=CHUNK_ROWS, batch_size=BATCH_SIZE):
+    if importlib.util.find_spec('nltk') is None:
+        raise ImportError("Sentiment scoring requires nltk: pip install nltk && python -m nltk.downloader vader_lexicon")
+
+    source_name = os.path.abspath(source)
+    rows_done = store.sentiment_progress(source_name)
+    if rows_done:
+        logger.info(f"Resuming {source} after {rows_done} rows")
+
+    reader = pd.read_csv(source, usecols=['date', 'text'], dtype=str, chunksize=chunk_rows, on_bad_lines='skip')
+    pending = deque()  # (futures of a chunk, rows done after it), in file order
+    rows_seen = 0
+
+    # Store the oldest chunk, waiting for its batches
+    def store_chunk():
+        futures, rows_after = pending.popleft()
+        totals = {}
+        for future in futures:
+            _merge(totals, future.result())
+        store.add_sentiment(totals, source_name, rows_after)
+        tweets = sum(count for _, count in totals.values())
+        logger.info(f"{rows_after} rows of {source} ingested, {tweets} tweets scored in the last chunk")
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        for chunk in reader:
+            start = rows_seen
+            rows_seen += len(chunk)
+            if rows_seen <= rows_done:
+                continue  # ingested by an earlier run
+            if start < rows_done:
+                chunk = chunk.iloc[rows_done - start:]
+
+            days, texts = _prepare_chunk(chunk)
+            futures = [
+                pool.submit(score_batch, days[i:i + batch_size], texts[i:i + batch_size])
+                for i in range(0, len(texts), batch_size)
+            ]
+            pending.append((futures, rows_seen))
+
+            # Chunks are stored in file order, so the progress never skips rows.
+            # At most MAX_PENDING_CHUNKS are scored at once, which bounds the memory.
+            while pending and (all(future.done() for future in pending[0][0]) or len(pending) > MAX_PENDING_CHUNKS):
+                store_chunk()
+
+        while pending:
+            store_chunk()
+    return max(0, rows_seen - rows_done)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Score tweets into the daily sentiment of the price store.")
+    parser.add_argument('source', help="tweet CSV with date and text columns")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    ingest(args.source, workers=args.workers, chunk_rows=args.chunk_rows, batch_size=args.batch_size)
@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-import requests
 import datetime
 import joblib
 import matplotlib.pyplot as plt
@@ -8,28 +7,17 @@ import os
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
 import time
+import logging
 
+from bitcoin_prediction.market_data import price_store
+from bitcoin_prediction.serving import metrics
 
-# Get actual Bitcoin price between startDate and endDate
+logger = logging.getLogger(__name__)
+
+
+# Get actual Bitcoin price between startDate and endDate from the local price store
 def get_actual_bitcoin_prices(startDate, endDate):
-    url = 'https://min-api.cryptocompare.com/data/v2/histoday'
-    params = {
-        'fsym': 'BTC',
-        'tsym': 'USD',
-        'limit': 2000,
-        'toTs': int(datetime.datetime.strptime(endDate, "%Y-%m-%d").timestamp())
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    if 'Data' in data and 'Data' in data['Data']:
-        prices = data['Data']['Data']
-        df = pd.DataFrame(prices)
-        df['time'] = pd.to_datetime(df['time'], unit='s')
-        df.set_index('time', inplace=True)
-        df = df.loc[startDate:endDate]
-        return df
-    else:
-        raise ValueError("Could not retrieve data from API")
+    return price_store.get_prices(startDate, endDate)
 # Prepare input features for prediction
 def prepare_features(scaler, prices):
     features = pd.DataFrame()
@@ -47,9 +35,12 @@ def prepare_features(scaler, prices):
 
 # Predict Bitcoin prices between startDate and endDate
 def predict_bitcoin_prices(rf_model, scaler, startDate, endDate):
-    actual_prices = get_actual_bitcoin_prices(startDate, endDate)
-    X, dates = prepare_features(scaler, actual_prices)
-    predicted_prices = rf_model.predict(X)
+    with metrics.stage('RandomForest', 'fetch'):
+        actual_prices = get_actual_bitcoin_prices(startDate, endDate)
+    with metrics.stage('RandomForest', 'feature_prep'):
+        X, dates = prepare_features(scaler, actual_prices)
+    with metrics.stage('RandomForest', 'inference'):
+        predicted_prices = rf_model.predict(X)
     return pd.Series(predicted_prices, index=dates)
 
 # Plot the actual vs predicted Bitcoin prices
@@ -68,7 +59,8 @@ def plot_prices(actual_prices, predicted_prices, runtime, mae, mape):
 
 
 
-def predict(startDate, endDate):
+# Load the Random Forest model and its scaler
+def load_model():
     # Import model 
     model_file_path = os.path.join(os.path.dirname(__file__), 'rf_model.pkl')
     if not os.path.exists(model_file_path):
@@ -79,38 +71,74 @@ def predict(startDate, endDate):
     if not os.path.exists(scaler_file_path):
         raise FileNotFoundError(f"Scaler file '{scaler_file_path}' not found. Please ensure the scaler is trained and saved.")
     scaler = joblib.load(scaler_file_path)
+    return {'model': rf_model, 'scaler': scaler}
+
+
+# model_data: artifacts from load_model(), e.g. the shared ones from the model registry
+def predict(startDate, endDate, model_data=None):
+    if model_data is None:
+        model_data = load_model()
+    rf_model = model_data['model']
+    scaler = model_data['scaler']
 
     # Get real price
-    actual_prices = get_actual_bitcoin_prices(startDate, endDate)
+    with metrics.stage('RandomForest', 'fetch'):
+        actual_prices = get_actual_bitcoin_prices(startDate, endDate)
     # Measure prediction runtime
     start_time = time.time()
     predicted_prices = predict_bitcoin_prices(rf_model,scaler, startDate, endDate)
     runtime = int((time.time() - start_time) * 1000)
-    mae = mean_absolute_error(actual_prices['close'][-len(predicted_prices):], predicted_prices)
-    mape = mean_absolute_percentage_error(actual_prices['close'][-len(predicted_prices):], predicted_prices) * 100
+    with metrics.stage('RandomForest', 'metrics'):
+        mae = mean_absolute_error(actual_prices['close'][-len(predicted_prices):], predicted_prices)
+        mape = mean_absolute_percentage_error(actual_prices['close'][-len(predicted_prices):], predicted_prices) * 100
     forecast_array = [{"date": date.strftime("%Y-%m-%d"), "price": round(price, 3)}
                   for date, price in zip(predicted_prices.index, predicted_prices)]
     #forecast_array = [{"date": date.strftime("%Y-%m-%d"), "price": price} for date, price in zip(predicted_prices.index, predicted_prices)]
-    # Output to console
-    print("MAE:", mae)
-    print("MAPE:", mape)
-    print("Runtime (ms):", runtime)
-    print("Forecast Array:", forecast_array)
+    # Debug output
+    logger.debug("MAE: %s", mae)
+    logger.debug("MAPE: %s", mape)
+    logger.debug("Runtime (ms): %s", runtime)
+    logger.debug("Forecast Array: %s", forecast_array)
     return mae, mape, runtime, forecast_array
 
+
+# Predict several date ranges at once, in the same format as predict.
+# The feature rows of all ranges are scaled and predicted in a single call and
+# every range is a slice of the result.
+# date_ranges: [(startDate, endDate), ...]
+# prices: daily CryptoCompare histoday rows indexed by date, covering every range
+def predict_batch(date_ranges, prices, model_data=None):
+    if model_data is None:
+        model_data = load_model()
+    rf_model = model_data['model']
+    scaler = model_data['scaler']
+
+    start_time = time.time()
+    first_date = min(startDate for startDate, _ in date_ranges)
+    last_date = max(endDate for _, endDate in date_ranges)
+    with metrics.stage('RandomForest', 'feature_prep'):
+        X, dates = prepare_features(scaler, prices.loc[first_date:last_date])
+    with metrics.stage('RandomForest', 'inference'):
+        all_predicted_prices = pd.Series(rf_model.predict(X), index=dates)
+    runtime = int((time.time() - start_time) * 1000)
+
+    results = []
+    for startDate, endDate in date_ranges:
+        predicted_prices = all_predicted_prices.loc[startDate:endDate]
+        actual_prices = prices.loc[startDate:endDate, 'close']
+        mae = mean_absolute_error(actual_prices[-len(predicted_prices):], predicted_prices)
+        mape = mean_absolute_percentage_error(actual_prices[-len(predicted_prices):], predicted_prices) * 100
+        forecast_array = [{"date": date.strftime("%Y-%m-%d"), "price": round(price, 3)}
+                      for date, price in zip(predicted_prices.index, predicted_prices)]
+        results.append((mae, mape, runtime, forecast_array))
+    return results
+
     
 # Main function
 def main():
-    # Import model 
-    model_file_path = os.path.join(os.path.dirname(__file__), 'rf_model.pkl')
-    if not os.path.exists(model_file_path):
-        raise FileNotFoundError(f"Model file '{model_file_path}' not found. Please ensure the model is trained and saved.")
-    rf_model = joblib.load(model_file_path)
-    # Import Scaler 
-    scaler_file_path = os.path.join(os.path.dirname(__file__), 'rf_scaler.pkl')
-    if not os.path.exists(scaler_file_path):
-        raise FileNotFoundError(f"Scaler file '{scaler_file_path}' not found. Please ensure the scaler is trained and saved.")
-    scaler = joblib.load(scaler_file_path)
+    model_data = load_model()
+    rf_model = model_data['model']
+    scaler = model_data['scaler']
 
     startDate = "2024-10-25"
     endDate = "2024-11-21"
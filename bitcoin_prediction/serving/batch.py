@@ -0,0 +1,102 @@
+"""
+Batch prediction for many (model, startDate, endDate) jobs in one request.
+
+Jobs are grouped by model and every group is answered by the model module's
+`predict_batch(date_ranges, prices, model_data)`, which runs one vectorized
+inference for all of its ranges. The daily prices are read from the price
+store once for the union of the ranges and shared by every group.
+
+Request body:
+    {"jobs": [{"model": "ARIMA", "startDate": 1732233600, "endDate": 1732752000}, ...]}
+"""
+
+import logging
+import time
+
+import pandas as pd
+
+from bitcoin_prediction.market_data import price_store
+from bitcoin_prediction.serving import fanout
+from bitcoin_prediction.serving import metrics
+from bitcoin_prediction.serving import model_registry
+from bitcoin_prediction.serving import tracing
+from bitcoin_prediction.serving.config import ServingConfig
+
+logger = logging.getLogger(__name__)
+
+
+# Validate the request body, returns [(model_name, start_date, end_date), ...]
+# with dates as 'YYYY-MM-DD'. Raises ValueError on invalid input.
+def parse_jobs(payload):
+    jobs = (payload or {}).get('jobs')
+    if not isinstance(jobs, list) or not jobs:
+        raise ValueError("jobs must be a non-empty list")
+    if len(jobs) > ServingConfig.BATCH_PARAMS['max_jobs']:
+        raise ValueError(f"At most {ServingConfig.BATCH_PARAMS['max_jobs']} jobs per request")
+
+    parsed = []
+    for job in jobs:
+        if not isinstance(job, dict):
+            raise ValueError("Every job must be an object")
+        model_name = job.get('model')
+        if model_name not in ServingConfig.MODELS:
+            raise ValueError(f"Unsupported model name: {model_name}")
+        if job.get('startDate') is None or job.get('endDate') is None:
+            raise ValueError("startDate and endDate are required")
+        start_date = pd.to_datetime(int(job['startDate']), unit='s').strftime('%Y-%m-%d')
+        end_date = pd.to_datetime(int(job['endDate']), unit='s').strftime('%Y-%m-%d')
+        if start_date > end_date:
+            raise ValueError(f"startDate is after endDate: {start_date} > {end_date}")
+        parsed.append((model_name, start_date, end_date))
+    return parsed
+
+
+def _predict_group(model_name, date_ranges, prices):
+    with tracing.span('predict_batch', model=model_name, ranges=len(date_ranges)):
+        model_module = model_registry.module(model_name)
+        return model_module.predict_batch(date_ranges, prices, model_registry.get(model_name))
+
+
+# Run every job and return one result per job, in job order.
+# format_fn(model_name, raw_result, start_date) turns the raw result of a
+# model function into the response format, as predict_model does.
+def run_batch(jobs, format_fn):
+    groups = {}
+    for index, (model_name, start_date, end_date) in enumerate(jobs):
+        groups.setdefault(model_name, []).append((index, start_date, end_date))
+
+    # One price read for the union of the ranges, including the LSTM history window
+    first_date = pd.to_datetime(min(start_date for _, start_date, _ in jobs))
+    first_date -= pd.Timedelta(days=ServingConfig.BATCH_PARAMS['history_days'])
+    last_date = max(end_date for _, _, end_date in jobs)
+    with metrics.stage('all', 'fetch'):
+        prices = price_store.get_prices(first_date, last_date)
+
+    start_time = time.time()
+    executor = fanout.get_executor('thread')
+    futures = {
+        model_name: executor.submit(tracing.wrap(_predict_group), model_name, [(start, end) for _, start, end in group], prices)
+        for model_name, group in groups.items()
+    }
+
+    results = [None] * len(jobs)
+    for model_name, group in groups.items():
+        try:
+            remaining = max(0, start_time + fanout.model_timeout(model_name) - time.time())
+            raw_results = futures[model_name].result(timeout=remaining)
+            errors = [None] * len(group)
+        except Exception as e:
+            logger.error(f"Batch for {model_name} failed: {e}")
+            metrics.model_errors.inc(len(group), model=model_name)
+            raw_results = [None] * len(group)
+            errors = [str(e) or f"{model_name} timed out"] * len(group)
+
+        for (index, start_date, end_date), raw_result, error in zip(group, raw_results, errors):
+            if error is None:
+                result = format_fn(model_name, raw_result, start_date)
+            else:
+                result = fanout.error_entry(model_name, error)
+            result["start_date"] = start_date
+            result["end_date"] = end_date
+            results[index] = result
+    return results
@@ -0,0 +1,96 @@
+# serving/config.py
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Comma separated list from an environment variable, e.g. BITFLOW_WARM_MODELS=ARIMA,XGBoost
+def _env_list(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class ServingConfig:
+    # Models served by /predict and /predict_plot, in response order
+    MODELS = _env_list('BITFLOW_MODELS', ['XGBoost', 'LSTM', 'ARIMA', 'Prophet', 'RandomForest'])
+
+    # Models loaded (and their frameworks imported) at startup. The others are
+    # imported and loaded the first time they are used, so a light deployment
+    # can set BITFLOW_WARM_MODELS= (empty) or BITFLOW_WARM_MODELS=ARIMA.
+    WARM_MODELS = _env_list('BITFLOW_WARM_MODELS', MODELS)
+
+    # Model fan-out parameters
+    # max_queue_seconds: seconds a model may wait for a free worker of the
+    # shared pool before it is reported as timed out; its run time only
+    # counts against MODEL_TIMEOUTS once it starts
+    FANOUT_PARAMS = {
+        'max_thread_workers': 10,
+        'max_process_workers': 2,
+        'max_queue_seconds': 30
+    }
+
+    # Seconds a model may run before it is reported as timed out
+    MODEL_TIMEOUTS = {
+        'XGBoost': 30,
+        'LSTM': 60,
+        'ARIMA': 30,
+        'Prophet': 60,
+        'RandomForest': 30
+    }
+    DEFAULT_TIMEOUT = 60
+
+    # Prediction cache parameters, TTLs in seconds.
+    # Ranges ending today or later use the shorter 'today_ttl'.
+    CACHE_PARAMS = {
+        'max_entries': 512,
+        'ttl': 24 * 60 * 60,
+        'today_ttl': 5 * 60
+    }
+
+    # Batch prediction parameters. history_days is the LSTM look-back window
+    # fetched before the earliest range.
+    BATCH_PARAMS = {
+        'max_jobs': 500,
+        'history_days': 30
+    }
+
+    # Response parameters. Responses of at least gzip_min_bytes are gzipped
+    # for clients that accept it.
+    RESPONSE_PARAMS = {
+        'gzip_min_bytes': 1024,
+        'gzip_level': 6
+    }
+
+    # Request tracing parameters. A sample_rate share of the requests, and
+    # every request slower than slow_ms, is appended to the JSON-lines file
+    # at path (BITFLOW_TRACE_FILE=, empty, disables the export).
+    TRACE_PARAMS = {
+        'sample_rate': float(os.environ.get('BITFLOW_TRACE_SAMPLE_RATE', 0.05)),
+        'slow_ms': 5000,
+        'path': os.environ.get('BITFLOW_TRACE_FILE', os.path.join(PROJECT_ROOT, 'logs', 'traces.jsonl'))
+    }
+
+    # `serve` command parameters, see serving/prefork.py. Every worker is a
+    # process with its own pool of request threads.
+    SERVE_PARAMS = {
+        'host': os.environ.get('BITFLOW_HOST', '127.0.0.1'),
+        'port': int(os.environ.get('BITFLOW_PORT', 5000)),
+        'workers': int(os.environ.get('BITFLOW_WORKERS', os.cpu_count() or 1)),
+        'threads': int(os.environ.get('BITFLOW_THREADS', 8)),
+        'graceful_timeout': 30
+    }
+
+    # Executor used per model: 'thread' or 'process'.
+    # The models spend their time in upstream fetches and in numpy, XGBoost,
+    # TensorFlow or statsmodels code that releases the GIL, so threads are
+    # the default. A model switched to 'process' is loaded again inside the
+    # pool worker by the model registry.
+    MODEL_EXECUTORS = {
+        'XGBoost': 'thread',
+        'LSTM': 'thread',
+        'ARIMA': 'thread',
+        'Prophet': 'thread',
+        'RandomForest': 'thread'
+    }
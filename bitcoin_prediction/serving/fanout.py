@@ -0,0 +1,154 @@
+"""
+Concurrent fan-out of the forecasting models.
+
+/predict and /predict_plot used to run the five models one after another, so
+a request took the sum of all model runtimes and upstream fetches. Here every
+model is submitted to a shared executor and the results are collected against
+a per-model deadline, so the request tracks the slowest model instead.
+run_models() returns all results at once, iter_models() yields each one as
+soon as its model finishes.
+
+A model that raises or misses its deadline comes back as an error entry:
+    {"model_name": "LSTM", "error": "LSTM timed out after 60 s"}
+
+The executor is shared by all requests, so under load a model may wait in
+its queue. The deadline of a thread task starts when it begins running; the
+wait for a worker is bounded separately by FANOUT_PARAMS['max_queue_seconds'],
+and a task that gives up while still queued is cancelled, so it never takes
+a worker. A process task cannot report its start, its deadline counts from
+submission.
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+
+from bitcoin_prediction.serving import metrics
+from bitcoin_prediction.serving import tracing
+from bitcoin_prediction.serving.config import ServingConfig
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+# Shared executor of the given kind ('thread' or 'process'), created on first use
+def get_executor(kind='thread'):
+    with _executors_lock:
+        if kind not in _executors:
+            if kind == 'thread':
+                _executors[kind] = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=ServingConfig.FANOUT_PARAMS['max_thread_workers'],
+                    thread_name_prefix='model-fanout'
+                )
+            elif kind == 'process':
+                _executors[kind] = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=ServingConfig.FANOUT_PARAMS['max_process_workers']
+                )
+            else:
+                raise ValueError(f"Unsupported executor kind: {kind}")
+        return _executors[kind]
+
+
+def shutdown():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+
+
+def model_timeout(model_name, timeouts=None):
+    if timeouts and model_name in timeouts:
+        return timeouts[model_name]
+    return ServingConfig.MODEL_TIMEOUTS.get(model_name, ServingConfig.DEFAULT_TIMEOUT)
+
+
+def error_entry(model_name, error):
+    return {"model_name": model_name, "error": error}
+
+
+# Wrap a thread task so it records in started when it begins running
+def _record_start(task, started, model_name):
+    def run(*args):
+        started[model_name] = time.time()
+        return task(*args)
+    return run
+
+
+# Submit every model and return {model_name: future}.
+# predict_fn(model_name, start_date, end_date) must be a module-level function
+# when a model runs in the process pool, since it is pickled by reference.
+# Thread tasks run in the caller's tracing context.
+# started: optional dict filled with {model_name: time the task started running}
+def submit_models(predict_fn, model_names, start_date, end_date, started=None):
+    started = {} if started is None else started
+    futures = {}
+    for model_name in model_names:
+        kind = ServingConfig.MODEL_EXECUTORS.get(model_name, 'thread')
+        if kind == 'thread':
+            task = _record_start(tracing.wrap(predict_fn), started, model_name)
+        else:
+            task = predict_fn
+            started[model_name] = time.time()
+        futures[model_name] = get_executor(kind).submit(task, model_name, start_date, end_date)
+    return futures
+
+
+def _result(model_name, future):
+    try:
+        return future.result()
+    except Exception as e:
+        logger.error(f"{model_name} failed: {e}")
+        return error_entry(model_name, str(e))
+
+
+# Run the models concurrently and yield (model_name, result) in completion order.
+# A model still running at its deadline, or still waiting for a worker after
+# max_queue_seconds, is yielded as a timeout error entry.
+# timeouts: optional {model_name: seconds} overriding ServingConfig.MODEL_TIMEOUTS
+def iter_models(predict_fn, model_names, start_date, end_date, timeouts=None):
+    submitted_at = time.time()
+    started = {}
+    futures = submit_models(predict_fn, model_names, start_date, end_date, started)
+    pending = {future: model_name for model_name, future in futures.items()}
+    max_queue_seconds = ServingConfig.FANOUT_PARAMS['max_queue_seconds']
+
+    # The deadline counts from the start of the run, or bounds the queue wait
+    def deadline(model_name):
+        start = started.get(model_name)
+        if start is None:
+            return submitted_at + max_queue_seconds
+        return start + model_timeout(model_name, timeouts)
+
+    while pending:
+        next_deadline = min(deadline(model_name) for model_name in pending.values())
+        done, _ = concurrent.futures.wait(
+            pending, timeout=max(0, next_deadline - time.time()),
+            return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            model_name = pending.pop(future)
+            yield model_name, _result(model_name, future)
+
+        now = time.time()
+        for future, model_name in list(pending.items()):
+            if deadline(model_name) > now:
+                continue
+            # A queued task is cancelled before it takes a worker; a running
+            # thread cannot be interrupted, it finishes in the background
+            if future.cancel() or model_name not in started:
+                error = f"{model_name} timed out after waiting {max_queue_seconds} s for a free worker"
+            else:
+                error = f"{model_name} timed out after {model_timeout(model_name, timeouts)} s"
+            del pending[future]
+            logger.warning(error)
+            metrics.model_errors.inc(model=model_name)
+            yield model_name, error_entry(model_name, error)
+
+
+# Run the models concurrently and return {model_name: result} in model_names order.
+def run_models(predict_fn, model_names, start_date, end_date, timeouts=None):
+    results = dict(iter_models(predict_fn, model_names, start_date, end_date, timeouts))
+    return {model_name: results[model_name] for model_name in model_names}
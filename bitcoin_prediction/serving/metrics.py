@@ -0,0 +1,344 @@
+"""
+Prometheus-style metrics of the prediction service, exported by /metrics in
+the Prometheus text format.
+
+The `runtime` field of a result measures something different for every model,
+so each model also reports the time of its stages here:
+    load            artifact load by the model registry
+    fetch           upstream price fetch
+    feature_prep    feature and input window preparation
+    inference       model forward pass / forecast
+    metrics         MAE and MAPE computation
+    total           whole predict call
+Request-level stages use model="all":
+    chart_render    drawing the /predict_plot charts
+    serialization   converting and encoding the response
+
+Usage:
+    from bitcoin_prediction.serving import metrics
+
+    with metrics.stage("ARIMA", "fetch"):
+        prices = fetch_actual_prices(start_date, end_date)
+
+Every stage is also a tracing span (see tracing), so a sampled trace shows
+the same breakdown for a single request.
+
+Metrics live in the memory of the process that records them. Under the
+pre-forked server a scrape reaches one worker, so every process writes a
+snapshot of its metrics to <pid>.json in a shared directory (see
+start_multiprocess), at most SNAPSHOT_INTERVAL seconds old, and render()
+merges the snapshots of all processes: counters and histograms are summed,
+including those of workers that have exited, gauges only over the live
+processes.
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from bitcoin_prediction.serving import tracing
+
+# Seconds between two snapshots of a process in multiprocess mode
+SNAPSHOT_INTERVAL = 1.0
+
+# Latency buckets in seconds, from a cached lookup to a cold TensorFlow run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    # [[label values, value], ...], JSON-serializable
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), copy.deepcopy(value)] for key, value in self._values.items()]
+
+    # A metric of the same kind without values, to merge snapshots into
+    def empty(self):
+        metric = copy.copy(self)
+        metric._values = {}
+        metric._lock = threading.Lock()
+        return metric
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, value in snapshot:
+                key = tuple(key)
+                self._values[key] = self._combine(self._values.get(key), value)
+
+    def _combine(self, total, value):
+        return value if total is None else total + value
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        for name, label_values, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.label_names, label_values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(f"{self.name}_total", key, None, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    # Count the block as in flight while it runs
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][index] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    # Observe the duration of the block in seconds, also when it raises
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def _combine(self, total, value):
+        if total is None:
+            return value
+        return {
+            "counts": [a + b for a, b in zip(total["counts"], value["counts"])],
+            "sum": total["sum"] + value["sum"],
+            "count": total["count"] + value["count"]
+        }
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry["counts"]):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", key, ("le", _format_value(bound)), cumulative))
+                samples.append((f"{self.name}_sum", key, None, entry["sum"]))
+                samples.append((f"{self.name}_count", key, None, entry["count"]))
+        return samples
+
+
+stage_seconds = Histogram(
+    'bitflow_stage_duration_seconds', 'Duration of a prediction stage per model in seconds.', ('model', 'stage')
+)
+model_errors = Counter(
+    'bitflow_model_errors', 'Model predictions that failed or timed out.', ('model',)
+)
+models_in_flight = Gauge(
+    'bitflow_models_in_flight', 'Model predictions currently running.', ('model',)
+)
+http_requests = Counter(
+    'bitflow_requests', 'HTTP requests handled.', ('endpoint', 'method', 'status')
+)
+request_errors = Counter(
+    'bitflow_request_errors', 'HTTP requests answered with a 5xx status.', ('endpoint',)
+)
+request_seconds = Histogram(
+    'bitflow_request_duration_seconds', 'HTTP request duration in seconds.', ('endpoint',)
+)
+requests_in_flight = Gauge(
+    'bitflow_requests_in_flight', 'HTTP requests currently being handled.', ('endpoint',)
+)
+coalesced_calls = Counter(
+    'bitflow_coalesced_calls', 'Calls that waited on an identical in-flight call.', ('flight',)
+)
+upstream_retries = Counter(
+    'bitflow_upstream_retries', 'Upstream HTTP calls retried after a failure.', ('upstream', 'reason')
+)
+forecast_step_seconds = Histogram(
+    'bitflow_forecast_step_seconds', 'Mean time of one step of a recursive forecast in seconds.', ('model',),
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+
+REGISTRY = [
+    stage_seconds, model_errors, models_in_flight,
+    http_requests, request_errors, request_seconds, requests_in_flight,
+    coalesced_calls, upstream_retries, forecast_step_seconds
+]
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Time a stage of a model, see the module docstring for the stage names
+@contextmanager
+def stage(model_name, stage_name):
+    with tracing.span(stage_name, model=model_name), stage_seconds.time(model=model_name, stage=stage_name):
+        yield
+
+
+def observe_stage(model_name, stage_name, seconds):
+    stage_seconds.observe(seconds, model=model_name, stage=stage_name)
+
+
+_multiprocess_dir = None  # directory of the per-process snapshots, None in a single process
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Write the metrics of this process to <pid>.json in directory
+def write_snapshot(directory):
+    snapshot = {metric.name: metric.snapshot() for metric in REGISTRY}
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def remove_snapshots(directory):
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.json'):
+            os.remove(os.path.join(directory, file_name))
+
+
+# Share the metrics of this process through directory: write a snapshot now
+# and then every SNAPSHOT_INTERVAL seconds, and merge all snapshots in render().
+# Call it in every process of the server; a forked process drops the values it
+# inherited, they are in the snapshot of its parent.
+def start_multiprocess(directory, forked=False):
+    global _multiprocess_dir
+    if forked:
+        clear()
+    _multiprocess_dir = directory
+    write_snapshot(directory)
+
+    def write_snapshots():
+        while True:
+            time.sleep(SNAPSHOT_INTERVAL)
+            try:
+                write_snapshot(directory)
+            except OSError:
+                pass  # the directory is gone, the server is shutting down
+    threading.Thread(target=write_snapshots, name='metrics-snapshot', daemon=True).start()
+
+
+# The metrics of every process that wrote a snapshot to directory, merged
+def merged_registry(directory):
+    merged = [metric.empty() for metric in REGISTRY]
+    for file_name in os.listdir(directory):
+        pid, extension = os.path.splitext(file_name)
+        if extension != '.json' or not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, file_name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _alive(int(pid))
+        for metric in merged:
+            if isinstance(metric, Gauge) and not alive:
+                continue
+            metric.merge(snapshot.get(metric.name, []))
+    return merged
+
+
+# All metrics in the Prometheus text exposition format, of every process of
+# the server in multiprocess mode
+def render():
+    registry = REGISTRY
+    if _multiprocess_dir is not None:
+        write_snapshot(_multiprocess_dir)
+        registry = merged_registry(_multiprocess_dir)
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+
+def clear():
+    for metric in REGISTRY:
+        metric.clear()
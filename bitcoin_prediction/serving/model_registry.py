@@ -0,0 +1,128 @@
+"""
+Process-wide registry for the forecasting model artifacts.
+
+Each model module exposes a `load_model()` function that reads its artifacts
+(model plus scalers) from disk. The registry calls those loaders at most once
+per process and hands the same read-only mapping to every predict call, so a
+request no longer pays for unpickling five models.
+
+Usage:
+    from bitcoin_prediction.serving import model_registry
+
+    model_registry.load_all()                  # at startup, optional
+    model_data = model_registry.get("ARIMA")   # shared handle
+    model_registry.load_times()                # {"ARIMA": 12, ...} in ms
+"""
+
+import importlib
+import logging
+import threading
+import time
+from types import MappingProxyType
+
+from bitcoin_prediction.serving import metrics
+from bitcoin_prediction.serving import tracing
+
+logger = logging.getLogger(__name__)
+
+# Must use model_name: "XGBoost", "LSTM", "ARIMA", "Prophet", "RandomForest". Case sensitive.
+MODEL_NAMES = ["XGBoost", "LSTM", "ARIMA", "Prophet", "RandomForest"]
+
+# Module that owns the `load_model()` function of every model
+MODEL_LOADERS = {
+    "XGBoost": "bitcoin_prediction.XGBoost.xgboost_function",
+    "LSTM": "bitcoin_prediction.LSTM.LSTM_function",
+    "ARIMA": "bitcoin_prediction.framework.arima_function",
+    "Prophet": "bitcoin_prediction.framework.prophet_function",
+    "RandomForest": "bitcoin_prediction.random_forest.random_forest_function",
+}
+
+_models = {}
+_load_times = {}
+_load_errors = {}
+_locks = {model_name: threading.Lock() for model_name in MODEL_NAMES}
+
+
+def _check_model_name(model_name):
+    if model_name not in MODEL_LOADERS:
+        raise ValueError("Unsupported model name!")
+
+
+# Module of a model, imported on first use
+def module(model_name):
+    _check_model_name(model_name)
+    return importlib.import_module(MODEL_LOADERS[model_name])
+
+
+# Return the shared artifacts of a model, loading them on first use
+def get(model_name):
+    _check_model_name(model_name)
+    model_data = _models.get(model_name)
+    if model_data is not None:
+        return model_data
+
+    with _locks[model_name]:
+        # Another thread may have finished loading while we waited
+        if model_name in _models:
+            return _models[model_name]
+
+        model_module = module(model_name)
+        start_time = time.time()
+        try:
+            with tracing.span('load', model=model_name):
+                loaded = model_module.load_model()
+        except Exception as e:
+            # Failures are not cached so a model file dropped in later is picked up
+            _load_errors[model_name] = str(e)
+            logger.error(f"Failed to load {model_name} model: {e}")
+            raise
+        load_seconds = time.time() - start_time
+        load_time = int(load_seconds * 1000)  # milliseconds
+        metrics.observe_stage(model_name, 'load', load_seconds)
+
+        _models[model_name] = MappingProxyType(dict(loaded))
+        _load_times[model_name] = load_time
+        _load_errors.pop(model_name, None)
+        logger.info(f"Loaded {model_name} model in {load_time} ms")
+        return _models[model_name]
+
+
+# Load every model once, typically at startup. A model that fails to load is
+# reported and skipped, the others are still served.
+def load_all(model_names=None):
+    if model_names is None:
+        model_names = MODEL_NAMES
+    for model_name in model_names:
+        try:
+            get(model_name)
+        except Exception:
+            pass
+    return load_times()
+
+
+def is_loaded(model_name):
+    return model_name in _models
+
+
+# Load time of every loaded model in milliseconds
+def load_times():
+    return dict(_load_times)
+
+
+# Status of every model: loaded or not, load time and last load error
+def status():
+    return {
+        model_name: {
+            "loaded": model_name in _models,
+            "load_time": _load_times.get(model_name),
+            "error": _load_errors.get(model_name),
+        }
+        for model_name in MODEL_NAMES
+    }
+
+
+# Drop the loaded models, e.g. after retraining replaced the files on disk
+def clear():
+    _models.clear()
+    _load_times.clear()
+    _load_errors.clear()
@@ -0,0 +1,105 @@
+"""
+Bounded LRU + TTL cache for per-model prediction results.
+
+Results are keyed by (model_name, start_date, end_date). Historical ranges do
+not change, so they live for ServingConfig.CACHE_PARAMS['ttl'] seconds; a range
+that reaches today (or later) still depends on the latest upstream prices and
+expires after the shorter 'today_ttl'. Error entries are never cached.
+
+Cached results are shared between callers and must be treated as read-only.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from bitcoin_prediction.serving.config import ServingConfig
+
+
+class PredictionCache:
+    def __init__(self, max_entries, ttl, today_ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.today_ttl = today_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def entry_ttl(self, end_date):
+        # Dates are 'YYYY-MM-DD' strings in UTC, so they compare in date order
+        if end_date >= datetime.now(timezone.utc).date().isoformat():
+            return self.today_ttl
+        return self.ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        expires_at = time.monotonic() + self.entry_ttl(key[2])
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+prediction_cache = PredictionCache(**ServingConfig.CACHE_PARAMS)
+
+
+# Return the cached result of predict_fn(model_name, start_date, end_date),
+# computing and storing it on a miss. bypass skips the lookup but still
+# refreshes the entry with the new result.
+def get_or_compute(predict_fn, model_name, start_date, end_date, bypass=False):
+    key = (model_name, start_date, end_date)
+    if not bypass:
+        result = prediction_cache.get(key)
+        if result is not None:
+            return result
+
+    result = predict_fn(model_name, start_date, end_date)
+    if "error" not in result:
+        prediction_cache.put(key, result)
+    return result
+
+
+def stats():
+    return prediction_cache.stats()
+
+
+def clear():
+    prediction_cache.clear()
@@ -0,0 +1,234 @@
+"""
+Pre-forking HTTP server for production.
+
+`app.run(debug=True)` serves every request from one process with the
+reloader on. Here a master process binds the socket, runs the preload step
+(loading the warm models) and then forks the workers. A forked worker shares
+the master's read-only model memory copy-on-write instead of loading its own
+copy, and serves requests from a pool of threads.
+
+Signals handled by the master:
+    SIGTERM, SIGINT     graceful shutdown, workers finish their in-flight requests
+    SIGHUP              graceful restart: run the reload step (e.g. reload the
+                        models from disk), fork a new generation of workers,
+                        then shut the old workers down gracefully
+    SIGTTIN, SIGTTOU    add or remove one worker
+A worker that dies is replaced. worker_init, if given, runs in every worker
+right after the fork.
+
+Usage:
+    python predict_plot_API.py serve --workers 4 --threads 8 --port 5000
+
+Only POSIX platforms support fork. TensorFlow is not fork-safe once its
+runtime has started, so the preload step of predict_plot_API leaves the LSTM
+model out unless it runs on the NumPy engine (BITFLOW_LSTM_ENGINE=numpy); it
+is then loaded by every worker on first use.
+"""
+
+import gc
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two checks of the master loop
+MASTER_POLL_INTERVAL = 0.5
+
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection, so an idle keep-alive client never holds a
+    # thread of the bounded pool. Streamed responses end by closing the connection.
+    protocol_version = "HTTP/1.0"
+
+
+# WSGI server that handles requests in a fixed-size thread pool
+class PooledWSGIServer(BaseWSGIServer):
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    # Stop accepting and wait for the in-flight requests. Must not be called
+    # from the thread running serve_forever.
+    def graceful_shutdown(self):
+        self.shutdown()
+        self.pool.shutdown(wait=True)
+
+
+class PreforkServer:
+    def __init__(self, app, host, port, workers, threads, graceful_timeout, preload=None, reload=None,
+                 worker_init=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.preload = preload
+        self.reload = reload
+        self.worker_init = worker_init
+        self.socket = None
+        self._workers = {}  # pid -> generation
+        self._retiring = {}  # pid -> time SIGTERM was sent
+        self._generation = 0
+        self._signals = []
+
+    # Run the master loop until SIGTERM or SIGINT
+    def run(self):
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        self.socket.set_inheritable(True)
+        logger.info(f"Listening on http://{self.host}:{self.port} with {self.workers} workers x {self.threads} threads")
+
+        if self.preload is not None:
+            self.preload()
+        self._freeze()
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, self._queue_signal)
+
+        self._spawn_workers()
+        try:
+            while True:
+                self._reap_workers()
+                while self._signals:
+                    sig = self._signals.pop(0)
+                    if sig in (signal.SIGTERM, signal.SIGINT):
+                        logger.info("Shutting down gracefully")
+                        self._stop_all()
+                        return
+                    self._handle_signal(sig)
+                self._kill_stuck_workers()
+                self._spawn_workers()
+                time.sleep(MASTER_POLL_INTERVAL)
+        finally:
+            self.socket.close()
+
+    def _queue_signal(self, sig, frame):
+        self._signals.append(sig)
+
+    def _handle_signal(self, sig):
+        if sig == signal.SIGHUP:
+            logger.info("Restarting workers gracefully")
+            if self.reload is not None:
+                self.reload()
+                self._freeze()
+            old_workers = list(self._workers)
+            self._generation += 1
+            self._spawn_workers()
+            for pid in old_workers:
+                self._retire(pid)
+        elif sig == signal.SIGTTIN:
+            self.workers += 1
+            logger.info(f"Workers: {self.workers}")
+        elif sig == signal.SIGTTOU and self.workers > 1:
+            self.workers -= 1
+            logger.info(f"Workers: {self.workers}")
+            self._retire(max(self._workers))
+
+    # Move the objects loaded so far out of the garbage collector's reach, so
+    # collections in the workers do not write to (and copy) the shared pages
+    def _freeze(self):
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+    def _spawn_workers(self):
+        current = [pid for pid, generation in self._workers.items() if generation == self._generation]
+        for _ in range(self.workers - len(current)):
+            pid = os.fork()
+            if pid == 0:
+                self._run_worker()  # never returns
+            self._workers[pid] = self._generation
+            logger.info(f"Started worker {pid}")
+
+    def _retire(self, pid):
+        if pid in self._workers and pid not in self._retiring:
+            del self._workers[pid]
+            self._retiring[pid] = time.time()
+            self._kill(pid, signal.SIGTERM)
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self._retiring.pop(pid, None) is None and self._workers.pop(pid, None) is not None:
+                logger.warning(f"Worker {pid} exited unexpectedly with status {status}, replacing it")
+
+    # SIGKILL workers that are still busy after graceful_timeout
+    def _kill_stuck_workers(self):
+        now = time.time()
+        for pid, retired_at in list(self._retiring.items()):
+            if now - retired_at > self.graceful_timeout:
+                logger.warning(f"Worker {pid} did not stop in {self.graceful_timeout} s, killing it")
+                self._kill(pid, signal.SIGKILL)
+
+    def _stop_all(self):
+        for pid in list(self._workers):
+            self._retire(pid)
+        while self._retiring:
+            self._reap_workers()
+            self._kill_stuck_workers()
+            time.sleep(0.1)
+
+    def _run_worker(self):
+        exit_code = 0
+        try:
+            for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+                signal.signal(sig, signal.SIG_IGN)
+            master_pid = os.getppid()
+            if self.worker_init is not None:
+                self.worker_init()
+            server = PooledWSGIServer(self.host, self.port, self.app, self.threads, fd=self.socket.fileno())
+
+            def stop(sig=None, frame=None):
+                threading.Thread(target=server.graceful_shutdown, daemon=True).start()
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+
+            # Stop when the master is gone
+            def watch_master():
+                while os.getppid() == master_pid:
+                    time.sleep(1)
+                stop()
+            threading.Thread(target=watch_master, daemon=True).start()
+
+            server.serve_forever()
+            server.pool.shutdown(wait=True)
+        except Exception:
+            logger.exception("Worker crashed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+
+def serve(app, host, port, workers, threads, graceful_timeout, preload=None, reload=None, worker_init=None):
+    PreforkServer(app, host, port, workers, threads, graceful_timeout, preload, reload, worker_init).run()
@@ -0,0 +1,227 @@
+"""
+Response formats of the prediction endpoints.
+
+Predictions are kept in a columnar form, one dates array and one float32
+price array per model, and only converted when the response is written:
+    {"model_name": "ARIMA", "runtime": 12, "mae": 1234.5, "mape": 1.23,
+     "dates": ["2024-11-22", ...], "prices": np.ndarray}
+
+Formats, chosen with ?format= or the Accept header:
+- legacy    application/json, the original dict-of-strings shape and the default
+    {"model_name": "ARIMA", "runtime": 12, "mae": "1234.50", "mape": "1.23",
+     "pred_list": [{"date": "2024-11-22", "price": "98000.12"}, ...]}
+- columnar  application/vnd.bitflow.columnar+json, compact "dates" and "prices" arrays
+- msgpack   application/msgpack, "prices" as float32, needs the msgpack package
+- arrow     application/vnd.apache.arrow.stream, one (result, date, price) table
+            with the per-result fields as JSON in the "results" schema
+            metadata, needs the pyarrow package
+Error entries {"model_name": ..., "error": ...} are the same in every format.
+"""
+
+import functools
+import gzip
+import importlib.util
+import json
+
+import numpy as np
+
+from bitcoin_prediction.serving.config import ServingConfig
+
+FORMAT_MIMETYPES = {
+    'legacy': 'application/json',
+    'columnar': 'application/vnd.bitflow.columnar+json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+MIMETYPE_FORMATS = {mimetype: fmt for fmt, mimetype in FORMAT_MIMETYPES.items()}
+MIMETYPE_FORMATS['application/x-msgpack'] = 'msgpack'
+
+# Formats that need an optional package
+OPTIONAL_MODULES = {
+    'msgpack': 'msgpack',
+    'arrow': 'pyarrow',
+}
+
+BINARY_FORMATS = ('msgpack', 'arrow')
+
+
+def columnar_result(model_name, runtime, mae, mape, dates, prices):
+    prices = np.asarray(prices, dtype=np.float32).reshape(-1)
+    # Results are shared through the prediction cache
+    prices.flags.writeable = False
+    return {
+        "model_name": model_name,
+        "runtime": runtime,
+        "mae": float(mae),
+        "mape": float(mape),
+        "dates": list(dates),
+        "prices": prices
+    }
+
+
+def is_prediction(result):
+    return isinstance(result, dict) and "prices" in result
+
+
+# Prices rounded to cents as Python floats. Rounded in float64, since a
+# float32 cent value such as 57100.12 prints as 57100.12109375.
+def rounded_prices(result):
+    return np.round(result["prices"].astype(np.float64), 2).tolist()
+
+
+# Original response shape of a single result
+def to_legacy(result):
+    if not is_prediction(result):
+        return result
+    legacy = {
+        "model_name": result["model_name"],
+        "runtime": result["runtime"],
+        "mae": f"{result['mae']:.2f}",
+        "mape": f"{result['mape']:.2f}",
+        "pred_list": [
+            {"date": date, "price": f"{price:.2f}"}
+            for date, price in zip(result["dates"], result["prices"].tolist())
+        ]
+    }
+    # Fields added after formatting, e.g. start_date and end_date of batch jobs
+    for key, value in result.items():
+        if key not in legacy and key not in ("dates", "prices"):
+            legacy[key] = value
+    return legacy
+
+
+def to_columnar_json(result):
+    if not is_prediction(result):
+        return result
+    converted = dict(result)
+    converted["prices"] = rounded_prices(result)
+    return converted
+
+
+def to_msgpack_record(result):
+    if not is_prediction(result):
+        return result
+    converted = dict(result)
+    converted["prices"] = result["prices"].tolist()
+    return converted
+
+
+# Apply convert_fn to every result in a payload such as
+# {"results": {...}} or {"results": [...]} or a single result
+def convert(payload, convert_fn):
+    if isinstance(payload, dict):
+        if "model_name" in payload:
+            return convert_fn(payload)
+        return {key: convert(value, convert_fn) for key, value in payload.items()}
+    if isinstance(payload, (list, tuple)):
+        return [convert(value, convert_fn) for value in payload]
+    return payload
+
+
+def _iter_results(payload):
+    if isinstance(payload, dict):
+        if "model_name" in payload:
+            yield payload
+            return
+        values = payload.values()
+    elif isinstance(payload, (list, tuple)):
+        values = payload
+    else:
+        return
+    for value in values:
+        yield from _iter_results(value)
+
+
+@functools.lru_cache(maxsize=None)
+def _module_available(module_name):
+    return importlib.util.find_spec(module_name) is not None
+
+
+def available_formats():
+    return [
+        fmt for fmt in FORMAT_MIMETYPES
+        if fmt not in OPTIONAL_MODULES or _module_available(OPTIONAL_MODULES[fmt])
+    ]
+
+
+# Pick the response format from ?format= (format_arg) or the Accept header.
+# Returns None when the client accepts none of the available formats,
+# raises ValueError for an unknown or unavailable ?format=.
+def negotiate(accept_mimetypes, format_arg=None):
+    available = available_formats()
+    if format_arg:
+        if format_arg not in available:
+            raise ValueError(f"Unsupported format: {format_arg}, available: {', '.join(available)}")
+        return format_arg
+
+    # No Accept header keeps the original response shape
+    if not accept_mimetypes:
+        return 'legacy'
+    mimetypes = [mimetype for mimetype, fmt in MIMETYPE_FORMATS.items() if fmt in available]
+    best = accept_mimetypes.best_match(mimetypes)
+    return MIMETYPE_FORMATS.get(best)
+
+
+# JSON-serializable payload for the JSON formats
+def to_json_payload(payload, fmt):
+    if fmt == 'columnar':
+        return convert(payload, to_columnar_json)
+    return convert(payload, to_legacy)
+
+
+def _encode_msgpack(payload):
+    import msgpack
+    return msgpack.packb(convert(payload, to_msgpack_record), use_single_float=True)
+
+
+def _encode_arrow(payload):
+    import pyarrow as pa
+
+    results = []
+    index, dates, prices = [], [], []
+    for position, result in enumerate(_iter_results(payload)):
+        results.append({key: value for key, value in result.items() if key not in ("dates", "prices")})
+        if is_prediction(result):
+            index.append(np.full(len(result["dates"]), position, dtype=np.int32))
+            dates.extend(result["dates"])
+            prices.append(result["prices"])
+
+    table = pa.table(
+        {
+            "result": pa.array(np.concatenate(index) if index else np.empty(0, dtype=np.int32)),
+            "date": pa.array(dates, type=pa.string()),
+            "price": pa.array(np.concatenate(prices) if prices else np.empty(0, dtype=np.float32)),
+        },
+        metadata={"results": json.dumps(results)}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# Body bytes of a payload in one of the binary formats
+def encode_binary(payload, fmt):
+    if fmt == 'msgpack':
+        return _encode_msgpack(payload)
+    if fmt == 'arrow':
+        return _encode_arrow(payload)
+    raise ValueError(f"Unsupported binary format: {fmt}")
+
+
+# Gzip the body of a (werkzeug) response in place when the client accepts it
+# and the body is at least ServingConfig.RESPONSE_PARAMS['gzip_min_bytes'].
+# Streamed, file and already encoded responses are left alone.
+def gzip_response(response, accept_encodings):
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers or not accept_encodings.quality('gzip'):
+        return response
+
+    data = response.get_data()
+    if len(data) < ServingConfig.RESPONSE_PARAMS['gzip_min_bytes']:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=ServingConfig.RESPONSE_PARAMS['gzip_level']))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
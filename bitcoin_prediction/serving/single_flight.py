@@ -0,0 +1,55 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+When several requests ask for the same thing at the same moment (e.g. a
+dashboard loading /predict_plot in many browsers), only the first caller
+runs the computation; the others wait for it and receive the same result,
+or the same exception. Once the call finishes the key is released, so the
+next call computes again (or hits the prediction cache).
+
+Usage:
+    model_flights = SingleFlight('predict_model')
+    result = model_flights.do(("ARIMA", start_date, end_date), predict_model, "ARIMA", start_date, end_date)
+
+Shared results must be treated as read-only.
+"""
+
+import threading
+from concurrent.futures import Future
+
+from bitcoin_prediction.serving import metrics
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}  # key -> Future of the in-flight call
+        self._lock = threading.Lock()
+
+    # Return fn(*args, **kwargs), sharing the call with concurrent callers of the same key
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            metrics.coalesced_calls.inc(flight=self.name)
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,159 @@
+"""
+Lightweight request tracing.
+
+Every request gets a trace ID and a root span; spans opened while it runs
+(predict_model, the metrics stages such as fetch and chart_render) nest under
+the innermost open span. The current span is kept in a contextvar, so it
+follows the request into the fan-out threads when the task is submitted with
+`wrap()`.
+
+When the root span ends, the trace is written to a JSON-lines file, one line
+per span, if it was sampled (ServingConfig.TRACE_PARAMS['sample_rate']) or if
+the request took longer than 'slow_ms', so slow requests can always be
+reconstructed:
+    {"trace_id": "...", "span_id": "...", "parent_id": "...", "name": "fetch",
+     "start": 1732233600.123, "duration_ms": 412.5, "attributes": {"model": "ARIMA"}}
+
+Usage:
+    from bitcoin_prediction.serving import tracing
+
+    with tracing.span("predict_model", model="ARIMA"):
+        ...
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from bitcoin_prediction.serving.config import ServingConfig
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('bitflow_current_span', default=None)
+_export_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []  # finished spans, list.append is thread safe
+
+
+class Span:
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self._start_counter = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error=None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start_counter) * 1000
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.spans.append(self)
+
+    def to_dict(self):
+        record = {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes
+        }
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_trace_id():
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+# Start the root span of a new trace and make it current.
+# Returns (root_span, token), hand both to end_trace() when the request is done.
+def start_trace(name, trace_id=None, **attributes):
+    sampled = random.random() < ServingConfig.TRACE_PARAMS['sample_rate']
+    trace = Trace(trace_id or uuid.uuid4().hex, sampled)
+    root = Span(trace, name, attributes=attributes)
+    return root, _current_span.set(root)
+
+
+def end_trace(root, token, error=None):
+    root.finish(error)
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Reset from another context, e.g. a teardown after a streamed response
+        _current_span.set(None)
+    if root.trace.sampled or root.duration_ms >= ServingConfig.TRACE_PARAMS['slow_ms']:
+        export(root.trace)
+
+
+# Open a span under the current one. Without a current trace nothing is recorded.
+@contextmanager
+def span(name, **attributes):
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(e)
+        raise
+    else:
+        child.finish()
+    finally:
+        _current_span.reset(token)
+
+
+# Run fn in a copy of the caller's context, so spans opened by a task
+# submitted to a thread pool nest under the span that submitted it
+def wrap(fn):
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return run
+
+
+# Append every span of a trace to the trace file as JSON lines
+def export(trace):
+    path = ServingConfig.TRACE_PARAMS['path']
+    if not path:
+        return
+    lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in trace.spans)
+    try:
+        with _export_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'a') as f:
+                f.write(lines)
+    except OSError as e:
+        logger.warning(f"Could not write trace {trace.trace_id}: {e}")
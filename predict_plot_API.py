@@ -1,9 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 import sys
+import argparse
+import functools
+import json
+import time
+import numpy as np
 import pandas as pd
 import os
-import joblib
-import bitcoin_analysis_plot as bap
+import logging
+import multiprocessing
+import shutil
+import tempfile
 from flask_cors import CORS
 
 # 修复 Matplotlib GUI 错误
@@ -15,71 +22,103 @@ current_dir = os.path.dirname(os.path.abspath(__file__))  # 当前脚本所在
 project_root = os.path.join(current_dir, '.')  # 项目根目录
 sys.path.append(project_root)  # 将根目录加入 sys.path
 
-from bitcoin_prediction.XGBoost.xgboost_function import predict_prices as xgb_predict_prices # 调用你的 XGBoost function
+from bitcoin_prediction.market_data import price_store
+from bitcoin_prediction.serving import model_registry
+from bitcoin_prediction.serving import prefork
+from bitcoin_prediction.serving import batch
+from bitcoin_prediction.serving import fanout
+from bitcoin_prediction.serving import metrics
+from bitcoin_prediction.serving import prediction_cache
+from bitcoin_prediction.serving import response_format
+from bitcoin_prediction.serving import single_flight
+from bitcoin_prediction.serving import tracing
+from bitcoin_prediction.serving.config import ServingConfig
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# Initialize Flask app
+app = Flask(__name__)
+CORS(app)
+
+# Load the warm models once per process, the others load on first use.
+# The predict functions share these handles. Chart pool workers re-import this
+# module when it is run as a script and must not load the models. The `serve`
+# master loads them in preload_serving instead, before it forks.
+SERVE_MASTER = __name__ == '__main__' and sys.argv[1:2] == ['serve']
+if multiprocessing.parent_process() is None and not SERVE_MASTER:
+    model_registry.load_all(ServingConfig.WARM_MODELS)
+
+# The model modules are imported on first use, so a worker only pays for the
+# frameworks (XGBoost, TensorFlow, statsmodels, Prophet) of the models it serves.
+def xgb_predict_prices(start_date, end_date, model_data=None):
+    from bitcoin_prediction.XGBoost.xgboost_function import predict_prices
+    return predict_prices(start_date, end_date, model_data)
 
 """
 - Must use Python 3.10 or higher in order to import tensorflow
 - Must install tensorflow 2.16.2
+- Not needed with BITFLOW_LSTM_ENGINE=numpy, which runs the exported weights with NumPy
 """
-from bitcoin_prediction.LSTM.LSTM_function import predict_bitcoin_prices as lstm_predict_prices
-from bitcoin_prediction.framework.arima_function import predict_prices as arima_predict_prices
-from bitcoin_prediction.framework.prophet_function import predict as prophet_predict_prices
-from bitcoin_prediction.random_forest.random_forest_function import predict as random_forest_predict_prices
+def lstm_predict_prices(start_date, end_date, model_data=None):
+    from bitcoin_prediction.LSTM.LSTM_function import predict_bitcoin_prices
+    return predict_bitcoin_prices(start_date, end_date, model_data)
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
+def arima_predict_prices(start_date, end_date, model_data=None):
+    from bitcoin_prediction.framework.arima_function import predict_prices
+    return predict_prices(start_date, end_date, model_data)
 
-# Load the xgboost model
-def load_xgboost_model():
-    xgboost_model_path = os.path.join(os.path.dirname(__file__), 'bitcoin_prediction', 'framework', 'arima_model.pkl')
-    if not os.path.exists(xgboost_model_path):
-        raise FileNotFoundError(f"xgboost model file not found at {xgboost_model_path}")
-    with open(xgboost_model_path, 'rb') as file:
-        xgboost_model = joblib.load(file)
-    return xgboost_model
-
-# Load the arima model
-def load_arima_model():
-    arima_model_path = os.path.join(os.path.dirname(__file__), 'bitcoin_prediction', 'framework', 'arima_model.pkl')
-    if not os.path.exists(arima_model_path):
-        raise FileNotFoundError(f"ARIMA model file not found at {arima_model_path}")
-    with open(arima_model_path, 'rb') as file:
-        arima_model = joblib.load(file)
-    return arima_model
-
-# Load the Random Forest model
-def load_rf_model():
-    rf_model_path = os.path.join(os.path.dirname(__file__), 'bitcoin_prediction', 'random_forest', 'rf_model.pkl')
-    rf_model = joblib.load(rf_model_path)
-    return rf_model
+def prophet_predict_prices(start_date, end_date, model_data=None):
+    from bitcoin_prediction.framework.prophet_function import predict
+    return predict(start_date, end_date, model_data)
+
+def random_forest_predict_prices(start_date, end_date, model_data=None):
+    from bitcoin_prediction.random_forest.random_forest_function import predict
+    return predict(start_date, end_date, model_data)
 
 # Main prediction function
 # Must use model_name: "XGBoost", "LSTM", "ARIMA", "Prophet", "RandomForest". Case sensitive.
 def predict_model(model_name, start_date, end_date):
+    with tracing.span('predict_model', model=model_name, start_date=start_date, end_date=end_date), \
+            metrics.models_in_flight.track(model=model_name), metrics.stage_seconds.time(model=model_name, stage='total'):
+        try:
+            model_data = model_registry.get(model_name)
+            if model_name == 'XGBoost':
+                result = xgb_predict_prices(start_date, end_date, model_data)
+            elif model_name == 'LSTM':
+                result = lstm_predict_prices(start_date, end_date, model_data)
+            elif model_name == 'ARIMA':
+                result = arima_predict_prices(start_date, end_date, model_data)
+            elif model_name == 'Prophet':
+                result = prophet_predict_prices(start_date, end_date, model_data)
+            elif model_name == 'RandomForest':
+                result = random_forest_predict_prices(start_date, end_date, model_data)
+            else:
+                raise ValueError("Unsupported model name!")
+            result = format_prediction(model_name, result, start_date)
+        except Exception:
+            metrics.model_errors.inc(model=model_name)
+            raise
+    if "error" in result:
+        metrics.model_errors.inc(model=model_name)
+    return result
+
+# Convert the raw result of a model function into the columnar result format,
+# see response_format. Prices stay floats until the response is written.
+def format_prediction(model_name, result, start_date):
     if model_name == 'XGBoost':
-        # Call the XGBoost function
-        xgb_result = xgb_predict_prices(start_date, end_date)
-        xgb_runtime = xgb_result['runtime']
-        xgb_pred_list = [
-            {"date": pd.to_datetime(row["Date"]).strftime('%Y-%m-%d'), "price": f"{row['Predicted_Price']:.2f}"}
-            for _, row in xgb_result['predictions'].iterrows()
-        ]
-        xgb_mae = xgb_result['mae']
-        xgb_mape = xgb_result['mape']
-        
+        xgb_result = result
+        xgb_predictions = xgb_result['predictions']
+        xgb_dates = pd.to_datetime(xgb_predictions['Date']).dt.strftime('%Y-%m-%d')
+
         # Combine all results into a single dictionary
-        xgb_prediction_result = {
-            "model_name": model_name,
-            "runtime": xgb_runtime,
-            "mae": f"{xgb_mae:.2f}",
-            "mape": f"{xgb_mape:.2f}",
-            "pred_list": xgb_pred_list
-        }
-        return xgb_prediction_result
+        return response_format.columnar_result(
+            model_name, xgb_result['runtime'], xgb_result['mae'], xgb_result['mape'],
+            xgb_dates, xgb_predictions['Predicted_Price'].to_numpy()
+        )
     elif model_name == 'LSTM':
-        # Call the LSTM function
-        lstm_result = lstm_predict_prices(start_date, end_date)
+        lstm_result = result
 
         # 检查是否存在错误
         if 'error' in lstm_result:
@@ -88,170 +127,239 @@ def predict_model(model_name, start_date, end_date):
                 "error": lstm_result['error']
             }
 
-        lstm_runtime = lstm_result['runtime']
         lstm_pred_list_raw = lstm_result['pred_list']  # No date
-        lstm_mae = lstm_result['mae']
-        lstm_mape = lstm_result['mape']
-        
+
         # 获取预测对应的日期范围
         # 确保 prediction_dates 的长度与 lstm_pred_list_raw 一致
         prediction_dates = pd.date_range(start=start_date, periods=len(lstm_pred_list_raw), freq='D')
 
-        # 格式化预测结果，添加日期信息
-        lstm_pred_list = [
-            {"date": date.strftime('%Y-%m-%d'), "price": f"{price:.2f}"}
-            for date, price in zip(prediction_dates, lstm_pred_list_raw)
-        ]
-
         # Combine all results into a single dictionary
-        lstm_prediction_result = {
-            "model_name": model_name,
-            "runtime": lstm_runtime,
-            "mae": f"{lstm_mae:.2f}",
-            "mape": f"{lstm_mape:.2f}",
-            "pred_list": lstm_pred_list
-        }
-        return lstm_prediction_result
+        return response_format.columnar_result(
+            model_name, lstm_result['runtime'], lstm_result['mae'], lstm_result['mape'],
+            prediction_dates.strftime('%Y-%m-%d'), lstm_pred_list_raw
+        )
     elif model_name == 'ARIMA':
-        # Call the ARIMA function
-        arima_result = arima_predict_prices(start_date, end_date)
-        arima_runtime = arima_result['runtime']
-        arima_pred_list = [
-            {"date": str(item[0]), "price": f"{item[1]:.2f}"}
-            for item in arima_result['pred_list']
-        ]
-        arima_mae = arima_result['mae']
-        arima_mape = arima_result['mape']
-        
+        arima_result = result
+        arima_pred_list = arima_result['pred_list']
+
         # Combine all results into a single dictionary
-        arima_prediction_result = {
-            "model_name": model_name,
-            "runtime": arima_runtime,
-            "mae": f"{arima_mae:.2f}",
-            "mape": f"{arima_mape:.2f}",
-            "pred_list": arima_pred_list
-        }
-        return arima_prediction_result
+        return response_format.columnar_result(
+            model_name, arima_result['runtime'], arima_result['mae'], arima_result['mape'],
+            [str(item[0]) for item in arima_pred_list], [item[1] for item in arima_pred_list]
+        )
     elif model_name == 'Prophet':
-        # Call the prophet function
-        prophet_mae, prophet_mape, prophet_runtime, prophet_forecast_array = prophet_predict_prices(start_date, end_date)
-
-        prophet_pred_list = [
-            {"date": item[0].strftime('%Y-%m-%d'), "price": f"{item[1]:.2f}"}
-            for item in prophet_forecast_array
-        ]
+        prophet_mae, prophet_mape, prophet_runtime, prophet_forecast_array = result
 
         # Combine all results into a single dictionary
-        prophet_prediction_result = {
-            "model_name": model_name,
-            "runtime": round(prophet_runtime),
-            "mae": f"{prophet_mae:.2f}",
-            "mape": f"{prophet_mape:.2f}",
-            "pred_list": prophet_pred_list
-        }
-        return prophet_prediction_result
+        return response_format.columnar_result(
+            model_name, round(prophet_runtime), prophet_mae, prophet_mape,
+            [item[0].strftime('%Y-%m-%d') for item in prophet_forecast_array],
+            [item[1] for item in prophet_forecast_array]
+        )
     elif model_name == 'RandomForest':
-        # Call the randomforest function
-        random_forest_mae, random_forest_mape, random_forest_runtime, random_forest_forecast_array = random_forest_predict_prices(start_date, end_date)
-        # Convert predictions into the required dictionary format
-        random_forest_pred_list = [
-            {"date": item["date"], "price": f"{item['price']:.2f}"}
-            for item in random_forest_forecast_array
-        ]
-        
+        random_forest_mae, random_forest_mape, random_forest_runtime, random_forest_forecast_array = result
+
         # Combine all results into a single dictionary
-        random_forest_prediction_result = {
-            "model_name": model_name,
-            "runtime": random_forest_runtime,
-            "mae": f"{random_forest_mae:.2f}",
-            "mape": f"{random_forest_mape:.2f}",
-            "pred_list": random_forest_pred_list
-        }
-        return random_forest_prediction_result
+        return response_format.columnar_result(
+            model_name, random_forest_runtime, random_forest_mae, random_forest_mape,
+            [item["date"] for item in random_forest_forecast_array],
+            [item["price"] for item in random_forest_forecast_array]
+        )
     else:
         raise ValueError("Unsupported model name!")
 
 
+# Write a payload of prediction results in the format the client asked for:
+# the original dict-of-strings JSON by default, columnar JSON, MessagePack or
+# Arrow IPC via ?format= or the Accept header (see response_format)
+def prediction_response(payload, status=200):
+    try:
+        fmt = response_format.negotiate(request.accept_mimetypes, request.args.get('format'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if fmt is None:
+        return jsonify({
+            "error": "None of the accepted response formats is available",
+            "formats": [response_format.FORMAT_MIMETYPES[f] for f in response_format.available_formats()]
+        }), 406
+
+    with metrics.stage('all', 'serialization'):
+        if fmt in response_format.BINARY_FORMATS:
+            response = Response(response_format.encode_binary(payload, fmt), status=status)
+        else:
+            response = jsonify(response_format.to_json_payload(payload, fmt))
+            response.status_code = status
+    response.mimetype = response_format.FORMAT_MIMETYPES[fmt]
+    response.vary.add('Accept')
+    return response
+
+
+# Gzip large responses, see ServingConfig.RESPONSE_PARAMS
+@app.after_request
+def compress_response(response):
+    return response_format.gzip_response(response, request.accept_encodings)
+
+
+# Request metrics, labelled by route pattern so the label set stays bounded
+def metrics_endpoint():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.request_start_time = time.perf_counter()
+    metrics.requests_in_flight.inc(endpoint=metrics_endpoint())
+
+
+# Every request is a trace, see bitcoin_prediction.serving.tracing. A client
+# can pass its own trace ID in the X-Trace-Id header.
+# The trace and the request duration end in teardown, except for streamed
+# responses: their view returns before the first record is generated, so
+# they end when the server closes the response, see end_with_stream.
+@app.before_request
+def start_request_trace():
+    g.trace = tracing.start_trace(
+        'request', trace_id=request.headers.get('X-Trace-Id'),
+        endpoint=metrics_endpoint(), method=request.method, query=request.query_string.decode('utf-8', 'replace')
+    )
+
+@app.after_request
+def add_trace_header(response):
+    if 'trace' in g:
+        root, _ = g.trace
+        root.set(status=response.status_code)
+        response.headers['X-Trace-Id'] = root.trace.trace_id
+    return response
+
+def finish_trace(trace, error=None):
+    if trace is not None:
+        root, token = trace
+        tracing.end_trace(root, token, error)
+
+def finish_metrics(endpoint, start_time):
+    if start_time is not None:
+        metrics.request_seconds.observe(time.perf_counter() - start_time, endpoint=endpoint)
+        metrics.requests_in_flight.dec(endpoint=endpoint)
+
+@app.teardown_request
+def finish_request_trace(error=None):
+    if not g.get('streamed'):
+        finish_trace(g.get('trace'), error)
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = metrics_endpoint()
+    metrics.http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if response.status_code >= 500:
+        metrics.request_errors.inc(endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if not g.get('streamed'):
+        finish_metrics(metrics_endpoint(), g.get('request_start_time'))
+
+
+def end_with_stream(response):
+    """End the trace and the request metrics when the server closes a streamed
+    response, after its last record or a client disconnect."""
+    g.streamed = True
+    trace, endpoint, start_time = g.get('trace'), metrics_endpoint(), g.get('request_start_time')
+
+    def finish():
+        finish_metrics(endpoint, start_time)
+        finish_trace(trace)
+
+    response.call_on_close(finish)
+    return response
+
+
+# Identical predictions requested at the same time run once and share the result
+model_flights = single_flight.SingleFlight('predict_model')
+all_models_flights = single_flight.SingleFlight('predict_all_models')
+
+
+def predict_model_coalesced(model_name, start_date, end_date):
+    return model_flights.do((model_name, start_date, end_date), predict_model, model_name, start_date, end_date)
+
+
+# predict_model behind the LRU + TTL prediction cache
+# bypass_cache: recompute even if a cached result exists, the new result replaces it
+def predict_model_cached(model_name, start_date, end_date, bypass_cache=False):
+    return prediction_cache.get_or_compute(
+        predict_model_coalesced, model_name, start_date, end_date, bypass=bypass_cache
+    )
+
+
+# Whether the request asked to bypass the prediction cache (?noCache=1)
+def cache_bypassed():
+    return request.args.get('noCache', '').lower() in ('1', 'true', 'yes')
+
+
 # Main prediction function for all models
-def main_predict_all_models(start_date, end_date):
-    models = ["XGBoost", "LSTM", "ARIMA", "Prophet", "RandomForest"]
+# The models run concurrently, a model that fails or times out keeps its error
+# entry in result_dic and is left out of the chart data.
+# Concurrent calls for the same dates share one run, the results are read-only.
+def main_predict_all_models(start_date, end_date, bypass_cache=False):
+    return all_models_flights.do(
+        (start_date, end_date, bypass_cache), _predict_all_models, start_date, end_date, bypass_cache
+    )
+
+
+def _predict_all_models(start_date, end_date, bypass_cache):
     predict_dictionary = {}
     mae_list = {}
     runtime_list = {}
     mape_list = {}
 
-    result_dic = {}
-    for model_name in models:
-        result = predict_model(model_name, start_date, end_date)
-        result_dic[model_name] = result
-        # Extract results for each model
-        predict_dictionary[model_name] = {item["date"]: item["price"] for item in result["pred_list"]}
-        mae_list[model_name] = result["mae"]
+    predict_fn = functools.partial(predict_model_cached, bypass_cache=bypass_cache)
+    result_dic = fanout.run_models(predict_fn, ServingConfig.MODELS, start_date, end_date)
+    for model_name, result in result_dic.items():
+        if "error" in result:
+            continue
+        # Extract results for each model, rounded to cents as in the response
+        predict_dictionary[model_name] = dict(zip(result["dates"], response_format.rounded_prices(result)))
+        mae_list[model_name] = round(result["mae"], 2)
         runtime_list[model_name] = result["runtime"]
-        mape_list[model_name] = [result["mape"]]  # Single MAPE value as a list
+        mape_list[model_name] = [round(result["mape"], 2)]  # Single MAPE value as a list
 
     return result_dic, predict_dictionary, mae_list, runtime_list, mape_list
 
-# /predict: Return the result of a specific model in dictionary form
+# /predict: Return the result of a specific model in dictionary form (?model=ARIMA),
+# or the results of all models when no model is given
 @app.route('/predict', methods=['GET'])
 def predict_all_models():
     try:
+        model_name = request.args.get('model')
         start_date = request.args.get('startDate')
         end_date = request.args.get('endDate')
         
         # Validate input
         if not start_date or not end_date:
             return jsonify({"error": "startDate and endDate are required"}), 400
+        if model_name and model_name not in ServingConfig.MODELS:
+            return jsonify({"error": f"Unsupported model name: {model_name}"}), 400
         
         # Ensure valid date format
         start_date = pd.to_datetime(int(start_date), unit='s').strftime('%Y-%m-%d')
         end_date = pd.to_datetime(int(end_date), unit='s').strftime('%Y-%m-%d')
 
-        # Predict for all models
-        models = ['XGBoost', 'LSTM', 'ARIMA', 'Prophet', 'RandomForest']
-        results = {}
-        
-        for model_name in models:
-            try:
-                results[model_name] = predict_model(model_name, start_date, end_date)
-            except Exception as e:
-                results[model_name] = {"error": str(e)}
+        # Predict using the selected model, only its framework gets imported
+        if model_name:
+            prediction_result = predict_model_cached(model_name, start_date, end_date, cache_bypassed())
+            return prediction_response(prediction_result)
+
+        # Predict for all models concurrently, failures become per-model error entries
+        predict_fn = functools.partial(predict_model_cached, bypass_cache=cache_bypassed())
+        results = fanout.run_models(predict_fn, ServingConfig.MODELS, start_date, end_date)
 
         # Return all results in the required format
-        return jsonify({"results": results}), 200
+        return prediction_response({"results": results})
 
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
-# def predict():
-#     try:
-#         # Get parameters from request
-#         model_name = request.args.get('model')
-#         start_date = request.args.get('startDate')
-#         end_date = request.args.get('endDate')
-
-#         # Validate input
-#         if not model_name or not start_date or not end_date:
-#             return jsonify({"error": "model, startDate, and endDate are required"}), 400
-
-#         # Ensure start_date and end_date are in correct format
-#         try:
-#             start_date = pd.to_datetime(start_date).strftime('%Y-%m-%d')
-#             end_date = pd.to_datetime(end_date).strftime('%Y-%m-%d')
-#         except Exception:
-#             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
-
-#         # Predict using the selected model
-#         prediction_result = predict_model(model_name, start_date, end_date)
-
-#         # Return the prediction result as a JSON response
-#         return jsonify(prediction_result), 200
-
-#     except ValueError as ve:
-#         return jsonify({"error": str(ve)}), 400
-#     except Exception as e:
-#         return jsonify({"error": str(e)}), 500
-    
 # # /predict_all: Return the results of all models. Each feature, like mae, is in a dictionary.
 # @app.route('/predict_all', methods=['GET'])
 # def predict_all():
@@ -283,7 +391,109 @@ def predict_all_models():
 #         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/predict_plot', methods=['GET'])
+# /predict_batch: Predict many date ranges in one request
+# Body: {"jobs": [{"model": "ARIMA", "startDate": 1732233600, "endDate": 1732752000}, ...]}
+# Returns {"results": [...]} with one entry per job, in job order
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    try:
+        jobs = batch.parse_jobs(request.get_json(silent=True))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results = batch.run_batch(jobs, format_prediction)
+        return prediction_response({"results": results})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# /predict_stream: Same as /predict, but streamed as NDJSON with one record per
+# model in completion order, followed by a summary record:
+#   {"type": "result", "model_name": "ARIMA", "result": {...}}
+#   {"type": "summary", "models": [...], "errors": [...], "elapsed": 1234}
+@app.route('/predict_stream', methods=['GET'])
+def predict_stream():
+    start_date = request.args.get('startDate')
+    end_date = request.args.get('endDate')
+
+    if not start_date or not end_date:
+        return jsonify({"error": "startDate and endDate are required"}), 400
+
+    try:
+        # Ensure valid date format
+        start_date = pd.to_datetime(int(start_date), unit='s').strftime('%Y-%m-%d')
+        end_date = pd.to_datetime(int(end_date), unit='s').strftime('%Y-%m-%d')
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    # ?format=columnar streams the columnar JSON results, the binary formats do not apply
+    fmt = 'columnar' if request.args.get('format') == 'columnar' else 'legacy'
+    predict_fn = functools.partial(predict_model_cached, bypass_cache=cache_bypassed())
+
+    def generate():
+        start_time = time.time()
+        completed = []
+        errors = []
+        for model_name, result in fanout.iter_models(predict_fn, ServingConfig.MODELS, start_date, end_date):
+            completed.append(model_name)
+            if "error" in result:
+                errors.append(model_name)
+            result = response_format.to_json_payload(result, fmt)
+            yield json.dumps({"type": "result", "model_name": model_name, "result": result}) + "\n"
+
+        yield json.dumps({
+            "type": "summary",
+            "models": completed,
+            "errors": errors,
+            "elapsed": int((time.time() - start_time) * 1000)  # milliseconds
+        }) + "\n"
+
+    # The request context stays open and the request trace and metrics are
+    # ended after the last record. Disable proxy buffering so every record
+    # reaches the client right away.
+    return end_with_stream(Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                                    headers={'X-Accel-Buffering': 'no'}))
+
+
+# /models: Load status and load time (ms) of every model
+@app.route('/models', methods=['GET'])
+def models_status():
+    return jsonify(model_registry.status()), 200
+
+
+# /cache_stats: Hit, miss and eviction counters of the prediction cache
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(prediction_cache.stats()), 200
+
+
+# /metrics: Request counters and per-model, per-stage latency histograms in the
+# Prometheus text format, see bitcoin_prediction.serving.metrics. Under `serve`
+# they are the merged metrics of all workers, whichever worker answers.
+@app.route('/metrics', methods=['GET'])
+def metrics_export():
+    return Response(metrics.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+
+# Run all models and convert their results into the inputs of the charts
+def prepare_chart_inputs(start_date, end_date, bypass_cache=False):
+    # Extract results
+    result_dic, predict_dictionary, mae_list, runtime_list, mape_list = main_predict_all_models(start_date, end_date, bypass_cache)
+
+    # Convert runtime_list to the correct format
+    runtime_list = {key: int(value) for key, value in runtime_list.items()}
+
+    # The results of /predict_plot keep the original response shape
+    result_dic = response_format.convert(result_dic, response_format.to_legacy)
+
+    # Debugging: log converted parameters
+    logger.debug("Converted outputs: mae_list: %s, runtime_list: %s, mape_list: %s", mae_list, runtime_list, mape_list)
+    logger.debug("predict_dictionary: %s", predict_dictionary)
+
+    return result_dic, predict_dictionary, mae_list, runtime_list, mape_list
+
+
 @app.route('/predict_plot', methods=['GET'])
 def predict_plot():
     start_date = request.args.get('startDate')
@@ -297,40 +507,32 @@ def predict_plot():
         start_date = pd.to_datetime(int(start_date), unit='s').strftime('%Y-%m-%d')
         end_date = pd.to_datetime(int(end_date), unit='s').strftime('%Y-%m-%d')
 
-        # Extract results
-        result_dic, predict_dictionary, mae_list, runtime_list, mape_list = main_predict_all_models(start_date, end_date)
+        result_dic, predict_dictionary, mae_list, runtime_list, mape_list = prepare_chart_inputs(start_date, end_date, cache_bypassed())
 
-        # Convert mae_list, runtime_list, and mape_list to the correct format
-        mae_list = {key: float(value) for key, value in mae_list.items()}
-        runtime_list = {key: int(value) for key, value in runtime_list.items()}
-        mape_list = {key: [float(val) for val in value] for key, value in mape_list.items()}
-        
-        # Convert predict_dictionary values to float
-        predict_dictionary = {
-            algo: {date: float(price) for date, price in data.items()}
-            for algo, data in predict_dictionary.items()
-        }
-
-        # Debugging: print converted parameters
-        print("Converted Outputs:")
-        print(f"mae_list: {mae_list}")
-        print(f"runtime_list: {runtime_list}")
-        print(f"mape_list: {mape_list}")
-        print(f"predict_dictionary: {predict_dictionary}")
-
-        # Fetch actual prices and generate charts
-        actual_prices = bap.fetch_actual_prices_with_retry(start_date, end_date)
-        trend_chart_path = bap.plot_trend_chart(predict_dictionary, actual_prices)
-        error_bar_chart_path = bap.plot_error_bar_chart(mae_list)
-        runtime_bar_chart_path = bap.plot_runtime_bar_chart(runtime_list)
-        dynamic_error_chart_path = bap.plot_mape_bar_chart(mape_list)
+        # Fetch actual prices and generate charts, seaborn is only imported once charts are needed
+        import bitcoin_analysis_plot as bap
+        with metrics.stage('all', 'fetch'):
+            actual_prices = bap.fetch_actual_prices(start_date, end_date)
+
+        # ?asyncCharts=1: return right away with one job ID per chart, polled via /chart_jobs/<job_id>
+        if request.args.get('asyncCharts', '').lower() in ('1', 'true', 'yes'):
+            with metrics.stage('all', 'chart_render'):
+                chart_jobs = bap.submit_charts(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list)
+            return jsonify({
+                "results": result_dic,
+                "chartJobs": chart_jobs
+            })
+
+        # The four charts are drawn in parallel in the chart process pool
+        with metrics.stage('all', 'chart_render'):
+            charts = bap.render_charts(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list)
 
         return jsonify({
             "results": result_dic,
-            "priceChart": trend_chart_path,
-            "MAEChart": error_bar_chart_path,
-            "RuntimeChart": runtime_bar_chart_path,
-            "MAPEChart": dynamic_error_chart_path
+            "priceChart": charts["priceChart"],
+            "MAEChart": charts["MAEChart"],
+            "RuntimeChart": charts["RuntimeChart"],
+            "MAPEChart": charts["MAPEChart"]
         })
 
     except Exception as e:
@@ -338,6 +540,109 @@ def predict_plot():
 
 
 
+# /predict_chart_data: The data of the /predict_plot charts as compact columnar
+# JSON, for the frontend to draw itself. Nothing is rendered unless ?png=1.
+#   {"dates": [...], "trend": {"XGBoost": [...], ..., "Actual": [...]},
+#    "mae": {"algorithms": [...], "values": [...]}, "runtime": {...}, "mape": {...}}
+@app.route('/predict_chart_data', methods=['GET'])
+def predict_chart_data():
+    start_date = request.args.get('startDate')
+    end_date = request.args.get('endDate')
+
+    if not start_date or not end_date:
+        return jsonify({"error": "startDate and endDate are required"}), 400
+
+    try:
+        # Ensure valid date format
+        start_date = pd.to_datetime(int(start_date), unit='s').strftime('%Y-%m-%d')
+        end_date = pd.to_datetime(int(end_date), unit='s').strftime('%Y-%m-%d')
+
+        _, predict_dictionary, mae_list, runtime_list, mape_list = prepare_chart_inputs(start_date, end_date, cache_bypassed())
+
+        import bitcoin_analysis_plot as bap
+        with metrics.stage('all', 'fetch'):
+            actual_prices = bap.fetch_actual_prices(start_date, end_date)
+        with metrics.stage('all', 'serialization'):
+            response = bap.chart_data(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list)
+
+        # ?png=1: also render the PNG charts
+        if request.args.get('png', '').lower() in ('1', 'true', 'yes'):
+            with metrics.stage('all', 'chart_render'):
+                response["charts"] = bap.render_charts(predict_dictionary, actual_prices, mae_list, runtime_list, mape_list)
+
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# /chart_jobs/<job_id>: Status of a chart submitted with /predict_plot?asyncCharts=1
+# {"status": "pending"}, {"status": "done", "path": ...} or {"status": "error", "error": ...}
+@app.route('/chart_jobs/<job_id>', methods=['GET'])
+def chart_job(job_id):
+    import bitcoin_analysis_plot as bap
+    status = bap.chart_job_status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown chart job"}), 404
+    return jsonify(status), 200
+
+
+# Warm models the `serve` master may load before forking. TensorFlow is not
+# fork-safe once loaded, so the LSTM is only preloaded with the NumPy engine;
+# with the Keras engine every worker loads it on first use.
+def fork_safe_models(model_names):
+    from bitcoin_prediction.LSTM.LSTM_function import LSTM_ENGINE
+    if LSTM_ENGINE == 'numpy':
+        return list(model_names)
+    return [model_name for model_name in model_names if model_name != 'LSTM']
+
+# Run in the `serve` master before the workers are forked, so they share the
+# loaded models, price data and imported libraries copy-on-write. The master's
+# metrics (e.g. the load stages) go to metrics_dir, see metrics.start_multiprocess
+def preload_serving(metrics_dir=None):
+    model_registry.load_all(fork_safe_models(ServingConfig.WARM_MODELS))
+    price_store.load()
+    import bitcoin_analysis_plot  # noqa: F401, seaborn and matplotlib
+    if metrics_dir is not None:
+        metrics.write_snapshot(metrics_dir)
+
+# Run in the `serve` master on SIGHUP, the new workers get the reloaded models
+def reload_serving(metrics_dir=None):
+    model_registry.clear()
+    prediction_cache.clear()
+    model_registry.load_all(fork_safe_models(ServingConfig.WARM_MODELS))
+    if metrics_dir is not None:
+        metrics.write_snapshot(metrics_dir)
+
+
 # Run the Flask app
 if __name__ == '__main__':
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description="BitFlow prediction API")
+    subparsers = parser.add_subparsers(dest='command')
+    serve_parser = subparsers.add_parser('serve', help="Serve with pre-forked worker processes")
+    serve_parser.add_argument('--host', default=ServingConfig.SERVE_PARAMS['host'])
+    serve_parser.add_argument('--port', type=int, default=ServingConfig.SERVE_PARAMS['port'])
+    serve_parser.add_argument('--workers', type=int, default=ServingConfig.SERVE_PARAMS['workers'])
+    serve_parser.add_argument('--threads', type=int, default=ServingConfig.SERVE_PARAMS['threads'],
+                              help="Request threads per worker")
+    serve_parser.add_argument('--graceful-timeout', type=int, default=ServingConfig.SERVE_PARAMS['graceful_timeout'],
+                              help="Seconds a stopping worker may spend on in-flight requests")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        # Every worker writes its metrics here, /metrics merges them. Snapshots
+        # of an earlier run in BITFLOW_METRICS_DIR are dropped.
+        metrics_dir = os.environ.get('BITFLOW_METRICS_DIR') or tempfile.mkdtemp(prefix='bitflow-metrics-')
+        os.makedirs(metrics_dir, exist_ok=True)
+        metrics.remove_snapshots(metrics_dir)
+        try:
+            prefork.serve(app, args.host, args.port, args.workers, args.threads, args.graceful_timeout,
+                          preload=functools.partial(preload_serving, metrics_dir),
+                          reload=functools.partial(reload_serving, metrics_dir),
+                          worker_init=functools.partial(metrics.start_multiprocess, metrics_dir, forked=True))
+        finally:
+            if 'BITFLOW_METRICS_DIR' not in os.environ:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+    else:
+        # Development server
+        app.run(debug=True)
@@ -0,0 +1,15 @@
+# The tests run without network access or trained models: the price store is
+# offline and private to the test session, no model is loaded at import and
+# charts and traces go to a temporary directory
+import os
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix='bitflow-tests-')
+os.environ.setdefault('BITFLOW_PRICE_MODE', 'offline')
+os.environ.setdefault('BITFLOW_PRICE_DB', os.path.join(_tmp_dir, 'prices.sqlite'))
+os.environ.setdefault('BITFLOW_PLOTS_DIR', os.path.join(_tmp_dir, 'plots'))
+os.environ.setdefault('BITFLOW_WARM_MODELS', '')
+os.environ.setdefault('BITFLOW_TRACE_FILE', os.path.join(_tmp_dir, 'traces.jsonl'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bitcoin_prediction.framework import arima_function, prophet_function
+from bitcoin_prediction.market_data import price_store
+
+# Two ranges share a start date, the third starts later
+DATE_RANGES = [('2024-09-01', '2024-09-10'), ('2024-09-01', '2024-09-04'), ('2024-09-05', '2024-09-20')]
+
+
+# ARIMA results stub: the forecast continues from the end of the training
+# data, one step per exogenous row
+class FakeArimaResults:
+    def __init__(self):
+        self.calls = 0
+
+    def get_forecast(self, steps, exog):
+        self.calls += 1
+        predicted_mean = pd.Series(50000.0 + 25.0 * np.arange(steps) + exog['sentiment_scores'].to_numpy(),
+                                   index=exog.index)
+        return type('Forecast', (), {'predicted_mean': predicted_mean})()
+
+
+# Prophet stub: the forecast depends on the date and the regressors
+class FakeProphet:
+    def predict(self, future_df):
+        yhat = (50000.0 + 10.0 * future_df['ds'].dt.dayofyear
+                + 100.0 * future_df['rolling_mean_7'] + future_df['sentiment_scores'])
+        return pd.DataFrame({'ds': future_df['ds'], 'yhat': yhat})
+
+
+@pytest.fixture(scope='module')
+def prices():
+    return price_store.get_prices('2024-09-01', '2024-09-20')
+
+
+def test_arima_batch_matches_single_requests(prices):
+    model = FakeArimaResults()
+    batch = arima_function.predict_batch(DATE_RANGES, prices, {'model': model})
+    assert model.calls == 1
+
+    for (start_date, end_date), result in zip(DATE_RANGES, batch):
+        single = arima_function.predict_prices(start_date, end_date, {'model': FakeArimaResults()})
+        assert result['pred_list'] == single['pred_list']
+        assert result['mae'] == pytest.approx(single['mae'])
+        assert result['mape'] == pytest.approx(single['mape'])
+
+
+def test_prophet_batch_matches_single_requests(prices):
+    model_data = {'model': FakeProphet(), 'feature_scaling': prophet_function.feature_scaling()}
+    batch = prophet_function.predict_batch(DATE_RANGES, prices, model_data)
+
+    for (start_date, end_date), (mae, mape, _, forecast_array) in zip(DATE_RANGES, batch):
+        single_mae, single_mape, _, single_forecast = prophet_function.predict(start_date, end_date, model_data)
+        assert [date for date, _ in forecast_array] == [date for date, _ in single_forecast]
+        np.testing.assert_allclose([price for _, price in forecast_array], [price for _, price in single_forecast])
+        assert mae == pytest.approx(single_mae)
+        assert mape == pytest.approx(single_mape)
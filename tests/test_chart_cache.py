@@ -0,0 +1,49 @@
+import os
+
+import bitcoin_analysis_plot as bap
+
+
+def write_chart(plots_dir, chart_type, index, size=100, last_used=None):
+    file_name = bap.chart_file_name(chart_type, index)
+    path = os.path.join(plots_dir, file_name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if last_used is not None:
+        os.utime(path, (last_used, last_used))
+    return file_name
+
+
+# Two caches over one directory, like two `serve` workers: each one counts
+# and evicts the charts written through the other
+def test_caches_sharing_a_directory_enforce_one_cap(tmp_path):
+    first = bap.ChartCache(str(tmp_path), max_files=3, max_bytes=10_000)
+    second = bap.ChartCache(str(tmp_path), max_files=3, max_bytes=10_000)
+
+    names = []
+    for index, cache in enumerate([first, second, first, second]):
+        names.append(write_chart(tmp_path, 'trend_chart', index, last_used=1000 + index))
+        cache.record(names[-1])
+        assert cache.stats()['files'] <= 3
+
+    assert first.stats() == second.stats()
+    assert first.stats()['files'] == 3
+    assert first.lookup(names[0]) is None
+    # A chart used through one cache is kept when the other one evicts
+    assert second.lookup(names[1]) is not None
+    names.append(write_chart(tmp_path, 'trend_chart', 4))
+    first.record(names[-1])
+    assert sorted(os.listdir(tmp_path)) == sorted([bap.CHART_LOCK_NAME] + names[1:2] + names[3:])
+
+
+def test_byte_cap_and_foreign_files(tmp_path):
+    cache = bap.ChartCache(str(tmp_path), max_files=100, max_bytes=250)
+    (tmp_path / 'logo.png').write_bytes(b'x' * 1000)
+    old = write_chart(tmp_path, 'mape_chart', 0, last_used=1000)
+    cache.record(old)
+    new = write_chart(tmp_path, 'mape_chart', 1, size=200)
+    cache.record(new)
+
+    assert cache.lookup(old) is None
+    assert cache.lookup(new) is not None
+    assert (tmp_path / 'logo.png').exists()
+    assert cache.stats()['bytes'] == 200
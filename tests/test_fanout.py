@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from bitcoin_prediction.serving import fanout
+from bitcoin_prediction.serving.config import ServingConfig
+
+
+def slow_model(model_name, start_date, end_date):
+    time.sleep(0.3)
+    return {'model_name': model_name}
+
+
+# A single worker, so the models of one request queue behind each other
+@pytest.fixture
+def one_worker(monkeypatch):
+    fanout.shutdown()
+    monkeypatch.setitem(ServingConfig.FANOUT_PARAMS, 'max_thread_workers', 1)
+    monkeypatch.setitem(ServingConfig.FANOUT_PARAMS, 'max_queue_seconds', 5)
+    yield
+    fanout.shutdown()
+
+
+def test_queued_model_is_not_timed_out(one_worker):
+    # Each model runs 0.3 s within its 0.5 s deadline, the second one only
+    # finishes 0.6 s after submission
+    results = fanout.run_models(slow_model, ['A', 'B'], 0, 0, timeouts={'A': 0.5, 'B': 0.5})
+    assert results == {'A': {'model_name': 'A'}, 'B': {'model_name': 'B'}}
+
+
+def test_running_model_times_out(one_worker):
+    results = fanout.run_models(slow_model, ['A'], 0, 0, timeouts={'A': 0.1})
+    assert results['A']['error'] == 'A timed out after 0.1 s'
+
+
+def test_queue_wait_is_bounded(one_worker, monkeypatch):
+    monkeypatch.setitem(ServingConfig.FANOUT_PARAMS, 'max_queue_seconds', 0.1)
+    results = fanout.run_models(slow_model, ['A', 'B'], 0, 0, timeouts={'A': 1, 'B': 1})
+    assert results['A'] == {'model_name': 'A'}
+    assert 'waiting 0.1 s for a free worker' in results['B']['error']
@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from bitcoin_prediction.market_data.http_client import HttpClient, UpstreamError
+from bitcoin_prediction.serving import metrics
+
+
+# Local upstream stub: answers with the next (status, headers, delay) of its
+# script, the last one repeats. Records the client port of every request.
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.script = [(200, {}, 0)]
+        self.ports = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/data'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.ports.append(self.client_address[1])
+        status, headers, delay = server.script[min(len(server.ports), len(server.script)) - 1]
+        time.sleep(delay)
+        body = json.dumps({'Response': 'Success', 'attempt': len(server.ports)}).encode()
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # the client gave up on a delayed response
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(**options):
+    settings = dict(connect_timeout=1, read_timeout=1, max_retries=3, backoff_base=0.01, backoff_max=0.05, deadline=5)
+    settings.update(options)
+    return HttpClient('stub', **settings)
+
+
+def retries(reason):
+    return sum(value for _, key, _, value in metrics.upstream_retries.samples() if key == ('stub', reason))
+
+
+def test_retryable_statuses_are_retried(server):
+    server.script = [(503, {}, 0), (502, {}, 0), (200, {}, 0)]
+    before = retries('HTTP 503')
+    assert make_client().get_json(server.url) == {'Response': 'Success', 'attempt': 3}
+    assert len(server.ports) == 3
+    assert retries('HTTP 503') == before + 1
+
+
+def test_other_client_errors_are_not_retried(server):
+    server.script = [(404, {}, 0)]
+    with pytest.raises(requests.HTTPError):
+        make_client().get(server.url)
+    assert len(server.ports) == 1
+
+
+def test_retries_are_bounded(server):
+    server.script = [(500, {}, 0)]
+    with pytest.raises(UpstreamError, match="HTTP 500 after 3 attempts"):
+        make_client(max_retries=2).get(server.url)
+    assert len(server.ports) == 3
+
+
+def test_retry_after_is_honoured(server):
+    server.script = [(429, {'Retry-After': '0.3'}, 0), (200, {}, 0)]
+    started = time.monotonic()
+    make_client(backoff_max=1).get(server.url)
+    assert time.monotonic() - started >= 0.3
+
+
+# A hanging upstream costs at most the deadline, not max_retries read timeouts
+def test_deadline_bounds_a_hanging_upstream(server):
+    server.script = [(200, {}, 2.0)]
+    started = time.monotonic()
+    with pytest.raises(UpstreamError, match="ReadTimeout"):
+        make_client(read_timeout=0.3, max_retries=10, deadline=0.8).get(server.url)
+    assert time.monotonic() - started < 1.5
+
+
+def test_connections_are_kept_alive(server):
+    client = make_client()
+    for _ in range(3):
+        client.get(server.url)
+    assert len(server.ports) == 3
+    assert len(set(server.ports)) == 1
+    client.close()
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bitcoin_prediction.LSTM import LSTM_function
+from bitcoin_prediction.market_data import price_dataset, price_store
+
+
+@pytest.fixture(scope='module')
+def model_data():
+    return LSTM_function.load_model('numpy')
+
+
+def daily_rows(start_date, end_date, volume):
+    dates = pd.date_range(start_date, end_date, name='date')
+    return pd.DataFrame({
+        'date': dates,
+        'Open': np.linspace(60000, 62000, len(dates)),
+        'Volume': np.full(len(dates), volume),
+        'Close': np.linspace(60100, 62100, len(dates))
+    })
+
+
+def test_bundled_days_use_the_training_volume(model_data):
+    # A realistic CryptoCompare daily volume must not reach the model as is
+    df = daily_rows('2024-06-01', '2024-06-30', 20000.0)
+    X = LSTM_function.normalize_features(df, model_data)
+    bundled = price_dataset.load().column('Volume', '2024-06-01', '2024-06-30')
+    expected = model_data['scaler_X'].transform(pd.DataFrame({
+        'Open': df['Open'], 'Volume': bundled, 'sentiment_scores': 0.0, 'is_real_sentiment': False
+    }))[:, 1]
+    np.testing.assert_allclose(X[:, 1], expected, rtol=1e-5, atol=1e-7)
+
+
+def test_days_after_the_history_get_the_volume_per_minute(model_data):
+    df = daily_rows('2024-11-01', '2024-11-30', 20000.0)
+    X = LSTM_function.normalize_features(df, model_data)
+    scaler = model_data['scaler_X']
+    expected = (20000.0 / price_dataset.MINUTES_PER_DAY - scaler.data_min_[1]) / scaler.data_range_[1]
+    np.testing.assert_allclose(X[:, 1], expected, rtol=1e-5)
+    assert (X >= -LSTM_function.MAX_SCALED_DEVIATION).all()
+    assert (X <= 1 + LSTM_function.MAX_SCALED_DEVIATION).all()
+
+
+# The sentiment inputs are the daily sentiment of the price store, flagged
+# real on the days with scored tweets
+def test_sentiment_comes_from_the_price_store(model_data, monkeypatch):
+    df = daily_rows('2024-06-01', '2024-06-03', 20000.0)
+    sentiment = pd.DataFrame({'sentiment_scores': [0.1, 0.2, 0.3], 'tweet_count': [5, 0, 2]},
+                             index=pd.date_range('2024-06-01', '2024-06-03', name='date'))
+    monkeypatch.setattr(price_store, 'get_sentiment', lambda start_date, end_date: sentiment)
+    X = LSTM_function.normalize_features(df, model_data)
+    expected = model_data['scaler_X'].transform(pd.DataFrame({
+        'Open': df['Open'], 'Volume': 0.0, 'sentiment_scores': sentiment['sentiment_scores'].to_numpy(),
+        'is_real_sentiment': [True, False, True]
+    }))[:, 2:]
+    np.testing.assert_allclose(X[:, 2:], expected, rtol=1e-5, atol=1e-7)
+
+
+def test_inputs_far_outside_the_scaler_range_are_rejected(model_data):
+    scaled = np.zeros((3, len(LSTM_function.FEATURES)), dtype=np.float32)
+    scaled[1, 1] = 18.3  # a daily volume of 20000 BTC scaled without conversion
+    with pytest.raises(ValueError, match="Volume"):
+        LSTM_function.check_scaled_range(scaled)
+    LSTM_function.check_scaled_range(np.full((3, 4), 1.4, dtype=np.float32))
+
+
+def test_sequences_are_windows_of_the_scaled_rows(model_data):
+    history = price_store.get_prices('2024-05-01', '2024-07-31').rename(columns={
+        'open': 'Open', 'close': 'Close', 'volumefrom': 'Volume'
+    }).reset_index()
+    X_seq, y_actual = LSTM_function.prepare_sequences(history, model_data)
+    X = LSTM_function.normalize_features(history, model_data)
+    steps = LSTM_function.TIME_STEPS
+    assert X_seq.shape == (len(history) - steps, steps, len(LSTM_function.FEATURES))
+    reference = np.array([X[i:i + steps] for i in range(len(X) - steps)])
+    np.testing.assert_array_equal(X_seq, reference)
+    np.testing.assert_array_equal(y_actual, history['Close'].to_numpy()[steps:])
@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bitcoin_prediction.serving import metrics
+
+
+@pytest.fixture
+def multiprocess(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, '_multiprocess_dir', str(tmp_path))
+    yield tmp_path
+    metrics.clear()
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+# Snapshot of another process with one request, one 0.2 s latency sample and
+# one request in flight
+def write_other_snapshot(directory, pid):
+    snapshot = {
+        'bitflow_requests': [[['/predict', 'GET', '200'], 1]],
+        'bitflow_requests_in_flight': [[['/predict'], 1]],
+        'bitflow_request_duration_seconds': [[['/predict'], {
+            'counts': [1 if bound == 0.25 else 0 for bound in metrics.request_seconds.buckets],
+            'sum': 0.2, 'count': 1
+        }]]
+    }
+    with open(os.path.join(directory, f"{pid}.json"), 'w') as f:
+        json.dump(snapshot, f)
+
+
+def record_request():
+    metrics.clear()
+    metrics.http_requests.inc(endpoint='/predict', method='GET', status=200)
+    metrics.requests_in_flight.inc(endpoint='/predict')
+    metrics.request_seconds.observe(0.02, endpoint='/predict')
+
+
+def test_render_merges_the_snapshots_of_all_processes(multiprocess):
+    record_request()
+    write_other_snapshot(multiprocess, os.getppid())
+    text = metrics.render()
+
+    assert 'bitflow_requests_total{endpoint="/predict",method="GET",status="200"} 2' in text
+    assert 'bitflow_requests_in_flight{endpoint="/predict"} 2' in text
+    assert 'bitflow_request_duration_seconds_count{endpoint="/predict"} 2' in text
+    assert 'bitflow_request_duration_seconds_bucket{endpoint="/predict",le="0.025"} 1' in text
+    assert 'bitflow_request_duration_seconds_bucket{endpoint="/predict",le="0.25"} 2' in text
+    assert (multiprocess / f"{os.getpid()}.json").exists()
+
+
+# An exited worker still counts in the totals, not in the gauges
+def test_exited_processes_keep_counters_but_not_gauges(multiprocess):
+    record_request()
+    write_other_snapshot(multiprocess, exited_pid())
+    text = metrics.render()
+
+    assert 'bitflow_requests_total{endpoint="/predict",method="GET",status="200"} 2' in text
+    assert 'bitflow_requests_in_flight{endpoint="/predict"} 1' in text
+
+
+def test_single_process_renders_its_own_metrics():
+    record_request()
+    assert 'bitflow_requests_in_flight{endpoint="/predict"} 1' in metrics.render()
+    metrics.clear()
@@ -0,0 +1,73 @@
+import threading
+import time
+import types
+
+import pytest
+
+import predict_plot_API as api
+from bitcoin_prediction.serving import model_registry
+
+
+# Model module stub counting its loads, load_model fails while `error` is set
+class FakeModule:
+    def __init__(self):
+        self.loads = 0
+        self.error = None
+
+    def load_model(self):
+        time.sleep(0.05)
+        self.loads += 1
+        if self.error:
+            raise FileNotFoundError(self.error)
+        return {'model': object(), 'scaler': object()}
+
+
+@pytest.fixture
+def fake_module(monkeypatch):
+    fake = FakeModule()
+    monkeypatch.setattr(model_registry, 'module', lambda model_name: types.SimpleNamespace(load_model=fake.load_model))
+    model_registry.clear()
+    yield fake
+    model_registry.clear()
+
+
+def test_concurrent_gets_share_one_load(fake_module):
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(model_registry.get('ARIMA'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake_module.loads == 1
+    assert all(handle is handles[0] for handle in handles)
+    assert model_registry.get('ARIMA') is handles[0]
+    assert 'ARIMA' in model_registry.load_times()
+
+
+def test_shared_artifacts_are_read_only(fake_module):
+    with pytest.raises(TypeError):
+        model_registry.get('XGBoost')['model'] = None
+
+
+# A failed load is reported by /models and retried on the next use
+def test_failed_load_is_reported_and_retried(fake_module):
+    fake_module.error = 'arima_model.pkl not found'
+    with pytest.raises(FileNotFoundError):
+        model_registry.get('ARIMA')
+    assert model_registry.load_all(['ARIMA']) == {}
+
+    response = api.app.test_client().get('/models')
+    assert response.status_code == 200
+    assert response.get_json()['ARIMA'] == {'loaded': False, 'load_time': None, 'error': 'arima_model.pkl not found'}
+
+    fake_module.error = None
+    model_registry.get('ARIMA')
+    assert fake_module.loads == 3
+    status = api.app.test_client().get('/models').get_json()['ARIMA']
+    assert status['loaded'] and status['error'] is None
+
+
+def test_unknown_model_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported model name"):
+        model_registry.get('GPT')
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from bitcoin_prediction.LSTM import numpy_lstm
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+# Float64 Keras LSTM cell, one window and one step at a time
+def reference_predict(weights, X):
+    outputs = []
+    for window in np.asarray(X, dtype=np.float64):
+        sequence = window
+        layer = 0
+        while f"lstm{layer}_kernel" in weights:
+            kernel, recurrent_kernel, bias = (
+                weights[f"lstm{layer}_{name}"].astype(np.float64) for name in ('kernel', 'recurrent_kernel', 'bias')
+            )
+            units = recurrent_kernel.shape[0]
+            h, c = np.zeros(units), np.zeros(units)
+            states = []
+            for x in sequence:
+                z = x @ kernel + h @ recurrent_kernel + bias
+                i, f, g, o = z[:units], z[units:2 * units], z[2 * units:3 * units], z[3 * units:]
+                c = sigmoid(f) * c + sigmoid(i) * np.tanh(g)
+                h = sigmoid(o) * np.tanh(c)
+                states.append(h)
+            sequence = np.array(states)
+            layer += 1
+        outputs.append(sequence[-1] @ weights['dense_kernel'] + weights['dense_bias'])
+    return np.array(outputs)
+
+
+@pytest.fixture(scope='module')
+def weights():
+    with np.load(numpy_lstm.WEIGHTS_PATH) as data:
+        return dict(data)
+
+
+def test_predict_matches_the_reference_cell(weights):
+    model = numpy_lstm.NumpyLSTM()
+    steps, features = 30, weights['lstm0_kernel'].shape[0]
+    X = np.random.default_rng(0).uniform(0, 1, (5, steps, features))
+
+    predictions = model.predict(X)
+    assert predictions.shape == (5, 1)
+    assert predictions.dtype == np.float32
+    np.testing.assert_allclose(predictions, reference_predict(weights, X), atol=1e-5)
+
+
+def test_export_reproduces_the_saved_weights(weights, tmp_path):
+    pytest.importorskip('h5py')
+    output = tmp_path / 'weights.npz'
+    numpy_lstm.export(output=str(output))
+    with np.load(output) as exported:
+        assert set(exported) == set(weights)
+        for name in weights:
+            np.testing.assert_array_equal(exported[name], weights[name])
+
+
+def test_missing_weights_name_the_export_command(tmp_path):
+    with pytest.raises(FileNotFoundError, match='numpy_lstm'):
+        numpy_lstm.NumpyLSTM(str(tmp_path / 'missing.npz'))
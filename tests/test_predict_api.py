@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+import predict_plot_API as api
+from bitcoin_prediction.serving import response_format
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FRAMEWORKS = ['xgboost', 'statsmodels', 'tensorflow', 'prophet']
+
+# Import the API in a fresh interpreter, serve one XGBoost prediction and
+# report which frameworks got imported before and after it
+LAZY_IMPORTS = '''
+import json, sys
+import predict_plot_API as api
+
+frameworks = %r
+imported = lambda: [name for name in frameworks if name in sys.modules]
+at_import = imported()
+response = api.app.test_client().get('/predict?model=XGBoost&startDate=1725148800&endDate=1725321600')
+print(json.dumps({'at_import': at_import, 'status': response.status_code, 'after_predict': imported(),
+                  'body': response.get_json()}))
+''' % FRAMEWORKS
+
+
+def test_frameworks_are_imported_on_first_use():
+    output = subprocess.run([sys.executable, '-c', LAZY_IMPORTS], cwd=PROJECT_ROOT, env=os.environ.copy(),
+                            capture_output=True, text=True, timeout=120, check=True).stdout
+    report = json.loads(output.strip().splitlines()[-1])
+    assert report['at_import'] == []
+    assert report['status'] == 200, report['body']
+    assert report['after_predict'] == ['xgboost']
+    assert report['body']['model_name'] == 'XGBoost'
+    assert [entry['date'] for entry in report['body']['pred_list']] == ['2024-09-01', '2024-09-02', '2024-09-03']
+
+
+def fake_predict_model(model_name, start_date, end_date):
+    return response_format.columnar_result(model_name, 12, 150.0, 0.26, [start_date], [57100.0])
+
+
+def test_model_argument_runs_only_that_model(monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, 'predict_model', lambda *args: calls.append(args) or fake_predict_model(*args))
+    response = api.app.test_client().get('/predict?model=ARIMA&startDate=1725148800&endDate=1725235200&noCache=1')
+    assert response.status_code == 200
+    assert calls == [('ARIMA', '2024-09-01', '2024-09-02')]
+    # The body depends on the negotiated format, so shared caches must key on Accept
+    assert 'Accept' in response.headers['Vary']
+    assert response.get_json() == {
+        'model_name': 'ARIMA', 'runtime': 12, 'mae': '150.00', 'mape': '0.26',
+        'pred_list': [{'date': '2024-09-01', 'price': '57100.00'}]
+    }
+
+
+def test_unknown_model_is_400():
+    response = api.app.test_client().get('/predict?model=GPT&startDate=1725148800&endDate=1725235200')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unsupported model name: GPT'
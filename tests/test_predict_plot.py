@@ -0,0 +1,104 @@
+import os
+import time
+
+import pytest
+
+import bitcoin_analysis_plot as bap
+import predict_plot_API as api
+from bitcoin_prediction.serving import response_format
+
+DATES = ['2024-09-01', '2024-09-02', '2024-09-03']
+ACTUAL = {'2024-09-01': 57300.0, '2024-09-02': 59100.0, '2024-09-03': 57500.0}
+
+
+def fake_predict_model(model_name, start_date, end_date):
+    return response_format.columnar_result(model_name, 12, 150.0, 0.26, DATES, [57100.0, 58800.0, 57900.0])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, 'predict_model', fake_predict_model)
+    monkeypatch.setattr(api.ServingConfig, 'MODELS', ['XGBoost', 'ARIMA'])
+    monkeypatch.setattr(bap, 'fetch_actual_prices', lambda start_date, end_date: ACTUAL)
+    yield api.app.test_client()
+    bap.shutdown_chart_pool()
+
+
+def test_predict_plot_renders_charts(client):
+    response = client.get('/predict_plot?startDate=1725148800&endDate=1725321600&noCache=1')
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert set(body['results']) == {'XGBoost', 'ARIMA'}
+    for chart in ('priceChart', 'MAEChart', 'RuntimeChart', 'MAPEChart'):
+        assert os.path.exists(body[chart])
+        assert os.path.dirname(body[chart]) == os.path.normpath(bap.PLOTS_DIR)
+
+
+def test_serve_master_preloads_lstm_only_with_numpy_engine(monkeypatch):
+    from bitcoin_prediction.LSTM import LSTM_function
+    models = ['XGBoost', 'LSTM', 'ARIMA']
+    monkeypatch.setattr(LSTM_function, 'LSTM_ENGINE', 'keras')
+    assert api.fork_safe_models(models) == ['XGBoost', 'ARIMA']
+    monkeypatch.setattr(LSTM_function, 'LSTM_ENGINE', 'numpy')
+    assert api.fork_safe_models(models) == models
+
+
+def wait_for_chart_job(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f'/chart_jobs/{job_id}').get_json()
+        if status['status'] != 'pending':
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"chart job {job_id} still pending")
+
+
+# ?asyncCharts=1 returns one job per chart, rendered in the chart pool
+def test_async_charts_are_polled_by_job_id(client, monkeypatch):
+    monkeypatch.setattr(bap, 'fetch_actual_prices', lambda start_date, end_date: {
+        date: price + 1.0 for date, price in ACTUAL.items()
+    })
+    response = client.get('/predict_plot?startDate=1725148800&endDate=1725321600&noCache=1&asyncCharts=1')
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert set(body['results']) == {'XGBoost', 'ARIMA'}
+    assert set(body['chartJobs']) == {'priceChart', 'MAEChart', 'RuntimeChart', 'MAPEChart'}
+
+    for job_id in body['chartJobs'].values():
+        status = wait_for_chart_job(client, job_id)
+        assert status['status'] == 'done', status
+        with open(status['path'], 'rb') as file:
+            assert file.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_unknown_chart_job_is_404(client):
+    response = client.get('/chart_jobs/0123456789abcdef')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Unknown chart job'}
+
+
+# The chart data shares one date axis, a date a series lacks is null
+def test_chart_data_is_columnar(client, monkeypatch):
+    monkeypatch.setattr(bap, 'fetch_actual_prices', lambda start_date, end_date: {
+        date: price for date, price in ACTUAL.items() if date != '2024-09-02'
+    })
+    monkeypatch.setattr(bap, 'render_charts', lambda *args: pytest.fail("no chart without ?png=1"))
+    response = client.get('/predict_chart_data?startDate=1725148800&endDate=1725321600&noCache=1')
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json() == {
+        'dates': DATES,
+        'trend': {
+            'XGBoost': [57100.0, 58800.0, 57900.0],
+            'ARIMA': [57100.0, 58800.0, 57900.0],
+            'Actual': [57300.0, None, 57500.0]
+        },
+        'mae': {'algorithms': ['XGBoost', 'ARIMA'], 'values': [150.0, 150.0]},
+        'runtime': {'algorithms': ['XGBoost', 'ARIMA'], 'values': [12.0, 12.0]},
+        'mape': {'algorithms': ['XGBoost', 'ARIMA'], 'values': [0.26, 0.26]}
+    }
+
+
+def test_chart_data_renders_charts_on_request(client, monkeypatch):
+    monkeypatch.setattr(bap, 'render_charts', lambda *args: {'priceChart': 'trend.png'})
+    response = client.get('/predict_chart_data?startDate=1725148800&endDate=1725321600&noCache=1&png=1')
+    assert response.get_json()['charts'] == {'priceChart': 'trend.png'}
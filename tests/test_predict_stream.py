@@ -0,0 +1,88 @@
+import json
+import time
+
+import pytest
+
+import predict_plot_API as api
+from bitcoin_prediction.serving import metrics
+
+MODEL_SECONDS = 0.2
+
+
+def fake_arima(start_date, end_date, model_data=None):
+    time.sleep(MODEL_SECONDS)
+    return {'runtime': 200, 'mae': 1.0, 'mape': 0.1, 'pred_list': [('2024-09-01', 57000.0)]}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(api.model_registry, 'get', lambda model_name: None)
+    monkeypatch.setattr(api, 'arima_predict_prices', fake_arima)
+    monkeypatch.setattr(api.ServingConfig, 'MODELS', ['ARIMA'])
+    monkeypatch.setitem(api.ServingConfig.TRACE_PARAMS, 'sample_rate', 1.0)
+    monkeypatch.setitem(api.ServingConfig.TRACE_PARAMS, 'path', str(tmp_path / 'traces.jsonl'))
+    metrics.request_seconds.clear()
+    return api.app.test_client()
+
+
+def request_seconds(endpoint):
+    return {
+        name: value for name, key, _, value in metrics.request_seconds.samples()
+        if key == (endpoint,) and not name.endswith('_bucket')
+    }
+
+
+# The request trace and duration end when the streamed response is closed, so
+# they include the models that ran while streaming
+def test_stream_trace_contains_the_model_spans(client, tmp_path):
+    # Like a WSGI server, the test client ends the response when it is closed
+    with client.get('/predict_stream?startDate=1725148800&endDate=1725148800&noCache=1') as response:
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['type'] for record in records] == ['result', 'summary']
+
+    spans = [json.loads(line) for line in (tmp_path / 'traces.jsonl').read_text().splitlines()]
+    spans = [span for span in spans if span['trace_id'] == response.headers['X-Trace-Id']]
+    root = next(span for span in spans if span['parent_id'] is None)
+    model_span = next(span for span in spans if span['name'] == 'predict_model')
+    assert model_span['attributes']['model'] == 'ARIMA'
+    assert model_span['parent_id'] == root['span_id']
+    assert root['duration_ms'] >= MODEL_SECONDS * 1000
+
+    observed = request_seconds('/predict_stream')
+    assert observed['bitflow_request_duration_seconds_count'] == 1
+    assert observed['bitflow_request_duration_seconds_sum'] >= MODEL_SECONDS
+
+
+def staggered_model(model_name, start_date, end_date):
+    if model_name == 'LSTM':
+        raise RuntimeError('no weights')
+    time.sleep({'XGBoost': 0.3, 'ARIMA': 0.0}[model_name])
+    return api.response_format.columnar_result(model_name, 12, 150.0, 0.26, ['2024-09-01'], [57100.0])
+
+
+# One record per model as it finishes, then the summary
+def test_records_arrive_in_completion_order(monkeypatch):
+    monkeypatch.setattr(api, 'predict_model', staggered_model)
+    monkeypatch.setattr(api.ServingConfig, 'MODELS', ['XGBoost', 'ARIMA', 'LSTM'])
+    with api.app.test_client().get('/predict_stream?startDate=1725148800&endDate=1725148800&noCache=1') as response:
+        assert response.mimetype == 'application/x-ndjson'
+        assert response.headers['X-Accel-Buffering'] == 'no'
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    results = {record['model_name']: record['result'] for record in records if record['type'] == 'result'}
+    order = [record['model_name'] for record in records if record['type'] == 'result']
+    assert order.index('ARIMA') < order.index('XGBoost')
+    assert results['XGBoost']['pred_list'] == [{'date': '2024-09-01', 'price': '57100.00'}]
+    assert 'no weights' in results['LSTM']['error']
+
+    summary = records[-1]
+    assert summary['type'] == 'summary'
+    assert summary['models'] == order
+    assert summary['errors'] == ['LSTM']
+    assert summary['elapsed'] >= 300
+
+
+def test_missing_dates_are_rejected():
+    response = api.app.test_client().get('/predict_stream?startDate=1725148800')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'startDate and endDate are required'
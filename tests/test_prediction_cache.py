@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from bitcoin_prediction.serving import prediction_cache
+from bitcoin_prediction.serving.prediction_cache import PredictionCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def key(start_date, end_date='2024-01-31'):
+    return ('XGBoost', start_date, end_date)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = PredictionCache(max_entries=2, ttl=60, today_ttl=10)
+    cache.put(key('2024-01-01'), {'a': 1})
+    cache.put(key('2024-01-02'), {'b': 2})
+    assert cache.get(key('2024-01-01')) == {'a': 1}
+    cache.put(key('2024-01-03'), {'c': 3})
+
+    assert cache.get(key('2024-01-02')) is None
+    assert cache.get(key('2024-01-01')) == {'a': 1}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = PredictionCache(max_entries=10, ttl=60, today_ttl=10)
+    today = datetime.now(timezone.utc).date().isoformat()
+    cache.put(key('2024-01-01'), {'past': 1})
+    cache.put(key('2024-01-01', today), {'today': 1})
+
+    clock[0] += 30
+    assert cache.get(key('2024-01-01', today)) is None
+    assert cache.get(key('2024-01-01')) == {'past': 1}
+    clock[0] += 31
+    assert cache.get(key('2024-01-01')) is None
+    assert cache.stats()['expirations'] == 2
+
+
+# Request dates are UTC, so a range ending on the UTC date is "today" even
+# where the local date is already the next day or still the previous one
+def test_today_is_the_utc_date(monkeypatch):
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2024, 6, 1, 23, 30, tzinfo=timezone.utc).astimezone(tz)
+    monkeypatch.setattr(prediction_cache, 'datetime', FixedDatetime)
+    cache = PredictionCache(max_entries=10, ttl=60, today_ttl=10)
+    assert cache.entry_ttl('2024-06-01') == 10
+    assert cache.entry_ttl('2024-06-02') == 10
+    assert cache.entry_ttl('2024-05-31') == 60
+
+
+def test_errors_are_not_cached():
+    calls = []
+
+    def failing(model_name, start_date, end_date):
+        calls.append(model_name)
+        return {'model_name': model_name, 'error': 'boom'}
+    prediction_cache.clear()
+    for _ in range(2):
+        prediction_cache.get_or_compute(failing, 'ARIMA', '2024-01-01', '2024-01-02')
+    assert len(calls) == 2
@@ -0,0 +1,118 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="pre-forking needs a POSIX platform")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Master process of the smoke test: every worker records its PID in a file
+# of the state directory, the reload step records the SIGHUP
+MASTER = '''
+import os, sys, time
+from bitcoin_prediction.serving import prefork
+
+port, state = int(sys.argv[1]), sys.argv[2]
+
+def app(environ, start_response):
+    if environ['PATH_INFO'] == '/slow':
+        time.sleep(1.0)
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode()]
+
+def worker_init():
+    open(os.path.join(state, 'worker-%d' % os.getpid()), 'w').close()
+
+def reload():
+    open(os.path.join(state, 'reloaded'), 'w').close()
+
+prefork.serve(app, '127.0.0.1', port, workers=2, threads=2, graceful_timeout=10,
+              reload=reload, worker_init=worker_init)
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.1)
+    raise AssertionError("timed out")
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def started_workers(state):
+    return {int(name.split('-')[1]) for name in os.listdir(state) if name.startswith('worker-')}
+
+
+def live_workers(state):
+    return {pid for pid in started_workers(state) if alive(pid)}
+
+
+def get(port, path='/'):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=10) as response:
+        return response.status, int(response.read())
+
+
+@pytest.fixture
+def master(tmp_path):
+    port = free_port()
+    state = tmp_path / 'state'
+    state.mkdir()
+    process = subprocess.Popen([sys.executable, '-c', MASTER, str(port), str(state)], cwd=PROJECT_ROOT)
+    yield process, port, str(state)
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def test_workers_are_replaced_restarted_and_stopped_gracefully(master):
+    process, port, state = master
+    first = wait_for(lambda: len(live_workers(state)) == 2 and live_workers(state))
+    status, pid = wait_for(lambda: get(port))
+    assert status == 200 and pid in first
+
+    # A worker that dies is replaced
+    victim = min(first)
+    os.kill(victim, signal.SIGKILL)
+    wait_for(lambda: victim not in live_workers(state) and len(live_workers(state)) == 2)
+    second = live_workers(state)
+    assert len(second - first) == 1
+
+    # SIGHUP reloads, forks a new generation and retires the old workers
+    process.send_signal(signal.SIGHUP)
+    wait_for(lambda: os.path.exists(os.path.join(state, 'reloaded')))
+    third = wait_for(lambda: len(live_workers(state)) == 2 and not live_workers(state) & second and live_workers(state))
+    assert get(port)[1] in third
+
+    # SIGTERM lets the in-flight request finish before the master exits
+    responses = []
+    slow = threading.Thread(target=lambda: responses.append(get(port, '/slow')))
+    slow.start()
+    time.sleep(0.3)
+    process.send_signal(signal.SIGTERM)
+    slow.join(10)
+    assert responses and responses[0][0] == 200
+    assert process.wait(15) == 0
+    assert not live_workers(state)
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from bitcoin_prediction.market_data import price_dataset
+
+
+def write_csv(path, closes):
+    dates = pd.date_range('2024-01-01', periods=len(closes))
+    pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'), 'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+        'Volume': 1.0, 'sentiment_scores': 0.1
+    }).to_csv(path, index=False)
+
+
+def test_dataset_is_rebuilt_when_the_csv_changes(tmp_path):
+    source, path = str(tmp_path / 'history.csv'), str(tmp_path / 'columns')
+    write_csv(source, [1.0, 2.0, 3.0])
+    assert list(price_dataset.load(source, path).column('Close')) == [1.0, 2.0, 3.0]
+
+    # A second process finds the dataset up to date and does not rebuild it
+    price_dataset.clear()
+    built_at = os.stat(os.path.join(path, 'Close.npy')).st_mtime_ns
+    price_dataset.load(source, path)
+    assert os.stat(os.path.join(path, 'Close.npy')).st_mtime_ns == built_at
+
+    price_dataset.clear()
+    write_csv(source, [1.0, 2.0, 3.0, 4.0])
+    assert list(price_dataset.load(source, path).column('Close')) == [1.0, 2.0, 3.0, 4.0]
+    price_dataset.clear()
+
+
+def test_rows_are_dense_by_day(tmp_path):
+    source, path = str(tmp_path / 'history.csv'), str(tmp_path / 'columns')
+    write_csv(source, [1.0, 2.0, 3.0])
+    frame = pd.read_csv(source)
+    frame.drop(index=1).to_csv(source, index=False)
+    price_dataset.build(source, path)
+    dataset = price_dataset.PriceDataset(path)
+    assert len(dataset) == 3
+    assert np.isnan(dataset.column('Close', '2024-01-02', '2024-01-02')[0])
+    assert list(dataset.dates()) == list(pd.date_range('2024-01-01', periods=3))
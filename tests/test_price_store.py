@@ -0,0 +1,182 @@
+import threading
+import time
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+from bitcoin_prediction.market_data import price_dataset
+from bitcoin_prediction.market_data.price_store import MIN_VOLUME_OVERLAP_DAYS, PRICE_COLUMNS, PriceStore, PricesUnavailable
+from bitcoin_prediction.serving import metrics
+
+
+def coalesced_syncs():
+    return sum(value for _, key, _, value in metrics.coalesced_calls.samples() if key == ('price_sync',))
+
+
+# histoday stub: a row per day up to params['toTs'], closes equal to the day number
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def get_json(self, url, params):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        last = params['toTs'] // 86400
+        rows = [
+            {'time': day * 86400, 'open': day, 'high': day, 'low': day, 'close': day,
+             'volumefrom': 1.0, 'volumeto': float(day)}
+            for day in range(last - params['limit'], last + 1)
+        ]
+        return {'Response': 'Success', 'Data': {'Data': rows}}
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def store(tmp_path, client):
+    return PriceStore(str(tmp_path / 'prices.sqlite'), 'http://stub', client=client, mode='online')
+
+
+def test_stored_days_are_served_during_a_sync(store, client):
+    store.get_prices('2024-01-01', '2024-01-10')
+    client.release.clear()
+    syncing = threading.Thread(target=store.get_prices, args=('2024-03-01', '2024-03-10'))
+    syncing.start()
+    assert client.started.wait(5)
+
+    # The sync waits on the upstream call, the stored range does not
+    prices = store.get_prices('2024-01-02', '2024-01-05')
+    assert syncing.is_alive()
+    assert list(prices.index) == list(pd.date_range('2024-01-02', '2024-01-05'))
+
+    client.release.set()
+    syncing.join(5)
+
+
+def test_concurrent_requests_share_one_sync(store, client):
+    store.load()
+    client.release.clear()
+    coalesced_before = coalesced_syncs()
+    results = [None] * 3
+
+    def call(index):
+        results[index] = store.get_prices('2024-03-01', '2024-03-10')
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    assert client.started.wait(5)
+    while coalesced_syncs() < coalesced_before + 2:
+        time.sleep(0.01)
+    client.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert client.calls == 1
+    for prices in results:
+        assert list(prices.index) == list(pd.date_range('2024-03-01', '2024-03-10'))
+
+
+def test_sync_keeps_the_hot_copy_equal_to_the_store(store, tmp_path):
+    store.get_prices('2024-03-01', '2024-03-10')
+    store.get_prices('2024-01-01', '2024-01-10')
+    store.get_prices('2024-04-01', '2024-04-03')
+    synced = store._frame
+
+    with closing(store._connect()) as conn:
+        store._read(conn)
+    pd.testing.assert_frame_equal(synced, store._frame)
+    assert store._covered == (pd.Timestamp('2024-01-01'), pd.Timestamp('2024-04-03'))
+
+
+# histoday stub whose daily volume is `factor` times the bundled Volume
+class DailyVolumeClient:
+    def __init__(self, factor):
+        self.factor = factor
+
+    def get_json(self, url, params):
+        dataset = price_dataset.load()
+        first = pd.to_datetime(params['toTs'] - params['limit'] * 86400, unit='s')
+        last = pd.to_datetime(params['toTs'], unit='s')
+        rows = [
+            {'time': int(date.timestamp()), 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0,
+             'volumefrom': volume * self.factor, 'volumeto': 1.0}
+            for date, volume in zip(dataset.dates(first, last), dataset.column('Volume', first, last))
+        ]
+        return {'Response': 'Success', 'Data': {'Data': rows}}
+
+
+# The volume scale is fitted on the days both in the bundled history and in the store
+def test_volume_scale_is_fitted_on_the_overlapping_days(tmp_path):
+    store = PriceStore(str(tmp_path / 'prices.sqlite'), 'http://stub', client=DailyVolumeClient(900.0), mode='online')
+    assert store.volume_scale() == pytest.approx(1 / price_dataset.MINUTES_PER_DAY)
+
+    # Too few overlapping days keep the even spread over the day
+    first = pd.Timestamp('2024-05-01')
+    store.get_prices(first, first + pd.Timedelta(days=MIN_VOLUME_OVERLAP_DAYS - 2))
+    assert store.volume_scale() == pytest.approx(1 / price_dataset.MINUTES_PER_DAY)
+
+    store.get_prices('2024-05-01', '2024-06-30')
+    assert store.volume_scale() == pytest.approx(1 / 900.0)
+    dates = pd.DatetimeIndex([price_dataset.load().last_date + pd.Timedelta(days=1)])
+    assert price_dataset.training_volume(dates, [18000.0], store.volume_scale())[0] == pytest.approx(20.0)
+
+
+@pytest.mark.parametrize('mode', ['online', 'hybrid', 'offline'])
+def test_reversed_range_is_empty(tmp_path, client, mode):
+    store = PriceStore(str(tmp_path / 'prices.sqlite'), 'http://stub', client=client, mode=mode)
+    prices = store.get_prices('2024-06-10', '2024-06-01')
+    assert prices.empty
+    assert list(prices.columns) == PRICE_COLUMNS
+    assert client.calls == 0
+
+
+# Offline, the bundled history is served without a fetch and later days must
+# already be stored
+def test_offline_store_serves_history_and_stored_days_only(tmp_path, client):
+    path = str(tmp_path / 'prices.sqlite')
+    offline = PriceStore(path, 'http://stub', client=client, mode='offline')
+    last_date = price_dataset.load().last_date
+
+    prices = offline.get_prices(last_date - pd.Timedelta(days=4), last_date)
+    assert len(prices) == 5
+    assert list(prices['close']) == list(price_dataset.load().column('Close', last_date - pd.Timedelta(days=4), last_date))
+
+    later = (last_date + pd.Timedelta(days=1), last_date + pd.Timedelta(days=3))
+    with pytest.raises(PricesUnavailable, match=f"from {later[0].date()} to {later[1].date()}"):
+        offline.get_prices(last_date, later[1])
+    assert client.calls == 0
+
+    # Days stored by an online process are served offline
+    PriceStore(path, 'http://stub', client=client, mode='online').get_prices(*later)
+    offline.clear()
+    prices = offline.get_prices(last_date, later[1])
+    assert list(prices.index) == list(pd.date_range(last_date, later[1]))
+
+
+# Hybrid only fetches the days after the bundled history
+def test_hybrid_store_fetches_after_the_history(tmp_path, client):
+    store = PriceStore(str(tmp_path / 'prices.sqlite'), 'http://stub', client=client, mode='hybrid')
+    last_date = price_dataset.load().last_date
+    prices = store.get_prices(last_date - pd.Timedelta(days=2), last_date + pd.Timedelta(days=2))
+
+    assert list(prices.index) == list(pd.date_range(last_date - pd.Timedelta(days=2), last_date + pd.Timedelta(days=2)))
+    assert prices.loc[last_date, 'close'] == price_dataset.load().column('Close', last_date, last_date)[0]
+    # The stub's close is the day number
+    assert prices['close'].iloc[-1] == int((last_date + pd.Timedelta(days=2)).timestamp()) // 86400
+    assert client.calls == 1
+
+    store.get_prices(last_date - pd.Timedelta(days=30), last_date)
+    assert client.calls == 1
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported price mode"):
+        PriceStore(str(tmp_path / 'prices.sqlite'), 'http://stub', mode='cached')
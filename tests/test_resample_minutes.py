@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bitcoin_prediction.market_data import resample_minutes
+
+START = 1717200000  # 2024-06-01 00:00 UTC
+
+
+def minute_frame(minutes, start=START, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 67000 + rng.normal(0, 20, minutes).cumsum()
+    frame = pd.DataFrame({
+        'Timestamp': start + 60 * np.arange(minutes),
+        'Open': close + rng.normal(0, 5, minutes),
+        'High': close + 10,
+        'Low': close - 10,
+        'Close': close,
+        'Volume': rng.uniform(0, 3, minutes)
+    })
+    # Minutes without trades are skipped
+    frame.loc[rng.choice(minutes, minutes // 50, replace=False), 'Close'] = np.nan
+    return frame
+
+
+def pandas_bars(frame, rule, date_format):
+    frame = frame.dropna(subset=['Close'])
+    bars = frame.set_index(pd.to_datetime(frame['Timestamp'], unit='s')).resample(rule).agg(
+        {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+    ).dropna(subset=['Close'])
+    bars.index = bars.index.strftime(date_format)
+    return bars.rename_axis('date').reset_index()
+
+
+def read_bars(path):
+    return pd.read_csv(path, dtype={'date': str})
+
+
+@pytest.mark.parametrize('chunk_rows', [997, 100_000])
+def test_bars_match_pandas_resample(tmp_path, chunk_rows):
+    frame = minute_frame(3 * 1440 + 500)
+    source = tmp_path / 'minutes.csv'
+    frame.to_csv(source, index=False)
+
+    resample_minutes.resample(str(source), str(tmp_path), chunk_rows=chunk_rows)
+    pd.testing.assert_frame_equal(read_bars(tmp_path / 'btc_usd_1d.csv'), pandas_bars(frame, '1D', '%Y-%m-%d'))
+    pd.testing.assert_frame_equal(read_bars(tmp_path / 'btc_usd_1h.csv'),
+                                  pandas_bars(frame, '1h', '%Y-%m-%d %H:%M:%S'))
+
+
+# A rerun after minutes were appended replaces the incomplete last bar and
+# appends the new ones, as if the whole file had been resampled at once
+def test_rerun_after_append(tmp_path):
+    frame = minute_frame(2 * 1440 + 700)
+    source = tmp_path / 'minutes.csv'
+    frame.iloc[:1440 + 300].to_csv(source, index=False)
+    resample_minutes.resample(str(source), str(tmp_path), chunk_rows=1000)
+    frame.to_csv(source, index=False)
+    resample_minutes.resample(str(source), str(tmp_path), chunk_rows=1000)
+
+    pd.testing.assert_frame_equal(read_bars(tmp_path / 'btc_usd_1d.csv'), pandas_bars(frame, '1D', '%Y-%m-%d'))
+    pd.testing.assert_frame_equal(read_bars(tmp_path / 'btc_usd_1h.csv'),
+                                  pandas_bars(frame, '1h', '%Y-%m-%d %H:%M:%S'))
+
+
+def test_unsorted_minutes_are_rejected(tmp_path):
+    frame = minute_frame(200).iloc[::-1]
+    source = tmp_path / 'minutes.csv'
+    frame.to_csv(source, index=False)
+    with pytest.raises(ValueError, match='sorted'):
+        resample_minutes.resample(str(source), str(tmp_path), resolutions=('1h',))
@@ -0,0 +1,87 @@
+import gzip
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+import predict_plot_API as api
+from bitcoin_prediction.serving import response_format
+
+DATES = ['2024-09-01', '2024-09-02']
+
+
+def fake_predict_model(model_name, start_date, end_date):
+    return response_format.columnar_result(model_name, 12, 150.0, 0.26, DATES, [57100.123, 58800.5])
+
+
+# The optional packages are treated as missing, whatever is installed here
+@pytest.fixture(autouse=True)
+def no_binary_formats(monkeypatch):
+    monkeypatch.setattr(response_format, '_module_available', lambda module_name: False)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, 'predict_model', fake_predict_model)
+    return api.app.test_client()
+
+
+def predict(client, query='', headers=None):
+    return client.get(f'/predict?model=XGBoost&startDate=1725148800&endDate=1725235200&noCache=1{query}',
+                      headers=headers)
+
+
+def test_negotiate():
+    assert response_format.negotiate(MIMEAccept()) == 'legacy'
+    assert response_format.negotiate(MIMEAccept([('application/vnd.bitflow.columnar+json', 1)])) == 'columnar'
+    assert response_format.negotiate(MIMEAccept([('*/*', 1)])) == 'legacy'
+    assert response_format.negotiate(MIMEAccept([('application/msgpack', 1)])) is None
+    assert response_format.negotiate(MIMEAccept([('application/msgpack', 1)]), 'columnar') == 'columnar'
+    with pytest.raises(ValueError):
+        response_format.negotiate(MIMEAccept(), 'msgpack')
+
+
+def test_legacy_shape():
+    result = fake_predict_model('XGBoost', None, None)
+    assert response_format.to_legacy(result) == {
+        'model_name': 'XGBoost', 'runtime': 12, 'mae': '150.00', 'mape': '0.26',
+        'pred_list': [{'date': '2024-09-01', 'price': '57100.12'}, {'date': '2024-09-02', 'price': '58800.50'}]
+    }
+    error = {'model_name': 'LSTM', 'error': 'boom'}
+    assert response_format.convert({'results': [error]}, response_format.to_legacy) == {'results': [error]}
+
+
+def test_prices_are_kept_as_read_only_float32():
+    result = fake_predict_model('XGBoost', None, None)
+    assert result['prices'].dtype == np.float32
+    assert not result['prices'].flags.writeable
+    assert response_format.to_columnar_json(result)['prices'] == [57100.12, 58800.5]
+
+
+def test_columnar_response(client):
+    response = predict(client, headers={'Accept': 'application/vnd.bitflow.columnar+json'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.bitflow.columnar+json'
+    assert response.get_json()['prices'] == [57100.12, 58800.5]
+
+
+def test_unacceptable_format_is_406(client):
+    response = predict(client, headers={'Accept': 'application/msgpack'})
+    assert response.status_code == 406
+    assert response.get_json()['formats'] == [
+        'application/json', 'application/vnd.bitflow.columnar+json'
+    ]
+
+
+@pytest.mark.parametrize('fmt', ['msgpack', 'xml'])
+def test_unavailable_format_argument_is_400(client, fmt):
+    response = predict(client, f'&format={fmt}')
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith(f'Unsupported format: {fmt}')
+
+
+def test_large_responses_are_gzipped(client, monkeypatch):
+    monkeypatch.setitem(api.ServingConfig.RESPONSE_PARAMS, 'gzip_min_bytes', 10)
+    response = predict(client, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'pred_list' in gzip.decompress(response.get_data())
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bitcoin_prediction.features import rolling_features
+from bitcoin_prediction.features.rolling_features import RollingFeatures
+
+
+@pytest.fixture
+def closes():
+    rng = np.random.default_rng(0)
+    return pd.Series(60000 + rng.normal(0, 1500, 200).cumsum(), index=pd.date_range('2024-01-01', periods=200))
+
+
+# The ring buffer must match the features of the notebooks, computed with pandas
+def test_history_features_match_pandas(closes):
+    features = rolling_features.history_features(closes)
+    previous = closes.shift(1)
+    expected = pd.DataFrame({
+        'lag1': previous,
+        'lag2': closes.shift(2),
+        'lag7': closes.shift(7),
+        'rolling_mean_7': previous.rolling(7).mean(),
+        'rolling_std_7': previous.rolling(7).std()
+    })
+    pd.testing.assert_frame_equal(features, expected, check_exact=False, rtol=1e-9)
+
+
+def test_copy_does_not_share_the_buffer(closes):
+    state = RollingFeatures()
+    for close in closes[:10]:
+        state.push(close)
+    before = state.features()
+    forecast = state.copy()
+    forecast.push(1.0)
+    assert state.features() == before
+    assert forecast.lag(1) == 1.0
+
+
+def test_features_are_nan_without_enough_history():
+    state = RollingFeatures()
+    for close in (1.0, 2.0, 3.0):
+        state.push(close)
+    features = state.features()
+    assert features['lag2'] == 2.0
+    assert np.isnan(features['lag7']) and np.isnan(features['rolling_std_7'])
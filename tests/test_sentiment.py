@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+from bitcoin_prediction.market_data import price_dataset, sentiment_ingest
+from bitcoin_prediction.market_data.price_store import PriceStore
+
+
+def day(date):
+    return int(pd.Timestamp(date).timestamp())
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / 'prices.sqlite'), 'http://stub', mode='offline')
+
+
+def test_added_scores_accumulate_into_daily_means(store):
+    assert store.sentiment_progress('tweets.csv') == 0
+    store.add_sentiment({day('2024-06-01'): (0.5, 2)}, 'tweets.csv', 100)
+    store.add_sentiment({day('2024-06-01'): (1.0, 2), day('2024-06-02'): (-0.2, 1)}, 'tweets.csv', 250)
+
+    assert store.sentiment_progress('tweets.csv') == 250
+    assert store.sentiment_progress('other.csv') == 0
+    sentiment = store.get_sentiment('2024-06-01', '2024-06-02')
+    assert sentiment['sentiment_scores'].tolist() == pytest.approx([0.375, -0.2])
+    assert sentiment['tweet_count'].tolist() == [4, 1]
+
+
+# A failed write stores neither the scores nor the progress, so a rerun
+# scores the chunk again
+def test_failed_write_keeps_the_progress(store):
+    store.add_sentiment({day('2024-06-01'): (0.5, 2)}, 'tweets.csv', 100)
+    with pytest.raises(ValueError):
+        store.add_sentiment({day('2024-06-02'): ('not a number', 1)}, 'tweets.csv', 200)
+    assert store.sentiment_progress('tweets.csv') == 100
+    assert store.get_sentiment('2024-06-02', '2024-06-02')['tweet_count'].tolist() == [0]
+
+
+# Stored scores first, then the bundled history, then the mean of the stored
+# daily scores
+def test_missing_days_fall_back_to_the_bundled_history_then_the_mean(store):
+    store.add_sentiment({day('2024-06-01'): (0.9, 1), day('2024-06-02'): (0.1, 1)}, 'tweets.csv', 2)
+    after_history = price_dataset.load().last_date + pd.Timedelta(days=3)
+    sentiment = store.get_sentiment('2024-06-01', '2024-06-03')
+    later = store.get_sentiment(after_history, after_history)
+
+    bundled = price_dataset.load().column('sentiment_scores', '2024-06-03', '2024-06-03')[0]
+    assert sentiment['sentiment_scores'].tolist() == pytest.approx([0.9, 0.1, bundled])
+    assert sentiment['tweet_count'].tolist() == [1, 1, 0]
+    assert later['sentiment_scores'].tolist() == pytest.approx([0.5])
+    assert later['tweet_count'].tolist() == [0]
+
+
+def test_without_stored_scores_later_days_get_the_bundled_mean(store):
+    after_history = price_dataset.load().last_date + pd.Timedelta(days=3)
+    expected = pd.Series(price_dataset.load().column('sentiment_scores')).mean()
+    assert store.get_sentiment(after_history, after_history)['sentiment_scores'].tolist() == pytest.approx([expected])
+
+
+def test_chunks_keep_the_valid_tweets_by_day():
+    chunk = pd.DataFrame({
+        'date': ['2024-06-01 10:00:00+00:00', 'not a date', '2024-06-02 23:59:00+00:00', '2024-06-02 01:00:00+00:00'],
+        'text': ['good', 'bad', None, 'fine']
+    })
+    days, texts = sentiment_ingest._prepare_chunk(chunk)
+    assert days.tolist() == [day('2024-06-01'), day('2024-06-02')]
+    assert texts == ['good', 'fine']
+
+
+def test_clean_text_drops_hashtags_urls_and_mentions():
+    assert sentiment_ingest.clean_text("Up #BTC @trader https://x.co/a 100%!\nnice") == "Up     nice"
+
+
+# A rerun only scores the rows appended since the last one
+def test_ingest_resumes_after_the_stored_rows(store, tmp_path):
+    nltk = pytest.importorskip('nltk')
+    try:
+        nltk.data.find('sentiment/vader_lexicon.zip')
+    except LookupError:
+        pytest.skip("VADER lexicon not installed")
+
+    source = tmp_path / 'tweets.csv'
+    source.write_text("date,text\n2024-06-01,great\n2024-06-01,awful\n2024-06-02,great\n")
+    assert sentiment_ingest.ingest(str(source), store=store, workers=1, chunk_rows=2) == 3
+    assert sentiment_ingest.ingest(str(source), store=store, workers=1, chunk_rows=2) == 0
+
+    with open(source, 'a') as file:
+        file.write("2024-06-02,awful\n")
+    assert sentiment_ingest.ingest(str(source), store=store, workers=1, chunk_rows=2) == 1
+    assert store.sentiment_progress(str(source)) == 4
+    assert store.get_sentiment('2024-06-01', '2024-06-02')['tweet_count'].tolist() == [2, 2]
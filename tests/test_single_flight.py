@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from bitcoin_prediction.serving import metrics
+from bitcoin_prediction.serving.single_flight import SingleFlight
+
+WAITERS = 4
+
+
+def coalesced(flight):
+    return sum(value for _, key, _, value in metrics.coalesced_calls.samples() if key == (flight.name,))
+
+
+# Run flight.do(key, fn) in WAITERS threads while fn blocks until all the other
+# threads wait on it, return the results (or exceptions) of the threads
+def concurrent_calls(flight, fn, key='key'):
+    release = threading.Event()
+    results = [None] * WAITERS
+
+    def blocked():
+        release.wait(5)
+        return fn()
+
+    def call(index):
+        try:
+            results[index] = flight.do(key, blocked)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(WAITERS)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while coalesced(flight) < WAITERS - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight('test_share')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'value': 42}
+
+    results = concurrent_calls(flight, compute)
+    assert all(result == {'value': 42} for result in results)
+    assert len(calls) == 1
+    assert coalesced(flight) == WAITERS - 1
+    assert flight.in_flight() == 0
+
+
+def test_exception_is_shared_and_key_released():
+    flight = SingleFlight('test_exception')
+
+    def fail():
+        raise ValueError("upstream down")
+
+    results = concurrent_calls(flight, fail)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len({id(result) for result in results}) == 1
+    assert flight.in_flight() == 0
+    # The next call computes again
+    assert flight.do('key', lambda: 'fresh') == 'fresh'
+
+
+def test_different_keys_do_not_wait_on_each_other():
+    flight = SingleFlight('test')
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+    with pytest.raises(KeyError):
+        flight.do('c', lambda: {}['missing'])
+    assert flight.in_flight() == 0
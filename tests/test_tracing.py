@@ -0,0 +1,82 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bitcoin_prediction.serving import tracing
+from bitcoin_prediction.serving.config import ServingConfig
+
+
+@pytest.fixture
+def trace_file(monkeypatch, tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setitem(ServingConfig.TRACE_PARAMS, 'path', str(path))
+    monkeypatch.setitem(ServingConfig.TRACE_PARAMS, 'sample_rate', 1.0)
+    monkeypatch.setitem(ServingConfig.TRACE_PARAMS, 'slow_ms', 10_000)
+    return path
+
+
+def exported(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_spans_nest_across_pool_threads(trace_file):
+    root, token = tracing.start_trace('request', trace_id='abc')
+    with tracing.span('predict_all') as parent:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            def predict(model):
+                with tracing.span('predict_model', model=model):
+                    return tracing.current_trace_id()
+            trace_ids = list(pool.map(tracing.wrap(predict), ['ARIMA']))
+    tracing.end_trace(root, token)
+
+    assert trace_ids == ['abc']
+    assert tracing.current_span() is None
+    spans = {span['name']: span for span in exported(trace_file)}
+    assert spans['predict_model']['parent_id'] == spans['predict_all']['span_id'] == parent.span_id
+    assert spans['predict_all']['parent_id'] == spans['request']['span_id']
+    assert spans['predict_model']['attributes'] == {'model': 'ARIMA'}
+    assert {span['trace_id'] for span in spans.values()} == {'abc'}
+
+
+def test_failed_span_records_the_error(trace_file):
+    root, token = tracing.start_trace('request')
+    with pytest.raises(ValueError):
+        with tracing.span('fetch'):
+            raise ValueError('no prices')
+    tracing.end_trace(root, token)
+    fetch = next(span for span in exported(trace_file) if span['name'] == 'fetch')
+    assert fetch['error'] == 'ValueError: no prices'
+
+
+# Unsampled traces are only exported when they are slow
+def test_unsampled_traces_are_exported_when_slow(trace_file, monkeypatch):
+    monkeypatch.setitem(ServingConfig.TRACE_PARAMS, 'sample_rate', 0.0)
+    root, token = tracing.start_trace('fast')
+    tracing.end_trace(root, token)
+    assert exported(trace_file) == []
+
+    monkeypatch.setitem(ServingConfig.TRACE_PARAMS, 'slow_ms', 50)
+    root, token = tracing.start_trace('slow')
+    time.sleep(0.06)
+    tracing.end_trace(root, token)
+    assert [span['name'] for span in exported(trace_file)] == ['slow']
+
+
+def test_spans_outside_a_trace_are_not_recorded(trace_file):
+    with tracing.span('orphan') as span:
+        assert span is None
+    assert exported(trace_file) == []
+
+
+def test_client_trace_id_is_echoed(trace_file):
+    import predict_plot_API as api
+    response = api.app.test_client().get('/models', headers={'X-Trace-Id': 'client-trace'})
+    assert response.headers['X-Trace-Id'] == 'client-trace'
+    root = next(span for span in exported(trace_file) if span['trace_id'] == 'client-trace')
+    assert root['name'] == 'request'
+    assert root['attributes']['endpoint'] == '/models'
+    assert root['attributes']['status'] == 200
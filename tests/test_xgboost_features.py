@@ -0,0 +1,89 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bitcoin_prediction.XGBoost import xgboost_function
+from bitcoin_prediction.market_data import price_dataset, price_store
+from bitcoin_prediction.serving import metrics
+
+
+# The Volume feature is in the units of the training CSV, not the daily volume
+def test_forecast_volume_uses_the_training_units(monkeypatch):
+    last_known = pd.Series({'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volumefrom': 20000.0},
+                           name=pd.Timestamp('2024-06-14'))
+    monkeypatch.setattr(xgboost_function.rolling_features, 'state_before',
+                        lambda start_date: (None, last_known))
+    monkeypatch.setattr(price_store, 'sentiment_before', lambda start_date: 0.3)
+    _, row, gap = xgboost_function.forecast_state('2024-06-15')
+    assert row['Volume'] == price_dataset.load().column('Volume', '2024-06-14', '2024-06-14')[0]
+    assert gap == 0
+
+    last_known.name = price_dataset.load().last_date + pd.Timedelta(days=5)
+    _, row, _ = xgboost_function.forecast_state(last_known.name + pd.Timedelta(days=1))
+    assert row['Volume'] == 20000.0 / price_dataset.MINUTES_PER_DAY
+
+
+def test_direct_model_is_opt_in():
+    assert 'direct' not in xgboost_function.load_model()
+
+
+# Direct mode only uses a direct model that beats repeating the last close on
+# its test anchors, it forecasts recursively otherwise
+@pytest.mark.parametrize('mape, used', [(17.6, False), (12.0, True)])
+def test_direct_model_must_beat_the_last_close(tmp_path, monkeypatch, mape, used):
+    path = tmp_path / 'direct.pkl'
+    with open(path, 'wb') as file:
+        pickle.dump({'model': None, 'max_horizon': 90, 'mae': 1.0, 'mape': mape, 'naive_mape': 15.2}, file)
+    monkeypatch.setattr(xgboost_function, 'DIRECT_MODEL_PATH', str(path))
+    assert ('direct' in xgboost_function.load_model('direct')) == used
+
+
+def test_shipped_direct_model_is_only_used_if_validated():
+    with open(xgboost_function.DIRECT_MODEL_PATH, 'rb') as file:
+        direct = pickle.load(file)
+    assert direct['naive_mape'] > 0
+    model_data = xgboost_function.load_model('direct')
+    assert ('direct' in model_data) == (direct['mape'] < direct['naive_mape'])
+
+
+def forecast_steps():
+    return {
+        name: value for name, key, _, value in metrics.forecast_step_seconds.samples()
+        if key == ('XGBoost',) and not name.endswith('_bucket')
+    }
+
+
+# The in-place float32 buffer gives the predictions of a DataFrame built per step
+def test_recursive_forecast_matches_a_frame_per_step():
+    import xgboost
+
+    model = xgboost_function.load_model()['model']
+    state, row, _ = xgboost_function.forecast_state('2024-06-15')
+    before = state.features()
+    predictions = xgboost_function.recursive_forecast(model, 10, state, row)
+    assert state.features() == before
+
+    reference, state, row = [], state.copy(), dict(row)
+    for _ in range(10):
+        features = dict(row, **state.features())
+        frame = pd.DataFrame([features])[xgboost_function.FEATURE_NAMES].astype('float32')
+        prediction = float(model.predict(xgboost.DMatrix(frame))[0])
+        reference.append(prediction)
+        state.push(prediction)
+        row['Open'] = prediction
+    np.testing.assert_allclose(predictions, reference, rtol=1e-6)
+
+
+def test_forecast_step_time_is_observed_once_per_forecast():
+    model = xgboost_function.load_model()['model']
+    state, row, _ = xgboost_function.forecast_state('2024-06-15')
+    before = forecast_steps()
+    xgboost_function.recursive_forecast(model, 20, state, row)
+    after = forecast_steps()
+    assert after['bitflow_forecast_step_seconds_count'] == before.get('bitflow_forecast_step_seconds_count', 0) + 1
+    assert after['bitflow_forecast_step_seconds_sum'] > before.get('bitflow_forecast_step_seconds_sum', 0)
+
+    assert xgboost_function.recursive_forecast(model, 0, state, row) == []
+    assert forecast_steps() == after